@@ -0,0 +1,111 @@
+# Набор замеров производительности: python -m benchmarks [-o results.json] [--compare old.json].
+# Результаты пишутся в JSON, чтобы сравнивать прогоны на разных коммитах
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+from typing import Dict, List, Optional
+
+from field.engines import ENGINES, get_field_class
+from benchmarks.cases import BENCHMARKS, DENSITIES, MAX_CELLS, Result
+
+DEFAULT_SIZES = [100, 1000, 4000]
+
+
+def available_engines() -> List[str]:
+    engines = []
+    for engine in ENGINES:
+        try:
+            get_field_class(engine)
+        except ImportError:
+            continue
+        engines.append(engine)
+    return engines
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmark simulation hot paths.')
+    parser.add_argument('-b', '--benchmarks', nargs='+', choices=sorted(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('-e', '--engines', nargs='+', choices=sorted(ENGINES), default=available_engines())
+    parser.add_argument('-s', '--sizes', nargs='+', type=int, default=DEFAULT_SIZES,
+                        help='square board sizes (default: %(default)s)')
+    parser.add_argument('-d', '--densities', nargs='+', choices=DENSITIES, default=list(DENSITIES))
+    parser.add_argument('-a', '--all', action='store_true',
+                        help='also run engine/size combinations that are skipped as too slow by default')
+    parser.add_argument('-o', '--output', default='bench_results.json', help='JSON file for results')
+    parser.add_argument('-c', '--compare', help='previous JSON results to compare with')
+    return parser.parse_args(argv)
+
+
+def case_key(result: Result) -> tuple:
+    return result['benchmark'], result['engine'], result['size'], result['density']
+
+
+# Основная метрика каждого замера (для сравнения прогонов)
+def main_metric(result: Result) -> float:
+    for key in ('generations_per_sec', 'calls_per_sec', 'frames_per_sec', 'open_cells_per_sec'):
+        if key in result:
+            return result[key]
+    return 0.0
+
+
+def compare(results: List[Result], file: str) -> None:
+    with open(file, 'r') as f:
+        old: Dict[tuple, Result] = {case_key(r): r for r in json.load(f)['results']}
+
+    print(f'\nCompared with {file}:')
+    for result in results:
+        previous = old.get(case_key(result))
+        if previous is None or not main_metric(previous):
+            continue
+        ratio = main_metric(result) / main_metric(previous)
+        print('{:<11} {:<9} {:>5} {:<12} x{:.2f}'.format(*case_key(result), ratio))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    results: List[Result] = []
+    for benchmark in args.benchmarks:
+        func, max_cells, per_engine = BENCHMARKS[benchmark]
+        for engine in (args.engines if per_engine else args.engines[:1]):
+            for size in args.sizes:
+                cells = size * size
+                if not args.all and (cells > MAX_CELLS.get(engine, cells) or cells > (max_cells or cells)):
+                    continue
+                for density in args.densities:
+                    result = {'benchmark': benchmark, 'engine': engine, 'size': size, 'density': density}
+                    result.update(func(engine, size, size, density))
+                    results.append(result)
+                    cells_per_sec = result.get('cells_per_sec', result.get('open_cells_per_sec'))
+                    print('{:<11} {:<9} {:>5} {:<12} {:>12.1f}/s  {:>10.3g} cells/s  {:>8.1f} MB peak'.format(
+                        *case_key(result), main_metric(result), cells_per_sec, result['peak_memory_bytes'] / 2 ** 20
+                    ))
+
+    meta = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+    with open(args.output, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2)
+    print(f'Results written to {args.output}')
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
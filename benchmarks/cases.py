@@ -0,0 +1,206 @@
+import os
+import time
+import random
+import tempfile
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+from field.field import Field
+from field.engines import get_field_class
+from file_handlers.save_file_handler import SaveFileHandler
+
+# Известные долгоживущие паттерны (мафусаилы), ставятся в центр поля
+METHUSELAHS: Dict[str, List[Tuple[int, int]]] = {
+    'r-pentomino': [(1, 0), (2, 0), (0, 1), (1, 1), (1, 2)],
+    'acorn': [(1, 0), (3, 1), (0, 2), (1, 2), (4, 2), (5, 2), (6, 2)],
+    'diehard': [(6, 0), (0, 1), (1, 1), (1, 2), (5, 2), (6, 2), (7, 2)],
+}
+# Плотности случайного "супа"
+SOUPS: Dict[str, float] = {
+    'sparse': .02,
+    'soup': .5,
+}
+DENSITIES = tuple(SOUPS) + tuple(METHUSELAHS)
+
+# Наибольшая площадь поля, на которой движок ещё имеет смысл гонять (медленные движки на больших полях
+# считали бы минутами, а объектная матрица клеток на 4000x4000 просто не влезет в память)
+MAX_CELLS: Dict[str, int] = {
+    'python': 100 * 100,
+    'active': 1000 * 1000,
+    'block': 1000 * 1000,
+    'hashlife': 1000 * 1000,
+    'sparse': 1000 * 1000,
+}
+# Растр разреженных движков собирается из списка живых клеток
+MAX_PAINT_CELLS = 1000 * 1000
+
+# Минимальное время замера и ограничение на число повторов
+MIN_TIME = .5
+MAX_REPEATS = 1000
+
+Result = Dict[str, object]
+
+
+# Доска размером w x h в виде байтов (по байту на клетку), воспроизводимая по seed
+def make_board(w: int, h: int, density: str, seed: int = 0) -> bytes:
+    if density in SOUPS:
+        threshold = int(256 * SOUPS[density])
+        table = bytes(int(b < threshold) for b in range(256))
+        return random.Random(seed).randbytes(w * h).translate(table)
+
+    board = bytearray(w * h)
+    for x, y in METHUSELAHS[density]:
+        board[(h // 2 + y) * w + w // 2 + x] = Field.Cell.ALIVE
+    return bytes(board)
+
+
+def make_field(engine: str, w: int, h: int, board: bytes) -> Field:
+    field = get_field_class(engine)(w, h)
+    if hasattr(field, 'load_board'):
+        # Движки на NumPy загружаются целым массивом
+        import numpy as np
+        field.load_board(np.frombuffer(board, dtype=np.uint8).reshape(h, w))
+        return field
+
+    i = board.find(Field.Cell.ALIVE)
+    while i != -1:
+        y, x = divmod(i, w)
+        field.set_cell_state(x, y, Field.Cell.ALIVE)
+        i = board.find(Field.Cell.ALIVE, i + 1)
+    return field
+
+
+# Повторяет func, пока суммарное время не превысит MIN_TIME. Возвращает (повторы, секунды)
+def measure(func: Callable[[], object]) -> Tuple[int, float]:
+    repeats, elapsed = 0, 0.0
+    while elapsed < MIN_TIME and repeats < MAX_REPEATS:
+        start = time.perf_counter()
+        func()
+        elapsed += time.perf_counter() - start
+        repeats += 1
+    return repeats, elapsed
+
+
+def peak_memory(func: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_step(engine: str, w: int, h: int, density: str) -> Result:
+    board = make_board(w, h, density)
+    field = make_field(engine, w, h, board)
+    try:
+        repeats, elapsed = measure(field.step)
+    finally:
+        field.close()
+
+    def run():
+        f = make_field(engine, w, h, board)
+        f.step()
+        f.close()
+
+    return {
+        'generations': repeats, 'seconds': elapsed,
+        'generations_per_sec': repeats / elapsed, 'cells_per_sec': repeats * w * h / elapsed,
+        'peak_memory_bytes': peak_memory(run),
+    }
+
+
+def bench_get_alives(engine: str, w: int, h: int, density: str) -> Result:
+    field = make_field(engine, w, h, make_board(w, h, density))
+    try:
+        repeats, elapsed = measure(field.get_alives)
+        memory = peak_memory(field.get_alives)
+    finally:
+        field.close()
+
+    return {
+        'calls': repeats, 'seconds': elapsed,
+        'calls_per_sec': repeats / elapsed, 'cells_per_sec': repeats * w * h / elapsed,
+        'peak_memory_bytes': memory,
+    }
+
+
+def bench_file_io(engine: str, w: int, h: int, density: str) -> Result:
+    field = make_field(engine, w, h, make_board(w, h, density))
+    field_class = type(field)
+
+    def open_file():
+        SaveFileHandler.open_field(file, field_class)[0].close()
+
+    fd, file = tempfile.mkstemp(suffix='.sav')
+    os.close(fd)
+    try:
+        save_repeats, save_elapsed = measure(lambda: SaveFileHandler.save_field(file, field))
+        file_bytes = os.path.getsize(file)
+        open_repeats, open_elapsed = measure(open_file)
+        memory = peak_memory(open_file)
+    finally:
+        os.remove(file)
+        field.close()
+
+    return {
+        'save_seconds': save_elapsed / save_repeats, 'open_seconds': open_elapsed / open_repeats,
+        'save_cells_per_sec': save_repeats * w * h / save_elapsed,
+        'open_cells_per_sec': open_repeats * w * h / open_elapsed,
+        'file_bytes': file_bytes, 'peak_memory_bytes': memory,
+    }
+
+
+# Отрисовка CellPainter в offscreen-режиме Qt. PyQt5 импортируется только здесь
+def bench_paint(engine: str, w: int, h: int, density: str) -> Result:
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5 import QtGui
+    from PyQt5.QtWidgets import QApplication
+    from ui.cell_painter import CellPainter
+
+    app = QApplication.instance() or QApplication([])
+
+    # Вид без миникарты: CellPainter просит её перерисовать после правок поля
+    class ViewStub:
+        @staticmethod
+        def update_minimap() -> None:
+            pass
+
+    # Минимальный "родитель" с теми атрибутами, которые читает CellPainter
+    class PainterHost:
+        field = make_field(engine, w, h, make_board(w, h, density))
+        field_size_x, field_size_y = w, h
+        view_x, view_y = 0, 0
+        frame = None
+        alive_cell_color = QtGui.QColor('#ffffff')
+        dead_cell_color = QtGui.QColor('#000000')
+        cell_border_color = QtGui.QColor('#323232')
+        monitor = None
+        startup_timer = None
+        zoom_x = 1
+        _view = ViewStub
+
+    painter = CellPainter(PainterHost)
+    painter.setFixedSize(600, 600)
+    try:
+        repeats, elapsed = measure(painter.grab)
+        memory = peak_memory(painter.grab)
+    finally:
+        PainterHost.field.close()
+    app.processEvents()
+
+    return {
+        'frames': repeats, 'seconds': elapsed,
+        'frames_per_sec': repeats / elapsed, 'cells_per_sec': repeats * w * h / elapsed,
+        'peak_memory_bytes': memory,
+    }
+
+
+# Замер -> (функция, наибольшая площадь поля, зависит ли результат от движка).
+# Замеры, не зависящие от движка, запускаются только с первым из выбранных движков
+BENCHMARKS: Dict[str, Tuple[Callable[[str, int, int, str], Result], Optional[int], bool]] = {
+    'step': (bench_step, None, True),
+    'get_alives': (bench_get_alives, None, True),
+    'file_io': (bench_file_io, None, True),
+    'paint': (bench_paint, MAX_PAINT_CELLS, True),
+}
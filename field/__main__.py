@@ -0,0 +1,119 @@
+# Консольный запуск симуляции без интерфейса: python -m field <файл> -n <поколения>.
+# Модуль не должен импортировать PyQt5 ни прямо, ни косвенно - запуск на серверах должен быть быстрым
+import os
+import sys
+import time
+import argparse
+from typing import List, Optional, Tuple
+
+from field.field import Field
+from field.engines import ENGINES, DEFAULT_ENGINE, get_field_class
+from field.rule import Rule
+from file_handlers.save_file_handler import SaveFileHandler, SaveFHException
+from file_handlers.pattern_file_handler import PatternFileHandler
+
+
+def parse_size(value: str) -> List[int]:
+    try:
+        size = [int(v) for v in value.lower().split('x')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid size: {value} (expected WIDTHxHEIGHT)')
+    if len(size) != 2 or min(size) <= 0:
+        raise argparse.ArgumentTypeError(f'invalid size: {value} (expected WIDTHxHEIGHT)')
+    return size
+
+
+def parse_rule(value: str) -> Rule:
+    try:
+        return Rule(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid rule: {value} (expected B/S rulestring, e.g. B36/S23)')
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m field', description='Run Game of Life without the UI.')
+    parser.add_argument('file', help='.sav file or pattern (.rle, .cells, .lif) to load')
+    parser.add_argument('-n', '--generations', type=int, default=100, help='generations to run (default: 100)')
+    parser.add_argument('-e', '--engine', choices=sorted(ENGINES), default=DEFAULT_ENGINE,
+                        help=f'field engine (default: {DEFAULT_ENGINE})')
+    parser.add_argument('-r', '--rule', type=parse_rule,
+                        help='rule to run, e.g. B36/S23 (default: the rule stored in the file, else B3/S23)')
+    parser.add_argument('-s', '--size', type=parse_size,
+                        help='field size for patterns, WIDTHxHEIGHT (default: pattern size)')
+    parser.add_argument('-k', '--snapshot-every', type=int, default=0, metavar='K',
+                        help='write a .sav snapshot every K generations')
+    parser.add_argument('-o', '--snapshot-dir', default='snapshots', help='directory for snapshots')
+    parser.add_argument('-z', '--compress', action='store_true', help='compress snapshots with zlib')
+    args = parser.parse_args(argv)
+
+    if args.generations < 0:
+        parser.error('number of generations cannot be negative')
+    if args.snapshot_every < 0:
+        parser.error('snapshot interval cannot be negative')
+    return args
+
+
+# Возвращает поле и номер поколения, с которого оно сохранено
+def load_field(file: str, engine: str, size: Optional[List[int]] = None) -> Tuple[Field, int]:
+    field_class = get_field_class(engine)
+
+    if PatternFileHandler.get_format(file) is not None:
+        w, h = PatternFileHandler.read_size(file)
+        if size is not None:
+            w, h = max(w, size[0]), max(h, size[1])
+        return PatternFileHandler.open_pattern(file, field_class, (w, h)), 0
+
+    field, header = SaveFileHandler.open_field(file, field_class)
+    return field, header.generation
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    field, first_generation = load_field(args.file, args.engine, args.size)
+    if args.rule is not None:
+        try:
+            field.set_rule(args.rule)
+        except ValueError as e:
+            field.close()
+            print(f'Cannot use rule {args.rule}: {e}', file=sys.stderr)
+            return 2
+    w, h = field.get_size()
+    print(f'Loaded {args.file}: {w}x{h}, generation {first_generation}, engine {args.engine}, '
+          f'rule {field.get_rule()}, population {field.get_population()}')
+
+    if args.snapshot_every:
+        os.makedirs(args.snapshot_dir, exist_ok=True)
+
+    # Поле продвигается кусками до следующего снимка (или сразу на все поколения)
+    chunk = args.snapshot_every or args.generations
+    done, elapsed = 0, 0.0
+    try:
+        while done < args.generations:
+            n = min(chunk, args.generations - done)
+            start = time.perf_counter()
+            field.advance(n)
+            elapsed += time.perf_counter() - start
+            done += n
+
+            if args.snapshot_every:
+                snapshot = os.path.join(args.snapshot_dir, f'gen_{first_generation + done:08d}.sav')
+                try:
+                    SaveFileHandler.save_field(snapshot, field, first_generation + done, args.compress)
+                except SaveFHException as e:
+                    print(f'Cannot save {snapshot}: {e}', file=sys.stderr)
+                    return 2
+                print(f'Generation {first_generation + done}: population {field.get_population()}, saved {snapshot}')
+    finally:
+        population, box = field.get_population(), field.get_bounding_box()
+        field.close()
+
+    gens_per_sec = done / elapsed if elapsed else float('inf')
+    print(f'Ran {done} generations in {elapsed:.3f} s: '
+          f'{gens_per_sec:.1f} generations/s, {gens_per_sec * w * h:.3g} cells/s')
+    print(f'Final population: {population}' + (f', bounding box {box}' if box is not None else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import re
+from typing import Any, Tuple, List, Set
+
+from field.field import Field, bitmap_to_cells
+from field.rule import Rule
+
+
+# Поле с отслеживанием активной области. Клетки и счётчики живых соседей хранятся плоскими bytearray,
+# счётчики обновляются на каждом рождении/смерти, а за шаг проверяются только клетки,
+# рядом с которыми что-то изменилось в прошлом поколении. Стоимость шага зависит от активности, а не от площади
+class ActiveRegionField(Field):
+    # Клетки без соседей рядом с изменениями не проверяются
+    SUPPORTS_BIRTH_ON_ZERO = False
+
+    def __init__(self, size_x: int = 25, size_y: int = 25):
+        self.cells: bytearray = ...
+        self.counts: bytearray = ...
+        self.__active: Set[int] = ...
+        super().__init__(size_x, size_y)
+
+    def clear(self) -> None:
+        size = self.get_size_x() * self.get_size_y()
+        self.cells = bytearray(size)
+        self.counts = bytearray(size)
+        self.__active = set()
+        self.population = 0
+        self.row_counts, self.column_counts = [0] * self.get_size_y(), [0] * self.get_size_x()
+        self.bounding_box = ...
+
+    # Клетки, устойчивые по старому правилу, по новому могут измениться - следующий шаг проверяет всё поле
+    def set_rule(self, rule: Rule) -> None:
+        super().set_rule(rule)
+        self.__active = set(range(self.get_size_x() * self.get_size_y()))
+
+    def get_cell_state(self, x: int, y: int) -> int:
+        return self.cells[y * self.get_size_x() + x]
+
+    def set_cell_state(self, x: int, y: int, state: int) -> None:
+        if state not in (self.Cell.DEAD, self.Cell.ALIVE):
+            raise ValueError('Cell can only be DEAD (0) or ALIVE (1)')
+        i = y * self.get_size_x() + x
+        if self.cells[i] != state:
+            self.cells[i] = state
+            delta = 1 if state == self.Cell.ALIVE else -1
+            self.population += delta
+            self.__update_counts(i, delta, self.__active)
+
+    def load_matrix(self, matrix: List[List[Field.Cell]]) -> None:
+        if (len(matrix), len(matrix[0]) if matrix else 0) != (self.get_size_y(), self.get_size_x()):
+            raise ValueError('Matrix size does not match field size')
+        self.clear()
+        for y, row in enumerate(matrix):
+            for x, cell in enumerate(row):
+                if cell.get_state() == self.Cell.ALIVE:
+                    self.set_cell_state(x, y, self.Cell.ALIVE)
+
+    # Загрузка целой доски: счётчики соседей считаются сразу для всего поля, а не по клетке
+    def load_bitmap(self, bitmap: Any, stride: int) -> None:
+        w, h = self.get_size()
+        if stride * 8 < w or len(memoryview(bitmap).cast('B')) < stride * h:
+            raise ValueError('Bitmap size does not match field size')
+        self.cells = bitmap_to_cells(bitmap, stride, w, h)
+        self.__count_neighbours()
+
+    # Строка доски - длинное целое по байту на клетку. Счётчик не больше 8, поэтому сложение строк
+    # не переносит разряды между клетками. Сдвиг на байт с переносом крайней клетки - сосед по тору
+    def __count_neighbours(self) -> None:
+        w, h = self.get_size()
+        cells = self.cells
+        mask = (1 << 8 * w) - 1
+        rows = [int.from_bytes(cells[y * w:(y + 1) * w], 'little') for y in range(h)]
+        # Сумма клетки и её соседей слева и справа
+        triples = [r + ((r << 8 | r >> 8 * (w - 1)) & mask) + (r >> 8 | (r & 0xff) << 8 * (w - 1)) for r in rows]
+
+        counts = bytearray(w * h)
+        for y in range(h):
+            row = triples[y - 1] + triples[y] + triples[(y + 1) % h] - rows[y]
+            counts[y * w:(y + 1) * w] = row.to_bytes(w, 'little')
+        self.counts = counts
+        self.population = cells.count(self.Cell.ALIVE)
+        self.row_counts = [cells.count(self.Cell.ALIVE, y * w, (y + 1) * w) for y in range(h)]
+        self.column_counts = [cells[x::w].count(self.Cell.ALIVE) for x in range(w)]
+        self.bounding_box = ...
+        # Меняться могут только живые клетки и клетки с живыми соседями
+        marks = (int.from_bytes(cells, 'little') | int.from_bytes(counts, 'little')).to_bytes(w * h, 'little')
+        self.__active = {m.start() for m in re.finditer(b'[^\x00]', marks)}
+
+    def to_matrix(self) -> List[List[Field.Cell]]:
+        w = self.get_size_x()
+        return [[self.Cell(x, y, self.cells[y * w + x]) for x in range(w)] for y in range(self.get_size_y())]
+
+    def alive_nearby(self, cell: Field.Cell) -> int:
+        x, y = cell.get_pos()
+        return self.counts[y * self.get_size_x() + x]
+
+    # Прибавляет delta к счётчикам всех соседей клетки i (с заворотом по тору) и к счётчикам живых клеток
+    # её строки и столбца, а клетку вместе с соседями помечает как активные на следующий шаг
+    def __update_counts(self, i: int, delta: int, active: Set[int]) -> None:
+        w, h = self.get_size()
+        y, x = divmod(i, w)
+        counts = self.counts
+        self.row_counts[y] += delta
+        self.column_counts[x] += delta
+        self.bounding_box = ...
+
+        active.add(i)
+        for ry in range(-1, 2):
+            row = (y + ry) % h * w
+            for rx in range(-1, 2):
+                if (ry, rx) != (0, 0):
+                    j = row + (x + rx) % w
+                    counts[j] += delta
+                    active.add(j)
+
+    def step(self) -> None:
+        cells, counts = self.cells, self.counts
+
+        # Сначала решаем судьбу всех активных клеток по старым счётчикам, потом применяем изменения
+        births, deaths = [], []
+        table = self.rule.table
+        for i in self.__active:
+            state = cells[i]
+            if table[state * 9 + counts[i]] != state:
+                if state == self.Cell.ALIVE:
+                    deaths.append(i)
+                else:
+                    births.append(i)
+
+        active = set()
+        for i in births:
+            cells[i] = self.Cell.ALIVE
+            self.__update_counts(i, 1, active)
+        for i in deaths:
+            cells[i] = self.Cell.DEAD
+            self.__update_counts(i, -1, active)
+        self.__active = active
+        self.population += len(births) - len(deaths)
+
+        w = self.get_size_x()
+        self.changes = [(i % w, i // w) for i in births + deaths]
+
+    def get_raster(self, x0: int = 0, y0: int = 0) -> Tuple[bytearray, int, int]:
+        return self.cells, 8, self.get_size_x()
+
+    def get_alives(self) -> List[Tuple[int, int]]:
+        w = self.get_size_x()
+        cells = self.cells
+
+        alives = []
+        i = cells.find(self.Cell.ALIVE)
+        while i != -1:
+            y, x = divmod(i, w)
+            alives.append((x, y))
+            i = cells.find(self.Cell.ALIVE, i + 1)
+        return alives
@@ -0,0 +1,335 @@
+from typing import Tuple, List, Optional, Any, Iterable
+
+import numpy as np
+
+from field.field import Field, clip_rect, make_soup
+from field.numpy_field import hash_words, update_words_hash, bitmap_to_board, get_field_cells
+from field.rule import Rule
+
+# Разбор B3/S23 (см. BitboardField.set_rule): выживание и рождение при 3, только выживание при 2
+LIFE_COUNTS = (3,), (2,), ()
+# Маски для подсчёта единичных битов слова без bitwise_count (SWAR)
+POPCOUNT_MASKS = tuple(np.uint64(m) for m in (0x5555555555555555, 0x3333333333333333,
+                                              0x0F0F0F0F0F0F0F0F, 0x0101010101010101))
+
+
+# Число единичных битов каждого слова (uint8). bitwise_count есть только с NumPy 2.0,
+# в старых версиях биты складываются парами, четвёрками и байтами внутри слова
+def popcount(words: np.ndarray) -> np.ndarray:
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words)
+    m1, m2, m4, h01 = POPCOUNT_MASKS
+    words = words - (words >> np.uint64(1) & m1)
+    words = (words & m2) + (words >> np.uint64(2) & m2)
+    words = (words + (words >> np.uint64(4))) & m4
+    return ((words * h01) >> np.uint64(56)).astype(np.uint8)
+
+
+# Маска клеток, у которых ровно n соседей для n из counts (None - пустое множество),
+# по битам побитового счётчика соседей (s0, s1, s2, s3; s3 может отсутствовать - тогда счёт по модулю 8)
+def count_mask(counter: Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]],
+               counts: Iterable[int]) -> Optional[np.ndarray]:
+    s0, s1, s2, s3 = counter
+    mask = None
+    for n in counts:
+        m = s0 if n & 1 else ~s0
+        m = m & (s1 if n & 2 else ~s1)
+        m &= s2 if n & 4 else ~s2
+        if s3 is not None:
+            m &= s3 if n == 8 else ~s3
+        mask = m if mask is None else mask | m
+    return mask
+
+
+# Битовое поле: каждая строка хранится последовательностью 64-битных машинных слов,
+# клетка x лежит в бите x % 64 слова x // 64. Соседи считаются побитовыми сумматорами
+# сразу над целыми словами, так что одна операция обрабатывает 64 клетки
+class BitboardField(Field):
+    WORD_BITS = 64
+
+    def __init__(self, size_x: int = 25, size_y: int = 25):
+        self.words: np.ndarray = ...
+        self.previous_words: Optional[np.ndarray] = None
+        last_bit = (size_x - 1) % self.WORD_BITS
+        self.__last_bit = np.uint64(last_bit)
+        # Маска значащих битов последнего слова строки (биты за краем поля всегда нулевые)
+        self.__last_mask = np.uint64((1 << (last_bit + 1)) - 1)
+        # Правило, разобранное для побитового счётчика: числа соседей, при которых клетка живёт независимо
+        # от своего состояния, только если жива и только если мертва; и нужен ли четвёртый бит счётчика
+        self.__rule_counts: Tuple[Tuple[int, ...], Tuple[int, ...], Tuple[int, ...]] = ...
+        self.__counts_to_eight = False
+        # Счётчики живых клеток по строкам и по столбцам слов (см. Field) - массивы. Правки и шаги меняют их
+        # на число битов рождений и смертей, а не пересчитывают всю доску
+        self.row_counts: np.ndarray = ...
+        self.word_counts: np.ndarray = ...
+        super().__init__(size_x, size_y)
+
+    def get_words_per_row(self) -> int:
+        return (self.get_size_x() + self.WORD_BITS - 1) // self.WORD_BITS
+
+    def set_rule(self, rule: Rule) -> None:
+        super().set_rule(rule)
+        both = rule.birth & rule.survival
+        self.__rule_counts = (tuple(sorted(both)), tuple(sorted(rule.survival - both)),
+                              tuple(sorted(rule.birth - both)))
+        # Трёхбитный счётчик считает по модулю 8 и не отличает 8 соседей от 0
+        self.__counts_to_eight = bool({0, 8} & (rule.birth | rule.survival))
+
+    def clear(self) -> None:
+        self.words = np.zeros((self.get_size_y(), self.get_words_per_row()), dtype=np.uint64)
+        self.previous_words = None
+        self.count_words()
+
+    # Пересчёт счётчиков по всей доске - после очистки и загрузки
+    def count_words(self) -> None:
+        counts = popcount(self.words)
+        self.row_counts = counts.sum(axis=1, dtype=np.int64)
+        self.word_counts = counts.sum(axis=0, dtype=np.int64)
+        self.population = int(self.row_counts.sum())
+        self.bounding_box = ...
+
+    # Учёт изменений строк слов, начиная с y0: before и after - их слова до и после изменения
+    def __count_changes(self, before: np.ndarray, after: np.ndarray, y0: int = 0) -> None:
+        delta = popcount(after & ~before).astype(np.int16) - popcount(before & ~after)
+        rows = delta.sum(axis=1, dtype=np.int64)
+        self.row_counts[y0:y0 + len(rows)] += rows
+        self.word_counts += delta.sum(axis=0, dtype=np.int64)
+        self.population += int(rows.sum())
+        self.bounding_box = ...
+
+    def get_cell_state(self, x: int, y: int) -> int:
+        return int(self.words[y, x // self.WORD_BITS] >> np.uint64(x % self.WORD_BITS)) & 1
+
+    def set_cell_state(self, x: int, y: int, state: int) -> None:
+        if state not in (self.Cell.DEAD, self.Cell.ALIVE):
+            raise ValueError('Cell can only be DEAD (0) or ALIVE (1)')
+        delta = state - self.get_cell_state(x, y)
+        if not delta:
+            return
+        bit = np.uint64(1) << np.uint64(x % self.WORD_BITS)
+        if state == self.Cell.ALIVE:
+            self.words[y, x // self.WORD_BITS] |= bit
+        else:
+            self.words[y, x // self.WORD_BITS] &= ~bit
+        self.row_counts[y] += delta
+        self.word_counts[x // self.WORD_BITS] += delta
+        self.population += delta
+        self.bounding_box = ...
+
+    # Правки многих клеток. Одиночные клетки меняются выборкой слов, прямоугольники - масками целых строк слов
+    def set_cells(self, cells: Iterable[Tuple[int, int]], state: int) -> List[Tuple[int, int]]:
+        if state not in (self.Cell.DEAD, self.Cell.ALIVE):
+            raise ValueError('Cell can only be DEAD (0) or ALIVE (1)')
+        xs, ys = get_field_cells(cells, *self.get_size())
+        indices, bits = xs // self.WORD_BITS, (xs % self.WORD_BITS).astype(np.uint64)
+        changed = (self.words[ys, indices] >> bits & np.uint64(1)) != state
+        xs, ys, indices, bits = xs[changed], ys[changed], indices[changed], np.uint64(1) << bits[changed]
+        # Несколько клеток могут попасть в одно слово, поэтому биты ставятся накопительно
+        if state == self.Cell.ALIVE:
+            np.bitwise_or.at(self.words, (ys, indices), bits)
+        else:
+            np.bitwise_and.at(self.words, (ys, indices), ~bits)
+        sign = 1 if state == self.Cell.ALIVE else -1
+        self.row_counts += sign * np.bincount(ys, minlength=self.get_size_y())
+        self.word_counts += sign * np.bincount(indices, minlength=self.get_words_per_row())
+        self.population += sign * len(xs)
+        self.bounding_box = ...
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    # Переводит в state клетки прямоугольника с углом в (x, y), отмеченные в region (массив нулей и единиц)
+    def __set_region(self, x: int, y: int, region: np.ndarray, state: int) -> None:
+        h, w = region.shape
+        rows = np.zeros((h, self.get_size_x()), dtype=np.uint8)
+        rows[:, x:x + w] = region
+        before = self.words[y:y + h].copy()
+        if state == self.Cell.ALIVE:
+            self.words[y:y + h] |= self.to_words(rows)
+        else:
+            self.words[y:y + h] &= ~self.to_words(rows)
+        self.__count_changes(before, self.words[y:y + h], y)
+
+    def fill_rect(self, x: int, y: int, w: int, h: int, state: int) -> None:
+        if state not in (self.Cell.DEAD, self.Cell.ALIVE):
+            raise ValueError('Cell can only be DEAD (0) or ALIVE (1)')
+        rect = clip_rect(x, y, w, h, *self.get_size())
+        if rect is not None:
+            x0, y0, x1, y1 = rect
+            self.__set_region(x0, y0, np.ones((y1 - y0, x1 - x0), dtype=np.uint8), state)
+
+    def paste(self, bitmap: Any, stride: int, size: Tuple[int, int], x: int, y: int) -> None:
+        pw, ph = size
+        if stride * 8 < pw:
+            raise ValueError('Bitmap size does not match pattern size')
+        rect = clip_rect(x, y, pw, ph, *self.get_size())
+        if rect is not None:
+            x0, y0, x1, y1 = rect
+            pattern = bitmap_to_board(bitmap, stride, pw, ph)
+            self.__set_region(x0, y0, pattern[y0 - y:y1 - y, x0 - x:x1 - x], self.Cell.ALIVE)
+
+    def random_fill(self, x: int, y: int, w: int, h: int, density: float, seed: Optional[int] = None) -> None:
+        soup = make_soup(max(w, 0), max(h, 0), density, seed)
+        rect = clip_rect(x, y, w, h, *self.get_size())
+        if rect is not None:
+            x0, y0, x1, y1 = rect
+            self.fill_rect(x0, y0, x1 - x0, y1 - y0, self.Cell.DEAD)
+            soup = np.frombuffer(soup, dtype=np.uint8).reshape(h, w)
+            self.__set_region(x0, y0, soup[y0 - y:y1 - y, x0 - x:x1 - x], self.Cell.ALIVE)
+
+    # Перевод между битовыми словами и байтовой доской (по байту на клетку)
+    def load_board(self, board: np.ndarray) -> None:
+        if board.shape != (self.get_size_y(), self.get_size_x()):
+            raise ValueError('Board size does not match field size')
+        self.words = self.to_words(board)
+        self.previous_words = None
+        self.count_words()
+
+    # Строки байтовой доски шириной в поле - строками слов
+    def to_words(self, board: np.ndarray) -> np.ndarray:
+        packed = np.packbits(board.astype(np.uint8), axis=1, bitorder='little')
+        row_bytes = self.get_words_per_row() * self.WORD_BITS // 8
+        packed = np.pad(packed, ((0, 0), (0, row_bytes - packed.shape[1])))
+        return np.ascontiguousarray(packed).view('<u8').astype(np.uint64)
+
+    def to_board(self, words: Optional[np.ndarray] = None) -> np.ndarray:
+        packed = (self.words if words is None else words).astype('<u8', copy=False).view(np.uint8)
+        return np.unpackbits(packed, axis=1, bitorder='little')[:, :self.get_size_x()]
+
+    def load_matrix(self, matrix: List[List[Field.Cell]]) -> None:
+        self.load_board(np.array([[c.get_state() for c in row] for row in matrix], dtype=np.uint8))
+
+    # Битовая карта с выравниванием по словам - это ровно строки слов, они копируются как есть
+    # (выгрузка идёт через get_raster)
+    def load_bitmap(self, bitmap: Any, stride: int) -> None:
+        w, h = self.get_size()
+        words_per_row = self.get_words_per_row()
+        if stride != words_per_row * self.WORD_BITS // 8:
+            if stride * 8 < w:
+                raise ValueError('Bitmap size does not match field size')
+            self.load_board(bitmap_to_board(bitmap, stride, w, h))
+            return
+
+        words = np.frombuffer(bitmap, dtype='<u8', count=words_per_row * h).reshape(h, words_per_row)
+        self.words = words.astype(np.uint64)
+        # Биты за краем поля в файле могут быть любыми
+        self.words[:, -1] &= self.__last_mask
+        self.previous_words = None
+        self.count_words()
+
+    def to_matrix(self) -> List[List[Field.Cell]]:
+        return [[self.Cell(x, y, state) for x, state in enumerate(row)]
+                for y, row in enumerate(self.to_board().tolist())]
+
+    def alive_nearby(self, cell: Field.Cell) -> int:
+        x, y = cell.get_pos()
+        max_x, max_y = self.get_size()
+
+        an = 0
+        for ry in range(-1, 2):
+            for rx in range(-1, 2):
+                if (ry, rx) != (0, 0):
+                    an += self.get_cell_state((x + rx) % max_x, (y + ry) % max_y)
+        return an
+
+    # Сдвиги строк на одну клетку по горизонтали с заворотом по тору.
+    # east: в клетке x оказывается клетка x - 1, west: клетка x + 1
+    def __shift_east(self, b: np.ndarray) -> np.ndarray:
+        out = b << np.uint64(1)
+        out[:, 1:] |= b[:, :-1] >> np.uint64(self.WORD_BITS - 1)
+        out[:, 0] |= (b[:, -1] >> self.__last_bit) & np.uint64(1)
+        out[:, -1] &= self.__last_mask
+        return out
+
+    def __shift_west(self, b: np.ndarray) -> np.ndarray:
+        out = b >> np.uint64(1)
+        out[:, :-1] |= b[:, 1:] << np.uint64(self.WORD_BITS - 1)
+        out[:, -1] |= (b[:, 0] & np.uint64(1)) << self.__last_bit
+        return out
+
+    def step(self) -> None:
+        b = self.words
+        north, south = np.roll(b, 1, axis=0), np.roll(b, -1, axis=0)
+        neighbours = (north, south,
+                      self.__shift_east(north), self.__shift_west(north),
+                      self.__shift_east(b), self.__shift_west(b),
+                      self.__shift_east(south), self.__shift_west(south))
+
+        # Побитовый счётчик соседей s3 s2 s1 s0. s3 (ровно восемь соседей) нужен, только если правило
+        # различает 0 и 8 соседей, иначе счёт идёт по модулю 8
+        s0, s1, s2 = np.zeros_like(b), np.zeros_like(b), np.zeros_like(b)
+        s3 = np.zeros_like(b) if self.__counts_to_eight else None
+        for n in neighbours:
+            c0 = s0 & n
+            s0 ^= n
+            c1 = s1 & c0
+            s1 ^= c0
+            if s3 is not None:
+                s3 |= s2 & c1
+            s2 ^= c1
+
+        self.previous_words = b
+        if self.__rule_counts == LIFE_COUNTS:
+            # B3/S23: ровно 3 соседа (s0 & s1) или ровно 2 соседа у живой клетки (s1 & b) - короче общей схемы
+            self.words = s1 & ~s2 & (s0 | b)
+            self.__count_changes(b, self.words)
+            return
+
+        counter = s0, s1, s2, s3
+        both, survival, birth = self.__rule_counts
+        words = count_mask(counter, both)
+        for counts, state in ((survival, b), (birth, ~b)):
+            mask = count_mask(counter, counts)
+            if mask is not None:
+                mask &= state
+                words = mask if words is None else words | mask
+        if words is None:
+            words = np.zeros_like(b)
+        # Биты за краем поля должны остаться нулевыми (при B0 их включает отрицание)
+        words[:, -1] &= self.__last_mask
+        self.words = words
+        self.__count_changes(b, words)
+
+    def get_changes(self, limit: Optional[int] = None) -> Optional[List[Tuple[int, int]]]:
+        if self.previous_words is None:
+            return None
+        # Изменившиеся клетки - единичные биты в XOR старых и новых слов
+        changed = self.to_board(self.previous_words ^ self.words)
+        if limit is not None and np.count_nonzero(changed) > limit:
+            return None
+        ys, xs = np.nonzero(changed)
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def get_hash(self) -> int:
+        words = self.words.reshape(-1)
+        indices = np.flatnonzero(words)
+        return hash_words(indices, words[indices])
+
+    def update_hash(self, h: int) -> int:
+        if self.previous_words is None:
+            return self.get_hash()
+        return update_words_hash(h, self.previous_words.reshape(-1), self.words.reshape(-1))
+
+    # Слова в порядке little-endian - это ровно растр "1 бит на клетку, младший бит первым"
+    def get_raster(self, x0: int = 0, y0: int = 0) -> Tuple[np.ndarray, int, int]:
+        return np.ascontiguousarray(self.words.astype('<u8', copy=False)), 1, self.get_words_per_row() * 8
+
+    # Строки - по счётчикам строк, столбцы - по крайним непустым столбцам слов: внутри них крайний бит
+    # находится по OR слов столбца в строках прямоугольника
+    def get_bounding_box(self) -> Optional[Tuple[int, int, int, int]]:
+        if self.bounding_box is not ...:
+            return self.bounding_box
+        ys = np.flatnonzero(self.row_counts)
+        if not len(ys):
+            self.bounding_box = None
+            return None
+        y0, y1 = int(ys[0]), int(ys[-1])
+        indices = np.flatnonzero(self.word_counts)
+        first = int(np.bitwise_or.reduce(self.words[y0:y1 + 1, indices[0]]))
+        last = int(np.bitwise_or.reduce(self.words[y0:y1 + 1, indices[-1]]))
+        x0 = int(indices[0]) * self.WORD_BITS + (first & -first).bit_length() - 1
+        x1 = int(indices[-1]) * self.WORD_BITS + last.bit_length() - 1
+        self.bounding_box = x0, y0, x1, y1
+        return self.bounding_box
+
+    def get_alives(self) -> List[Tuple[int, int]]:
+        ys, xs = np.nonzero(self.to_board())
+        return list(zip(xs.tolist(), ys.tolist()))
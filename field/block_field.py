@@ -0,0 +1,277 @@
+import sys
+from array import array
+from typing import Any, Dict, Tuple, List, Optional
+
+from field.field import Field, DIGITS_TO_CELLS, get_counts_bounds, bitmap_to_cells, clip_rect, make_soup
+from field.rule import Rule
+
+# Биты клеток в ключе окрестности 4x4: клетка в столбце c и строке r - бит 4 * c + r
+# (так ключ собирается из полубайтов столбцов). Центральные клетки блока 2x2 и номера их битов в результате
+BLOCK_CELLS = ((1, 1), (2, 1), (1, 2), (2, 2))
+# Перевод результата блока в состояние одной из его клеток (для bytes.translate)
+BLOCK_CELL_STATES = tuple(bytes((r >> i) & 1 for r in range(256)) for i in range(len(BLOCK_CELLS)))
+
+
+# Таблица переходов блоков: для каждой из 65536 окрестностей 4x4 - следующее состояние её центральных 2x2 клеток.
+# Хранится списком: поиск в списке быстрее, чем в bytes
+def build_block_table(rule: Rule) -> List[int]:
+    cells = []
+    for c, r in BLOCK_CELLS:
+        neighbours = 0
+        for dc in range(-1, 2):
+            for dr in range(-1, 2):
+                if (dc, dr) != (0, 0):
+                    neighbours |= 1 << (4 * (c + dc) + r + dr)
+        cells.append((4 * c + r, neighbours))
+
+    table = []
+    for key in range(1 << 16):
+        result = 0
+        for i, (bit, neighbours) in enumerate(cells):
+            result |= rule.table[(key >> bit & 1) * 9 + bin(key & neighbours).count('1')] << i
+        table.append(result)
+    return table
+
+
+# Поле на таблице переходов блоков без сторонних зависимостей. Доска хранится плоским bytearray
+# (по байту на клетку) и считается блоками 2x2: окрестность 4x4 каждого блока собирается в 16-битный ключ,
+# а следующее состояние блока берётся из таблицы (см. build_block_table). Ключи целой полосы блоков собираются
+# операциями над длинными целыми, так что в цикле на Python остаётся только поиск по таблице
+class BlockField(Field):
+    # Таблицы строятся один раз на правило и общие для всех полей
+    TABLES: Dict[Rule, List[int]] = {}
+
+    def __init__(self, size_x: int = 25, size_y: int = 25):
+        self.cells: bytearray = ...
+        # Доска до последнего шага - изменения вычисляются по ней лениво, только когда их спрашивают
+        self.previous_cells: Optional[bytearray] = None
+        # Таблица текущего правила; строится при первом шаге (None - ещё не построена), чтобы не задерживать запуск
+        self.table: Optional[List[int]] = None
+        self.__blocks = (size_x + 1) // 2
+        # Маска чётных байтов полосы: байт 2k - столбцы блока k
+        self.__even_mask = int.from_bytes(b'\xff\x00' * self.__blocks, 'little')
+        # Для каждой строки, кроме числа живых клеток (см. Field), - первая и последняя живая клетка
+        # (w и -1 у пустой). Шаг считает их по каждой записанной строке, правки - только по изменённым строкам
+        self.row_firsts: List[int] = ...
+        self.row_lasts: List[int] = ...
+        super().__init__(size_x, size_y)
+
+    def set_rule(self, rule: Rule) -> None:
+        super().set_rule(rule)
+        self.table = self.TABLES.get(rule)
+
+    def get_table(self) -> List[int]:
+        if self.table is None:
+            rule = self.get_rule()
+            if rule not in self.TABLES:
+                self.TABLES[rule] = build_block_table(rule)
+            self.table = self.TABLES[rule]
+        return self.table
+
+    def clear(self) -> None:
+        self.cells = bytearray(self.get_size_x() * self.get_size_y())
+        self.previous_cells = None
+        self.count_rows()
+
+    # Пересчёт счётчиков строк [y0, y1) (по умолчанию - всех) по клеткам доски
+    def count_rows(self, y0: int = 0, y1: Optional[int] = None) -> None:
+        w, h = self.get_size()
+        if y1 is None:
+            self.population, self.row_counts, self.row_firsts, self.row_lasts = 0, [0] * h, [w] * h, [-1] * h
+            y0, y1 = 0, h
+        cells, alive = self.cells, self.Cell.ALIVE
+        for y in range(y0, y1):
+            start = y * w
+            count = cells.count(alive, start, start + w)
+            self.population += count - self.row_counts[y]
+            self.row_counts[y] = count
+            self.row_firsts[y] = cells.find(alive, start, start + w) - start if count else w
+            self.row_lasts[y] = cells.rfind(alive, start, start + w) - start if count else -1
+        self.bounding_box = ...
+
+    def get_cell_state(self, x: int, y: int) -> int:
+        return self.cells[y * self.get_size_x() + x]
+
+    def set_cell_state(self, x: int, y: int, state: int) -> None:
+        if state not in (self.Cell.DEAD, self.Cell.ALIVE):
+            raise ValueError('Cell can only be DEAD (0) or ALIVE (1)')
+        i = y * self.get_size_x() + x
+        if self.cells[i] == state:
+            return
+        self.cells[i] = state
+        if state == self.Cell.ALIVE:
+            self.population += 1
+            self.row_counts[y] += 1
+            self.row_firsts[y], self.row_lasts[y] = min(self.row_firsts[y], x), max(self.row_lasts[y], x)
+            self.bounding_box = ...
+        elif x in (self.row_firsts[y], self.row_lasts[y]):
+            # Умерла крайняя клетка строки - новую крайнюю ищем по строке
+            self.count_rows(y, y + 1)
+        else:
+            self.population -= 1
+            self.row_counts[y] -= 1
+
+    def load_bitmap(self, bitmap: Any, stride: int) -> None:
+        w, h = self.get_size()
+        if stride * 8 < w or len(memoryview(bitmap).cast('B')) < stride * h:
+            raise ValueError('Bitmap size does not match field size')
+        self.cells = bitmap_to_cells(bitmap, stride, w, h)
+        self.previous_cells = None
+        self.count_rows()
+
+    # Прямоугольные правки идут срезами строк доски, а не по клеткам
+    def fill_rect(self, x: int, y: int, w: int, h: int, state: int) -> None:
+        if state not in (self.Cell.DEAD, self.Cell.ALIVE):
+            raise ValueError('Cell can only be DEAD (0) or ALIVE (1)')
+        rect = clip_rect(x, y, w, h, *self.get_size())
+        if rect is None:
+            return
+        x0, y0, x1, y1 = rect
+        size_x, row = self.get_size_x(), bytes((state,)) * (x1 - x0)
+        for cy in range(y0, y1):
+            self.cells[cy * size_x + x0:cy * size_x + x1] = row
+        self.count_rows(y0, y1)
+
+    def paste(self, bitmap: Any, stride: int, size: Tuple[int, int], x: int, y: int) -> None:
+        pw, ph = size
+        data = memoryview(bitmap).cast('B')
+        if stride * 8 < pw or len(data) < stride * ph:
+            raise ValueError('Bitmap size does not match pattern size')
+        rect = clip_rect(x, y, pw, ph, *self.get_size())
+        if rect is None:
+            return
+        x0, y0, x1, y1 = rect
+        size_x = self.get_size_x()
+        for cy in range(y0, y1):
+            py = cy - y
+            value = int.from_bytes(data[py * stride:(py + 1) * stride], 'little') >> x0 - x
+            if not value:
+                continue
+            # Младший бит - первая клетка, поэтому двоичная запись разворачивается
+            row = format(value, f'0{stride * 8}b')[::-1][:x1 - x0].encode().translate(DIGITS_TO_CELLS)
+            start = cy * size_x + x0
+            cells = int.from_bytes(self.cells[start:start + x1 - x0], 'little') | int.from_bytes(row, 'little')
+            self.cells[start:start + x1 - x0] = cells.to_bytes(x1 - x0, 'little')
+        self.count_rows(y0, y1)
+
+    def random_fill(self, x: int, y: int, w: int, h: int, density: float, seed: Optional[int] = None) -> None:
+        soup = make_soup(max(w, 0), max(h, 0), density, seed)
+        rect = clip_rect(x, y, w, h, *self.get_size())
+        if rect is None:
+            return
+        x0, y0, x1, y1 = rect
+        size_x = self.get_size_x()
+        for cy in range(y0, y1):
+            start = (cy - y) * w + x0 - x
+            self.cells[cy * size_x + x0:cy * size_x + x1] = soup[start:start + x1 - x0]
+        self.count_rows(y0, y1)
+
+    def load_matrix(self, matrix: List[List[Field.Cell]]) -> None:
+        if (len(matrix), len(matrix[0]) if matrix else 0) != (self.get_size_y(), self.get_size_x()):
+            raise ValueError('Matrix size does not match field size')
+        self.cells = bytearray(cell.get_state() for row in matrix for cell in row)
+        self.previous_cells = None
+        self.count_rows()
+
+    def to_matrix(self) -> List[List[Field.Cell]]:
+        w = self.get_size_x()
+        return [[self.Cell(x, y, self.cells[y * w + x]) for x in range(w)] for y in range(self.get_size_y())]
+
+    def alive_nearby(self, cell: Field.Cell) -> int:
+        x, y = cell.get_pos()
+        max_x, max_y = self.get_size()
+        return sum(self.cells[(y + ry) % max_y * max_x + (x + rx) % max_x]
+                   for ry in range(-1, 2) for rx in range(-1, 2) if (ry, rx) != (0, 0))
+
+    # Строка с заворотом по тору в виде длинного целого: байт i - клетка (i - 1) % w, всего w + 3 байта,
+    # чтобы окрестность любого блока строки лежала в ней целиком
+    def __wrapped_row(self, y: int) -> int:
+        w = self.get_size_x()
+        row = self.cells[y * w:(y + 1) * w]
+        return int.from_bytes((row * 4)[w - 1:2 * w + 2], 'little')
+
+    def step(self) -> None:
+        w, h = self.get_size()
+        blocks, even_mask, table = self.__blocks, self.__even_mask, self.get_table()
+        # Пустая окрестность остаётся пустой, если правило без B0
+        skip_empty = not table[0]
+        rows = [self.__wrapped_row(y) for y in range(h)]
+        cells = bytearray(w * h)
+        line = bytearray(2 * blocks)
+        # Счётчики нового поколения: пропущенные полосы пусты, записанные строки считаются сразу
+        row_counts, row_firsts, row_lasts = [0] * h, [w] * h, [-1] * h
+
+        for y in range(0, h, 2):
+            # Байт i: полубайт столбца i - 1 из четырёх строк y - 1 .. y + 2
+            v = rows[y - 1] | rows[y] << 1 | rows[(y + 1) % h] << 2 | rows[(y + 2) % h] << 3
+            if not v and skip_empty:
+                continue
+            # Байт i - столбцы i - 1 и i, ключ блока k - байты 2k и 2k + 2
+            v |= v >> 4
+            keys = array('H')
+            keys.frombytes(((v & even_mask) | (v >> 16 & even_mask) << 8).to_bytes(2 * blocks, 'little'))
+            if sys.byteorder == 'big':
+                keys.byteswap()
+            results = bytes([table[key] for key in keys])
+
+            # Строки блока собираются чередованием левых и правых клеток; у нечётного поля
+            # лишний столбец (строка) - это завёрнутый нулевой, он уже посчитан первым блоком
+            for dy in range(2):
+                if y + dy < h:
+                    line[0::2] = results.translate(BLOCK_CELL_STATES[2 * dy])
+                    line[1::2] = results.translate(BLOCK_CELL_STATES[2 * dy + 1])
+                    cells[(y + dy) * w:(y + dy + 1) * w] = memoryview(line)[:w]
+                    count = line.count(self.Cell.ALIVE, 0, w)
+                    if count:
+                        row_counts[y + dy] = count
+                        row_firsts[y + dy] = line.find(self.Cell.ALIVE, 0, w)
+                        row_lasts[y + dy] = line.rfind(self.Cell.ALIVE, 0, w)
+
+        self.previous_cells = self.cells
+        self.cells = cells
+        self.population, self.row_counts, self.row_firsts, self.row_lasts = \
+            sum(row_counts), row_counts, row_firsts, row_lasts
+        self.bounding_box = ...
+
+    def get_changes(self, limit: Optional[int] = None) -> Optional[List[Tuple[int, int]]]:
+        if self.previous_cells is None:
+            return None
+        # Клетки - нули и единицы, поэтому XOR досок даёт единицы ровно в изменившихся клетках
+        previous = int.from_bytes(self.previous_cells, 'little')
+        changed = (previous ^ int.from_bytes(self.cells, 'little')).to_bytes(len(self.cells), 'little')
+        if limit is not None and len(changed) - changed.count(0) > limit:
+            return None
+
+        w = self.get_size_x()
+        changes = []
+        i = changed.find(1)
+        while i != -1:
+            y, x = divmod(i, w)
+            changes.append((x, y))
+            i = changed.find(1, i + 1)
+        return changes
+
+    def get_raster(self, x0: int = 0, y0: int = 0) -> Tuple[bytearray, int, int]:
+        return self.cells, 8, self.get_size_x()
+
+    def get_bounding_box(self) -> Optional[Tuple[int, int, int, int]]:
+        if self.bounding_box is ...:
+            ys = get_counts_bounds(self.row_counts)
+            if ys is None:
+                self.bounding_box = None
+            else:
+                y0, y1 = ys
+                self.bounding_box = min(self.row_firsts[y0:y1 + 1]), y0, max(self.row_lasts[y0:y1 + 1]), y1
+        return self.bounding_box
+
+    def get_alives(self) -> List[Tuple[int, int]]:
+        w = self.get_size_x()
+        cells = self.cells
+
+        alives = []
+        i = cells.find(self.Cell.ALIVE)
+        while i != -1:
+            y, x = divmod(i, w)
+            alives.append((x, y))
+            i = cells.find(self.Cell.ALIVE, i + 1)
+        return alives
@@ -0,0 +1,51 @@
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from field.field import Field
+
+
+# Поиск циклов по хешу поля (см. Field.get_hash): хранит хеши последних max_generations поколений
+# и замечает, когда поле повторилось. Натюрморт - цикл с периодом 1.
+# Если поколения считаются по несколько за шаг, хеш берётся только после шага, и тогда найденный период
+# может быть кратен настоящему, а начало цикла - позже настоящего на шаг. Для пропуска цикла этого достаточно:
+# поле всё равно повторяется через найденный период
+class CycleDetector:
+    def __init__(self, max_generations: int = 4096) -> None:
+        self.max_generations = max_generations
+        # Хеш -> поколение, на котором поле впервые было таким
+        self.generations: Dict[int, int] = {}
+        self.hashes: Deque[int] = deque()
+        self.hash: Optional[int] = None
+        # (поколение начала цикла, период)
+        self.cycle: Optional[Tuple[int, int]] = None
+
+    def get_cycle(self) -> Optional[Tuple[int, int]]:
+        return self.cycle
+
+    def reset(self) -> None:
+        self.generations = {}
+        self.hashes.clear()
+        self.hash = None
+        self.cycle = None
+
+    # Поле после шага на generations поколений (0 - начальное поле), generation - номер поколения после шага.
+    # Возвращает найденный цикл или None
+    def update(self, field: Field, generation: int, generations: int = 1) -> Optional[Tuple[int, int]]:
+        if self.cycle is not None:
+            return self.cycle
+
+        if self.hash is None or generations != 1:
+            self.hash = field.get_hash()
+        else:
+            self.hash = field.update_hash(self.hash)
+
+        start = self.generations.get(self.hash)
+        if start is not None:
+            self.cycle = start, generation - start
+            return self.cycle
+
+        self.generations[self.hash] = generation
+        self.hashes.append(self.hash)
+        if len(self.hashes) > self.max_generations:
+            del self.generations[self.hashes.popleft()]
+        return None
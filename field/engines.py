@@ -0,0 +1,27 @@
+from importlib import import_module
+from typing import Dict, Tuple, Type
+
+from field.field import Field
+
+# Доступные движки симуляции: имя -> (модуль, класс поля).
+# Модули импортируются лениво, чтобы отсутствие необязательной зависимости (например, NumPy)
+# ломало только соответствующий движок, а не всю программу
+ENGINES: Dict[str, Tuple[str, str]] = {
+    'python': ('field.field', 'Field'),
+    'numpy': ('field.numpy_field', 'NumpyField'),
+    'bitboard': ('field.bitboard_field', 'BitboardField'),
+    'active': ('field.active_field', 'ActiveRegionField'),
+    'block': ('field.block_field', 'BlockField'),
+    'hashlife': ('field.hashlife_field', 'HashLifeField'),
+    'sparse': ('field.sparse_field', 'SparseField'),
+    'parallel': ('field.parallel_field', 'ParallelField'),
+}
+DEFAULT_ENGINE = 'numpy'
+FALLBACK_ENGINE = 'block'
+
+
+def get_field_class(engine: str) -> Type[Field]:
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown field engine: {engine}')
+    module, name = ENGINES[engine]
+    return getattr(import_module(module), name)
@@ -1,8 +1,119 @@
-from typing import Tuple, List
+import random
+from typing import Tuple, List, Optional, Any, Iterable, Sequence
+
+from field.rule import Rule
+
+# Перевод байтов 0/1 в цифры двоичной записи и обратно (для упаковки строк битовой карты без NumPy)
+CELLS_TO_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+DIGITS_TO_CELLS = bytes.maketrans(b'01', b'\x00\x01')
+
+
+# Распаковка битовой карты (см. Field.to_bitmap) в доску по байту на клетку (строки по w байт)
+def bitmap_to_cells(bitmap: Any, stride: int, w: int, h: int) -> bytearray:
+    data = memoryview(bitmap).cast('B')
+    cells = bytearray(w * h)
+    for y in range(h):
+        value = int.from_bytes(data[y * stride:(y + 1) * stride], 'little')
+        if value:
+            # Младший бит - первая клетка, поэтому двоичная запись разворачивается
+            row = format(value, f'0{stride * 8}b')[::-1][:w]
+            cells[y * w:(y + 1) * w] = row.encode().translate(DIGITS_TO_CELLS)
+    return cells
+
+
+# Константы splitmix64 для ключей клеток в хеше поля
+HASH_MASK = (1 << 64) - 1
+HASH_GAMMA = 0x9E3779B97F4A7C15
+HASH_MIX_1 = 0xBF58476D1CE4E5B9
+HASH_MIX_2 = 0x94D049BB133111EB
+
+
+# Ключ клетки для хеша Зобриста. Вместо таблицы случайных чисел - перемешанные координаты (splitmix64):
+# таблица не нужна, а ключи есть и у клеток неограниченных полей
+def get_cell_key(x: int, y: int) -> int:
+    z = ((x & 0xFFFFFFFF) << 32 | y & 0xFFFFFFFF) + HASH_GAMMA & HASH_MASK
+    z = (z ^ z >> 30) * HASH_MIX_1 & HASH_MASK
+    z = (z ^ z >> 27) * HASH_MIX_2 & HASH_MASK
+    return z ^ z >> 31
+
+
+def hash_cells(cells: Iterable[Tuple[int, int]]) -> int:
+    h = 0
+    for x, y in cells:
+        h ^= get_cell_key(x, y)
+    return h
+
+
+# Наименьший прямоугольник, в котором лежат все клетки: (x0, y0, x1, y1) включительно. None, если клеток нет
+def get_cells_bounding_box(cells: Iterable[Tuple[int, int]]) -> Optional[Tuple[int, int, int, int]]:
+    box = None
+    for x, y in cells:
+        if box is None:
+            box = [x, y, x, y]
+        else:
+            box = [min(box[0], x), min(box[1], y), max(box[2], x), max(box[3], y)]
+    return None if box is None else tuple(box)
+
+
+# Первый и последний номер ненулевого счётчика (строки или столбца): (first, last). None, если все нулевые.
+# Поиск идёт с обоих концов до первого занятого, поэтому пустые края не просматриваются целиком
+def get_counts_bounds(counts: Sequence[int]) -> Optional[Tuple[int, int]]:
+    first = next((i for i, count in enumerate(counts) if count), None)
+    if first is None:
+        return None
+    last = next(i for i in range(len(counts) - 1, first - 1, -1) if counts[i])
+    return first, last
+
+
+# Клетки отрезка от (x0, y0) до (x1, y1) включительно (алгоритм Брезенхэма): соседние клетки отрезка
+# касаются хотя бы углом, поэтому быстрое движение мыши не оставляет разрывов
+def get_line_cells(x0: int, y0: int, x1: int, y1: int) -> List[Tuple[int, int]]:
+    dx, dy = abs(x1 - x0), -abs(y1 - y0)
+    sx, sy = 1 if x0 < x1 else -1, 1 if y0 < y1 else -1
+    error = dx + dy
+    cells = [(x0, y0)]
+    while (x0, y0) != (x1, y1):
+        e2 = 2 * error
+        if e2 >= dy:
+            error += dy
+            x0 += sx
+        if e2 <= dx:
+            error += dx
+            y0 += sy
+        cells.append((x0, y0))
+    return cells
+
+
+# Прямоугольник w x h с углом в (x, y), обрезанный по полю size_x на size_y: (x0, y0, x1, y1),
+# правая и нижняя границы не включены. None, если он не задевает поле
+def clip_rect(x: int, y: int, w: int, h: int, size_x: int, size_y: int) -> Optional[Tuple[int, int, int, int]]:
+    x0, y0, x1, y1 = max(x, 0), max(y, 0), min(x + w, size_x), min(y + h, size_y)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return x0, y0, x1, y1
+
+
+# Случайный "суп" w x h построчно по байту на клетку: каждая клетка жива с вероятностью density.
+# Один и тот же seed даёт один и тот же суп на любом движке
+def make_soup(w: int, h: int, density: float, seed: Optional[int] = None) -> bytes:
+    if not 0 <= density <= 1:
+        raise ValueError('Density must be between 0 and 1')
+    threshold = round(256 * density)
+    table = bytes(int(b < threshold) for b in range(256))
+    return random.Random(seed).randbytes(w * h).translate(table)
 
 
 # Класс поля. Весь алгоритм симуляции просчитывается в нём
 class Field:
+    # Замкнуто ли поле в тор размером size_x на size_y.
+    # У неограниченных полей размер задаёт только окно, а координаты клеток могут выходить за него
+    BOUNDED = True
+    # Поддерживает ли движок правила с рождением при нуле соседей (B0): пустое пространство оживает целиком,
+    # поэтому движкам, которые считают только окрестности живых клеток, такие правила недоступны
+    SUPPORTS_BIRTH_ON_ZERO = True
+    # Сторона квадратного участка поля, для которого отдельно считается число живых клеток
+    TILE_SIZE = 16
+
     class Cell:
         DEAD = 0
         ALIVE = 1
@@ -26,13 +137,214 @@ class Field:
 
     def __init__(self, size_x: int = 25, size_y: int = 25):
         self.__size = self.__size_x, self.__size_y = size_x, size_y
-        self.matrix = [[self.Cell(x, y) for x in range(size_x)] for y in range(size_y)]
+        # Клетки поля. Пустое поле описывают одни счётчики, поэтому клетки создаются при первой правке (None - ещё нет)
+        self.matrix: Optional[List[List[Field.Cell]]] = ...
         self.buffer = ...
+        # Клетки, изменившиеся за последний вызов step (None - неизвестно)
+        self.changes: Optional[List[Tuple[int, int]]] = None
+        # Число живых клеток: всего, по строкам, по столбцам и по участкам TILE_SIZE x TILE_SIZE.
+        # Обновляется при правках и во время step, поэтому пустые области пропускаются без проверки их клеток
+        self.population = 0
+        self.row_counts: List[int] = ...
+        self.column_counts: List[int] = ...
+        self.tile_counts: List[List[int]] = ...
+        # Описывающий прямоугольник выводится из счётчиков строк и столбцов и запоминается до их изменения
+        # (... - ещё не выведен)
+        self.bounding_box: Optional[Tuple[int, int, int, int]] = ...
+        self.rule: Rule = ...
+        self.set_rule(Rule())
+        self.clear()
 
     def get_size(self) -> Tuple[int, int]: return self.__size
     def get_size_x(self) -> int: return self.__size_x
     def get_size_y(self) -> int: return self.__size_y
 
+    def get_rule(self) -> Rule:
+        return self.rule
+
+    # Смена правила. Наследники, которые компилируют правило в свой вид или кэшируют результаты шагов,
+    # переопределяют этот метод
+    def set_rule(self, rule: Rule) -> None:
+        if rule.has_birth_on_zero() and not self.SUPPORTS_BIRTH_ON_ZERO:
+            raise ValueError(f'Rule {rule} is not supported by this engine')
+        self.rule = rule
+
+    # Очистка поля - все клетки мертвы.
+    # Наследники, хранящие поле по-своему, переопределяют этот метод вместо __init__
+    def clear(self) -> None:
+        self.matrix = None
+        self.__reset_counts()
+
+    def __get_matrix(self) -> List[List[Cell]]:
+        if self.matrix is None:
+            self.matrix = [[self.Cell(x, y) for x in range(self.__size_x)] for y in range(self.__size_y)]
+        return self.matrix
+
+    def __reset_counts(self) -> None:
+        t = self.TILE_SIZE
+        self.population = 0
+        self.row_counts = [0] * self.__size_y
+        self.column_counts = [0] * self.__size_x
+        self.tile_counts = [[0] * ((self.__size_x + t - 1) // t) for _ in range((self.__size_y + t - 1) // t)]
+        self.bounding_box = ...
+
+    # Пересчёт статистики по всему полю - после загрузки целой матрицы
+    def __count_cells(self) -> None:
+        self.__reset_counts()
+        for y, row in enumerate(self.matrix):
+            for x, cell in enumerate(row):
+                if cell.get_state() == self.Cell.ALIVE:
+                    self.__count_cell(x, y, 1)
+
+    # Клетка (x, y) родилась (delta = 1) или умерла (delta = -1)
+    def __count_cell(self, x: int, y: int, delta: int) -> None:
+        self.population += delta
+        self.row_counts[y] += delta
+        self.column_counts[x] += delta
+        self.tile_counts[y // self.TILE_SIZE][x // self.TILE_SIZE] += delta
+        self.bounding_box = ...
+
+    # Доступ к отдельной клетке по координатам - им пользуется UI,
+    # чтобы не зависеть от того, как именно движок хранит поле
+    def get_cell_state(self, x: int, y: int) -> int:
+        if self.matrix is None:
+            return self.Cell.DEAD
+        return self.matrix[y][x].get_state()
+
+    def set_cell_state(self, x: int, y: int, state: int) -> None:
+        cell = self.__get_matrix()[y][x]
+        previous = cell.get_state()
+        cell.set_state(state)
+        if state != previous:
+            self.__count_cell(x, y, state - previous)
+
+    # Правки многих клеток сразу: рисование мышью, заливка, вставка паттерна, случайный суп.
+    # Здесь они идут поклеточно через set_cell_state, движки с плотной доской переопределяют их целыми массивами.
+    # У ограниченных полей всё, что выходит за край, отбрасывается
+
+    # Переводит клетки cells в state и возвращает те, что действительно изменились (каждую по разу)
+    def set_cells(self, cells: Iterable[Tuple[int, int]], state: int) -> List[Tuple[int, int]]:
+        if state not in (self.Cell.DEAD, self.Cell.ALIVE):
+            raise ValueError('Cell can only be DEAD (0) or ALIVE (1)')
+        w, h = self.get_size()
+        changed = []
+        for x, y in cells:
+            if self.BOUNDED and not (0 <= x < w and 0 <= y < h):
+                continue
+            if self.get_cell_state(x, y) != state:
+                self.set_cell_state(x, y, state)
+                changed.append((x, y))
+        return changed
+
+    # Часть прямоугольника w x h с углом в (x, y), которую можно править: (x0, y0, x1, y1) без правой и нижней
+    # границы. Неограниченное поле не обрезается
+    def __get_edit_rect(self, x: int, y: int, w: int, h: int) -> Optional[Tuple[int, int, int, int]]:
+        if self.BOUNDED:
+            return clip_rect(x, y, w, h, *self.get_size())
+        return (x, y, x + w, y + h) if w > 0 and h > 0 else None
+
+    def fill_rect(self, x: int, y: int, w: int, h: int, state: int) -> None:
+        rect = self.__get_edit_rect(x, y, w, h)
+        if rect is None:
+            return
+        x0, y0, x1, y1 = rect
+        self.set_cells(((cx, cy) for cy in range(y0, y1) for cx in range(x0, x1)), state)
+
+    # Накладывает паттерн - битовую карту размером size (формат to_bitmap) - углом в (x, y):
+    # его живые клетки оживают, остальные клетки поля не меняются
+    def paste(self, bitmap: Any, stride: int, size: Tuple[int, int], x: int, y: int) -> None:
+        pw, ph = size
+        data = memoryview(bitmap).cast('B')
+        if stride * 8 < pw or len(data) < stride * ph:
+            raise ValueError('Bitmap size does not match pattern size')
+        rect = self.__get_edit_rect(x, y, pw, ph)
+        if rect is None:
+            return
+        x0, y0, x1, y1 = rect
+
+        cells = []
+        for py in range(y0 - y, y1 - y):
+            value = int.from_bytes(data[py * stride:(py + 1) * stride], 'little')
+            if not value:
+                continue
+            digits = format(value, 'b')[::-1]
+            px = digits.find('1', x0 - x)
+            while px != -1 and px < x1 - x:
+                cells.append((x + px, y + py))
+                px = digits.find('1', px + 1)
+        self.set_cells(cells, self.Cell.ALIVE)
+
+    # Заполняет прямоугольник случайным супом плотности density (см. make_soup).
+    # Суп строится для всего прямоугольника, поэтому обрезка краем поля не меняет остальные клетки
+    def random_fill(self, x: int, y: int, w: int, h: int, density: float, seed: Optional[int] = None) -> None:
+        soup = make_soup(max(w, 0), max(h, 0), density, seed)
+        rect = self.__get_edit_rect(x, y, w, h)
+        if rect is None:
+            return
+        x0, y0, x1, y1 = rect
+        self.fill_rect(x0, y0, x1 - x0, y1 - y0, self.Cell.DEAD)
+
+        cells = []
+        for sy in range(y0 - y, y1 - y):
+            start, end = sy * w + x0 - x, sy * w + x1 - x
+            i = soup.find(self.Cell.ALIVE, start, end)
+            while i != -1:
+                cells.append((x + i - sy * w, y + sy))
+                i = soup.find(self.Cell.ALIVE, i + 1, end)
+        self.set_cells(cells, self.Cell.ALIVE)
+
+    # Загрузка/выгрузка поля в виде матрицы клеток (формат SaveFileHandler)
+    def load_matrix(self, matrix: List[List[Cell]]) -> None:
+        if (len(matrix), len(matrix[0]) if matrix else 0) != (self.__size_y, self.__size_x):
+            raise ValueError('Matrix size does not match field size')
+        self.matrix = matrix
+        self.__count_cells()
+
+    def to_matrix(self) -> List[List[Cell]]:
+        return self.__get_matrix()
+
+    # Длина строки битовой карты в байтах: строка выравнивается до целых 64-битных слов
+    @staticmethod
+    def get_bitmap_stride(size_x: int) -> int:
+        return (size_x + 63) // 64 * 8
+
+    # Загрузка/выгрузка поля битовой картой (формат .sav): строки по stride байт, по биту на клетку,
+    # младший бит байта первым. Движки с плотным хранением доски переопределяют их без поклеточного прохода
+    def to_bitmap(self) -> Tuple[Any, int]:
+        raster, bits, bytes_per_line = self.get_raster()
+        if bits == 1:
+            return raster, bytes_per_line
+
+        w, h = self.get_size()
+        stride = self.get_bitmap_stride(w)
+        raster = bytes(raster)
+        bitmap = bytearray(stride * h)
+        for y in range(h):
+            row = raster[y * bytes_per_line:y * bytes_per_line + w]
+            if row.count(self.Cell.DEAD) == w:
+                continue
+            # Клетка 0 должна попасть в младший бит, поэтому строка разворачивается
+            value = int(row[::-1].translate(CELLS_TO_DIGITS), 2)
+            bitmap[y * stride:(y + 1) * stride] = value.to_bytes(stride, 'little')
+        return bitmap, stride
+
+    def load_bitmap(self, bitmap: Any, stride: int) -> None:
+        w, h = self.get_size()
+        data = memoryview(bitmap).cast('B')
+        if stride * 8 < w or len(data) < stride * h:
+            raise ValueError('Bitmap size does not match field size')
+
+        self.clear()
+        for y in range(h):
+            value = int.from_bytes(data[y * stride:(y + 1) * stride], 'little')
+            if not value:
+                continue
+            digits = format(value, 'b')[::-1]
+            x = digits.find('1')
+            while x != -1 and x < w:
+                self.set_cell_state(x, y, self.Cell.ALIVE)
+                x = digits.find('1', x + 1)
+
     def alive_nearby(self, cell: Cell) -> int:
         x, y = cell.get_pos()
         max_x, max_y = self.get_size()
@@ -46,30 +358,117 @@ class Field:
         return an
 
     def check_cell(self, cell: Cell) -> int:
-        state = cell.get_state()
-        an = self.alive_nearby(cell)
-
-        if (state == 0 and an == 3) or (state == 1 and an in (2, 3)):
-            return self.Cell.ALIVE
-        return self.Cell.DEAD
+        return self.rule.table[cell.get_state() * 9 + self.alive_nearby(cell)]
 
+    # Поле проходится участками: если участок и все соседние с ним пусты, его клетки остаются мёртвыми
+    # и не проверяются (кроме правил с B0, где пустота оживает). Статистика нового поколения копится по ходу
     def step(self) -> None:
-        self.buffer = [[self.Cell(x, y) for x in range(self.__size_x)] for y in range(self.__size_y)]
+        # Пустое поле без B0 пустым и остаётся - клетки для него не создаются
+        if not self.population and not self.rule.table[0]:
+            self.changes = []
+            return
+        self.__get_matrix()
+        w, h, t = self.__size_x, self.__size_y, self.TILE_SIZE
+        self.buffer = [[self.Cell(x, y) for x in range(w)] for y in range(h)]
+        self.changes = []
+        tile_counts = self.tile_counts
+        tiles_x, tiles_y = len(tile_counts[0]) if tile_counts else 0, len(tile_counts)
+        skip_empty = not self.rule.table[0]
+        self.__reset_counts()
+        row_counts, column_counts = self.row_counts, self.column_counts
 
-        for y, row in enumerate(self.matrix):
-            for x, cell in enumerate(row):
-                state = self.check_cell(cell)
-                self.buffer[y][x].set_state(state)
+        for ty in range(tiles_y):
+            for tx in range(tiles_x):
+                if skip_empty and not any(tile_counts[(ty + dy) % tiles_y][(tx + dx) % tiles_x]
+                                          for dy in range(-1, 2) for dx in range(-1, 2)):
+                    continue
+                alive = 0
+                for y in range(ty * t, min((ty + 1) * t, h)):
+                    row, buffer_row = self.matrix[y], self.buffer[y]
+                    x0 = tx * t
+                    for x, cell in enumerate(row[x0:x0 + t], x0):
+                        state = self.check_cell(cell)
+                        if state == self.Cell.ALIVE:
+                            buffer_row[x].set_state(state)
+                            row_counts[y] += 1
+                            column_counts[x] += 1
+                            alive += 1
+                        if state != cell.get_state():
+                            self.changes.append((x, y))
+                self.tile_counts[ty][tx] = alive
+                self.population += alive
 
         self.matrix = self.buffer[:]
 
+    # Клетки, изменившиеся за последний вызов step. None, если движок этого не знает
+    # или изменений больше limit - тогда дешевле перерисовать всё поле целиком
+    def get_changes(self, limit: Optional[int] = None) -> Optional[List[Tuple[int, int]]]:
+        if self.changes is None or (limit is not None and len(self.changes) > limit):
+            return None
+        return self.changes
+
+    # Хеш поля (Зобрист): XOR ключей живых клеток. Равные поля дают равный хеш
+    def get_hash(self) -> int:
+        return hash_cells(self.get_alives())
+
+    # Хеш после последнего step по хешу до него: каждое рождение и каждая смерть переключают ключ своей клетки,
+    # поэтому пересчитываются только изменившиеся клетки
+    def update_hash(self, h: int) -> int:
+        changes = self.get_changes()
+        if changes is None:
+            return self.get_hash()
+        return h ^ hash_cells(changes)
+
+    # Освобождение ресурсов движка (процессов, разделяемой памяти). Обычному полю освобождать нечего
+    def close(self) -> None:
+        pass
+
+    # Продвижение симуляции сразу на n поколений.
+    # Движки, умеющие прыгать через поколения (HashLife), переопределяют этот метод
+    def advance(self, n: int) -> None:
+        if n < 0:
+            raise ValueError('Cannot advance a negative number of generations')
+        for _ in range(n):
+            self.step()
+
+    # Окно поля size_x на size_y с левым верхним углом в (x0, y0) в виде растра для отрисовки картинкой:
+    # (буфер, бит на клетку, байт в строке). 8 бит - по байту на клетку, 1 бит - младший бит байта первым.
+    # Движки, хранящие доску сплошным буфером, отдают его без копирования (у ограниченных полей окно всегда в нуле)
+    def get_raster(self, x0: int = 0, y0: int = 0) -> Tuple[Any, int, int]:
+        w, h = self.get_size()
+        raster = bytearray(w * h)
+        for x, y in self.get_alives():
+            x, y = x - x0, y - y0
+            if 0 <= x < w and 0 <= y < h:
+                raster[y * w + x] = self.Cell.ALIVE
+        return raster, 8, w
+
+    # Число живых клеток. Наследники, хранящие поле по-своему, переопределяют этот метод
+    def get_population(self) -> int:
+        return self.population
+
+    # Наименьший прямоугольник с живыми клетками: (x0, y0, x1, y1) включительно. None, если поле пусто
+    def get_bounding_box(self) -> Optional[Tuple[int, int, int, int]]:
+        if self.bounding_box is ...:
+            ys, xs = get_counts_bounds(self.row_counts), get_counts_bounds(self.column_counts)
+            self.bounding_box = None if ys is None else (xs[0], ys[0], xs[1], ys[1])
+        return self.bounding_box
+
+    # Пустые строки и пустые участки строк пропускаются по счётчикам, без проверки клеток
     def get_alives(self) -> List[Tuple[int, int]]:
+        if self.matrix is None:
+            return []
+        t = self.TILE_SIZE
         alives = []
         for y, row in enumerate(self.matrix):
-            if all(c.get_state == self.Cell.DEAD for c in row):
+            if not self.row_counts[y]:
                 continue
-            for x, cell in enumerate(row):
-                if cell.get_state() == self.Cell.ALIVE:
-                    alives.append((x, y))
+            for tx, count in enumerate(self.tile_counts[y // t]):
+                if not count:
+                    continue
+                x0 = tx * t
+                for x, cell in enumerate(row[x0:x0 + t], x0):
+                    if cell.get_state() == self.Cell.ALIVE:
+                        alives.append((x, y))
 
-        return alives
\ No newline at end of file
+        return alives
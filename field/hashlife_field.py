@@ -0,0 +1,278 @@
+from typing import Tuple, List, Dict, Optional
+
+from field.field import Field, get_cells_bounding_box
+from field.rule import Rule
+
+
+# Узел квадродерева HashLife. Узел уровня k описывает квадрат 2^k x 2^k,
+# уровень 0 - отдельная клетка. Одинаковые узлы существуют в единственном экземпляре
+# (hash-consing), поэтому сравниваются и хешируются по идентичности
+class _Node:
+    __slots__ = ('nw', 'ne', 'sw', 'se', 'level', 'population')
+
+    def __init__(self, nw, ne, sw, se, level: int, population: int):
+        self.nw, self.ne, self.sw, self.se = nw, ne, sw, se
+        self.level = level
+        self.population = population
+
+
+# Поле на алгоритме HashLife: квадродерево с мемоизацией результата узла (RESULT)
+# и прыжками на степени двойки поколений, что позволяет за разумное время дойти до поколения 10^6 и дальше.
+# Поле не замкнуто в тор: вселенная бесконечна,
+# а size_x/size_y задают лишь окно, с которым работают to_matrix/load_matrix
+class HashLifeField(Field):
+    BOUNDED = False
+    # Пустой узел считается неизменным, иначе мемоизация пустого пространства невозможна
+    SUPPORTS_BIRTH_ON_ZERO = False
+
+    # Примерный объём памяти на один узел вместе с записью в кэше результатов
+    NODE_BYTES = 400
+    DEFAULT_CACHE_LIMIT_MB = 256
+
+    def __init__(self, size_x: int = 25, size_y: int = 25, cache_limit_mb: int = DEFAULT_CACHE_LIMIT_MB):
+        self.__dead = _Node(None, None, None, None, 0, 0)
+        self.__alive = _Node(None, None, None, None, 0, 1)
+        self.__nodes: Dict[Tuple[_Node, _Node, _Node, _Node], _Node] = {}
+        self.__results: Dict[Tuple[_Node, int], _Node] = {}
+        self.__empty: List[_Node] = [self.__dead]
+        self.__max_nodes = max(1, cache_limit_mb * 2 ** 20 // self.NODE_BYTES)
+
+        # Корень дерева и мировые координаты его левого верхнего угла
+        self.root: _Node = ...
+        self.origin_x: int = ...
+        self.origin_y: int = ...
+        super().__init__(size_x, size_y)
+
+    def clear(self) -> None:
+        level = max(2, (max(self.get_size()) - 1).bit_length())
+        self.root = self.__empty_node(level)
+        self.origin_x, self.origin_y = 0, 0
+
+    # Результаты узлов посчитаны по старому правилу; сами узлы от правила не зависят и остаются
+    def set_rule(self, rule: Rule) -> None:
+        super().set_rule(rule)
+        self.__results = {}
+
+    def get_cache_size(self) -> int:
+        return len(self.__nodes)
+
+    def __join(self, nw: _Node, ne: _Node, sw: _Node, se: _Node) -> _Node:
+        key = nw, ne, sw, se
+        node = self.__nodes.get(key)
+        if node is None:
+            node = _Node(nw, ne, sw, se, nw.level + 1,
+                         nw.population + ne.population + sw.population + se.population)
+            self.__nodes[key] = node
+        return node
+
+    def __empty_node(self, level: int) -> _Node:
+        while len(self.__empty) <= level:
+            e = self.__empty[-1]
+            self.__empty.append(self.__join(e, e, e, e))
+        return self.__empty[level]
+
+    # Обёртка узла пустой рамкой: узел уровня k становится центром узла уровня k + 1
+    def __expand(self) -> None:
+        root = self.root
+        e = self.__empty_node(root.level - 1)
+        self.root = self.__join(self.__join(e, e, e, root.nw), self.__join(e, e, root.ne, e),
+                                self.__join(e, root.sw, e, e), self.__join(root.se, e, e, e))
+        half = 1 << (root.level - 1)
+        self.origin_x -= half
+        self.origin_y -= half
+
+    def __inner(self, node: _Node) -> _Node:
+        return self.__join(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+    # Один шаг для узла 4x4 - прямой подсчёт соседей для центральных 2x2 клеток
+    def __life_4x4(self, node: _Node) -> _Node:
+        grid = [[0] * 4 for _ in range(4)]
+        for qy, qx, quad in ((0, 0, node.nw), (0, 2, node.ne), (2, 0, node.sw), (2, 2, node.se)):
+            grid[qy][qx] = quad.nw.population
+            grid[qy][qx + 1] = quad.ne.population
+            grid[qy + 1][qx] = quad.sw.population
+            grid[qy + 1][qx + 1] = quad.se.population
+
+        leaves = []
+        table = self.rule.table
+        for y in (1, 2):
+            for x in (1, 2):
+                an = sum(grid[y + ry][x + rx] for ry in range(-1, 2) for rx in range(-1, 2)) - grid[y][x]
+                if table[grid[y][x] * 9 + an] == self.Cell.ALIVE:
+                    leaves.append(self.__alive)
+                else:
+                    leaves.append(self.__dead)
+        return self.__join(*leaves)
+
+    # RESULT: центральная половина узла уровня k через 2^j поколений (j <= k - 2)
+    def __successor(self, node: _Node, j: int) -> _Node:
+        j = min(j, node.level - 2)
+        key = node, j
+        result = self.__results.get(key)
+        if result is not None:
+            return result
+
+        if node.population == 0:
+            result = self.__empty_node(node.level - 1)
+        elif node.level == 2:
+            result = self.__life_4x4(node)
+        else:
+            join, succ = self.__join, self.__successor
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            c1 = succ(nw, j)
+            c2 = succ(join(nw.ne, ne.nw, nw.se, ne.sw), j)
+            c3 = succ(ne, j)
+            c4 = succ(join(nw.sw, nw.se, sw.nw, sw.ne), j)
+            c5 = succ(join(nw.se, ne.sw, sw.ne, se.nw), j)
+            c6 = succ(join(ne.sw, ne.se, se.nw, se.ne), j)
+            c7 = succ(sw, j)
+            c8 = succ(join(sw.ne, se.nw, sw.se, se.sw), j)
+            c9 = succ(se, j)
+
+            if j < node.level - 2:
+                # Прыжок короче максимального - берём центры уже посчитанных кусков
+                result = join(join(c1.se, c2.sw, c4.ne, c5.nw), join(c2.se, c3.sw, c5.ne, c6.nw),
+                              join(c4.se, c5.sw, c7.ne, c8.nw), join(c5.se, c6.sw, c8.ne, c9.nw))
+            else:
+                # Максимальный прыжок - две половины по 2^(k-3) поколений
+                result = join(succ(join(c1, c2, c4, c5), j), succ(join(c2, c3, c5, c6), j),
+                              succ(join(c4, c5, c7, c8), j), succ(join(c5, c6, c8, c9), j))
+
+        self.__results[key] = result
+        return result
+
+    # Прыжок ровно на 2^j поколений
+    def __jump(self, j: int) -> None:
+        # Корень должен быть достаточно большим, а всё живое - лежать в его центральной половине,
+        # тогда после ещё одного расширения за 2^j поколений ничто не выйдет за пределы результата
+        while self.root.level < j + 2 or self.__inner(self.root).population != self.root.population:
+            self.__expand()
+        self.__expand()
+
+        quarter = 1 << (self.root.level - 2)
+        self.root = self.__successor(self.root, j)
+        self.origin_x += quarter
+        self.origin_y += quarter
+
+    # Сборка мусора: оставляем только узлы, достижимые из корня, и сбрасываем кэш результатов
+    def __collect_garbage(self) -> None:
+        self.__results = {}
+        self.__nodes = {}
+
+        stack = [self.root] + self.__empty[1:]
+        while stack:
+            node = stack.pop()
+            if node.level == 0:
+                continue
+            key = node.nw, node.ne, node.sw, node.se
+            if key not in self.__nodes:
+                self.__nodes[key] = node
+                stack.extend(key)
+
+    def advance(self, n: int) -> None:
+        if n < 0:
+            raise ValueError('Cannot advance a negative number of generations')
+
+        j = 0
+        while n:
+            if n & 1:
+                self.__jump(j)
+                if len(self.__nodes) > self.__max_nodes:
+                    self.__collect_garbage()
+            n >>= 1
+            j += 1
+
+    def step(self) -> None:
+        self.advance(1)
+
+    def get_cell_state(self, x: int, y: int) -> int:
+        x, y = x - self.origin_x, y - self.origin_y
+        node = self.root
+        size = 1 << node.level
+        if not (0 <= x < size and 0 <= y < size):
+            return self.Cell.DEAD
+
+        while node.level > 0 and node.population:
+            half = 1 << (node.level - 1)
+            if y < half:
+                node = node.nw if x < half else node.ne
+            else:
+                node = node.sw if x < half else node.se
+            x, y = x % half, y % half
+        return node.population
+
+    def __set(self, node: _Node, x: int, y: int, state: int) -> _Node:
+        if node.level == 0:
+            return self.__alive if state == self.Cell.ALIVE else self.__dead
+
+        half = 1 << (node.level - 1)
+        nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+        if y < half:
+            if x < half:
+                nw = self.__set(nw, x, y, state)
+            else:
+                ne = self.__set(ne, x - half, y, state)
+        else:
+            if x < half:
+                sw = self.__set(sw, x, y - half, state)
+            else:
+                se = self.__set(se, x - half, y - half, state)
+        return self.__join(nw, ne, sw, se)
+
+    def set_cell_state(self, x: int, y: int, state: int) -> None:
+        if state not in (self.Cell.DEAD, self.Cell.ALIVE):
+            raise ValueError('Cell can only be DEAD (0) or ALIVE (1)')
+
+        # Расширяем корень, пока клетка не окажется внутри
+        while True:
+            size = 1 << self.root.level
+            if (self.origin_x <= x < self.origin_x + size and
+                    self.origin_y <= y < self.origin_y + size):
+                break
+            self.__expand()
+        self.root = self.__set(self.root, x - self.origin_x, y - self.origin_y, state)
+
+    def load_matrix(self, matrix: List[List[Field.Cell]]) -> None:
+        if (len(matrix), len(matrix[0]) if matrix else 0) != (self.get_size_y(), self.get_size_x()):
+            raise ValueError('Matrix size does not match field size')
+        self.clear()
+        for row in matrix:
+            for cell in row:
+                if cell.get_state() == self.Cell.ALIVE:
+                    self.set_cell_state(*cell.get_pos(), self.Cell.ALIVE)
+
+    def to_matrix(self) -> List[List[Field.Cell]]:
+        matrix = [[self.Cell(x, y) for x in range(self.get_size_x())] for y in range(self.get_size_y())]
+        for x, y in self.get_alives():
+            if 0 <= x < self.get_size_x() and 0 <= y < self.get_size_y():
+                matrix[y][x].set_state(self.Cell.ALIVE)
+        return matrix
+
+    def alive_nearby(self, cell: Field.Cell) -> int:
+        x, y = cell.get_pos()
+        return sum(self.get_cell_state(x + rx, y + ry)
+                   for ry in range(-1, 2) for rx in range(-1, 2) if (ry, rx) != (0, 0))
+
+    def get_population(self) -> int:
+        return self.root.population
+
+    def get_bounding_box(self) -> Optional[Tuple[int, int, int, int]]:
+        return get_cells_bounding_box(self.get_alives())
+
+    # Живые клетки во всей вселенной (в том числе за пределами окна size_x/size_y)
+    def get_alives(self) -> List[Tuple[int, int]]:
+        alives = []
+        stack = [(self.root, self.origin_x, self.origin_y)]
+        while stack:
+            node, x, y = stack.pop()
+            if node.population == 0:
+                continue
+            if node.level == 0:
+                alives.append((x, y))
+                continue
+            half = 1 << (node.level - 1)
+            stack.append((node.nw, x, y))
+            stack.append((node.ne, x + half, y))
+            stack.append((node.sw, x, y + half))
+            stack.append((node.se, x + half, y + half))
+        return alives
@@ -0,0 +1,267 @@
+from typing import Tuple, List, Optional, Any, Iterable
+
+import numpy as np
+
+from field.field import Field, HASH_GAMMA, HASH_MIX_1, HASH_MIX_2, clip_rect, make_soup
+from field.rule import Rule, get_count_runs
+
+
+# Хеш Зобриста по 64-битным словам доски: ключ слова зависит от его номера и содержимого (splitmix64),
+# пустые слова в хеш не входят. Движкам с плотной доской так дешевле, чем брать ключ каждой клетки:
+# изменившиеся слова находятся сравнением слов, а не клеток
+def hash_words(indices: np.ndarray, words: np.ndarray) -> int:
+    if not len(indices):
+        return 0
+    z = words + (indices.astype(np.uint64) + np.uint64(1)) * np.uint64(HASH_GAMMA)
+    z = (z ^ z >> np.uint64(30)) * np.uint64(HASH_MIX_1)
+    z = (z ^ z >> np.uint64(27)) * np.uint64(HASH_MIX_2)
+    z ^= z >> np.uint64(31)
+    return int(np.bitwise_xor.reduce(np.where(words != 0, z, np.uint64(0))))
+
+
+# Хеш доски по изменившимся словам: старые слова убираются из хеша, новые добавляются
+def update_words_hash(h: int, previous: np.ndarray, current: np.ndarray) -> int:
+    indices = np.flatnonzero(previous != current)
+    return h ^ hash_words(indices, previous[indices]) ^ hash_words(indices, current[indices])
+
+
+# Доска uint8 как одномерный массив 64-битных слов (по 8 клеток в слове)
+def get_board_words(board: np.ndarray) -> np.ndarray:
+    flat = np.ascontiguousarray(board).reshape(-1)
+    if flat.size % 8:
+        flat = np.concatenate((flat, np.zeros(-flat.size % 8, dtype=np.uint8)))
+    return flat.view(np.uint64)
+
+
+# Маска клеток, число соседей которых входит в counts (None - пустое множество).
+# Поиск по таблице переходов в NumPy медленнее сравнений, поэтому правило проверяется сравнениями по отрезкам
+def count_mask(an: np.ndarray, counts: Iterable[int]) -> Optional[np.ndarray]:
+    mask = None
+    for lo, hi in get_count_runs(counts):
+        if lo == hi:
+            m = an == lo
+        elif lo == 0 and hi == 8:
+            m = np.ones(an.shape, dtype=bool)
+        elif lo == 0:
+            m = an <= hi
+        elif hi == 8:
+            m = an >= lo
+        else:
+            m = (an >= lo) & (an <= hi)
+        mask = m if mask is None else mask | m
+    return mask
+
+
+# Следующее состояние клеток по числу живых соседей. Числа, при которых клетка и рождается, и выживает,
+# от её состояния не зависят, поэтому для B3/S23 остаются всего две проверки: 3 соседа или живая клетка с 2
+def next_states(board: np.ndarray, an: np.ndarray, rule: Rule) -> np.ndarray:
+    both = rule.birth & rule.survival
+    result = count_mask(an, both)
+    for counts, state in ((rule.survival - both, Field.Cell.ALIVE), (rule.birth - both, Field.Cell.DEAD)):
+        mask = count_mask(an, counts)
+        if mask is not None:
+            mask &= board == state
+            result = mask if result is None else result | mask
+    if result is None:
+        return np.zeros(board.shape, dtype=np.uint8)
+    return result.astype(np.uint8)
+
+
+# Битовая карта (формат Field.to_bitmap) в виде массива h x w из нулей и единиц
+def bitmap_to_board(bitmap: Any, stride: int, w: int, h: int) -> np.ndarray:
+    packed = np.frombuffer(bitmap, dtype=np.uint8, count=stride * h).reshape(h, stride)
+    return np.unpackbits(packed, axis=1, count=w, bitorder='little')
+
+
+# Суммы массива по строкам и по столбцам. Сумма не больше длины строки (столбца), и пока стороны меньше 32768,
+# хватает int16: такое сложение в несколько раз быстрее, чем в int64 по умолчанию
+def get_line_sums(a: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    dtype = np.int16 if max(a.shape) < 1 << 15 else np.int64
+    return a.sum(axis=1, dtype=dtype), a.sum(axis=0, dtype=dtype)
+
+
+# Уникальные клетки из cells, лежащие на поле w x h: массивы x и y
+def get_field_cells(cells: Iterable[Tuple[int, int]], w: int, h: int) -> Tuple[np.ndarray, np.ndarray]:
+    cells = np.array(list(cells), dtype=np.int64).reshape(-1, 2)
+    xs, ys = cells[:, 0], cells[:, 1]
+    inside = (0 <= xs) & (xs < w) & (0 <= ys) & (ys < h)
+    ys, xs = np.divmod(np.unique(ys[inside] * w + xs[inside]), w)
+    return xs, ys
+
+
+# Поле на NumPy. Доска хранится массивом uint8 (0 - мёртвая клетка, 1 - живая),
+# а поколение просчитывается целиком: соседи считаются суммой сдвинутых по тору копий доски
+class NumpyField(Field):
+    def __init__(self, size_x: int = 25, size_y: int = 25):
+        self.board: np.ndarray = ...
+        # Доска до последнего шага - изменения вычисляются по ней лениво, только когда их спрашивают
+        self.previous_board: Optional[np.ndarray] = None
+        # Счётчики живых клеток по строкам и столбцам (см. Field) - массивы. Правки и шаги меняют их на разность
+        # новой и старой доски, а не пересчитывают всю доску
+        self.row_counts: np.ndarray = ...
+        self.column_counts: np.ndarray = ...
+        super().__init__(size_x, size_y)
+
+    def clear(self) -> None:
+        self.board = np.zeros((self.get_size_y(), self.get_size_x()), dtype=np.uint8)
+        self.previous_board = None
+        self.count_board()
+
+    # Пересчёт счётчиков по всей доске - после очистки и загрузки
+    def count_board(self) -> None:
+        rows, columns = get_line_sums(self.board)
+        self.row_counts, self.column_counts = rows.astype(np.int64), columns.astype(np.int64)
+        self.population = int(self.row_counts.sum())
+        self.bounding_box = ...
+
+    # Учёт изменений участка доски с углом в (x0, y0): delta - разность новых и старых состояний его клеток
+    # (1 - рождение, -1 - смерть)
+    def count_changes(self, delta: np.ndarray, x0: int = 0, y0: int = 0) -> None:
+        rows, columns = get_line_sums(delta)
+        self.row_counts[y0:y0 + len(rows)] += rows
+        self.column_counts[x0:x0 + len(columns)] += columns
+        self.population += int(rows.sum())
+        self.bounding_box = ...
+
+    # Запись участка region в доску углом в (x0, y0) вместе с учётом изменений
+    def __write_region(self, x0: int, y0: int, region: np.ndarray) -> None:
+        h, w = region.shape
+        target = self.board[y0:y0 + h, x0:x0 + w]
+        self.count_changes(region.view(np.int8) - target.view(np.int8), x0, y0)
+        target[...] = region
+
+    def get_cell_state(self, x: int, y: int) -> int:
+        return int(self.board[y, x])
+
+    def set_cell_state(self, x: int, y: int, state: int) -> None:
+        if state not in (self.Cell.DEAD, self.Cell.ALIVE):
+            raise ValueError('Cell can only be DEAD (0) or ALIVE (1)')
+        delta = state - int(self.board[y, x])
+        if delta:
+            self.board[y, x] = state
+            self.row_counts[y] += delta
+            self.column_counts[x] += delta
+            self.population += delta
+            self.bounding_box = ...
+
+    # Правки многих клеток - выборками и срезами доски целиком
+    def set_cells(self, cells: Iterable[Tuple[int, int]], state: int) -> List[Tuple[int, int]]:
+        if state not in (self.Cell.DEAD, self.Cell.ALIVE):
+            raise ValueError('Cell can only be DEAD (0) or ALIVE (1)')
+        xs, ys = get_field_cells(cells, *self.get_size())
+        changed = self.board[ys, xs] != state
+        xs, ys = xs[changed], ys[changed]
+        self.board[ys, xs] = state
+        sign = 1 if state == self.Cell.ALIVE else -1
+        self.row_counts += sign * np.bincount(ys, minlength=self.get_size_y())
+        self.column_counts += sign * np.bincount(xs, minlength=self.get_size_x())
+        self.population += sign * len(xs)
+        self.bounding_box = ...
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def fill_rect(self, x: int, y: int, w: int, h: int, state: int) -> None:
+        if state not in (self.Cell.DEAD, self.Cell.ALIVE):
+            raise ValueError('Cell can only be DEAD (0) or ALIVE (1)')
+        rect = clip_rect(x, y, w, h, *self.get_size())
+        if rect is not None:
+            x0, y0, x1, y1 = rect
+            self.__write_region(x0, y0, np.full((y1 - y0, x1 - x0), state, dtype=np.uint8))
+
+    def paste(self, bitmap: Any, stride: int, size: Tuple[int, int], x: int, y: int) -> None:
+        pw, ph = size
+        if stride * 8 < pw:
+            raise ValueError('Bitmap size does not match pattern size')
+        rect = clip_rect(x, y, pw, ph, *self.get_size())
+        if rect is not None:
+            x0, y0, x1, y1 = rect
+            pattern = bitmap_to_board(bitmap, stride, pw, ph)[y0 - y:y1 - y, x0 - x:x1 - x]
+            self.__write_region(x0, y0, self.board[y0:y1, x0:x1] | pattern)
+
+    def random_fill(self, x: int, y: int, w: int, h: int, density: float, seed: Optional[int] = None) -> None:
+        soup = make_soup(max(w, 0), max(h, 0), density, seed)
+        rect = clip_rect(x, y, w, h, *self.get_size())
+        if rect is not None:
+            x0, y0, x1, y1 = rect
+            soup = np.frombuffer(soup, dtype=np.uint8).reshape(h, w)
+            self.__write_region(x0, y0, soup[y0 - y:y1 - y, x0 - x:x1 - x])
+
+    # Загрузка/выгрузка доски массивом uint8 (по байту на клетку)
+    def load_board(self, board: np.ndarray) -> None:
+        if board.shape != (self.get_size_y(), self.get_size_x()):
+            raise ValueError('Board size does not match field size')
+        self.board = board.astype(np.uint8)
+        self.previous_board = None
+        self.count_board()
+
+    def to_board(self) -> np.ndarray:
+        return self.board
+
+    def load_matrix(self, matrix: List[List[Field.Cell]]) -> None:
+        self.load_board(np.array([[c.get_state() for c in row] for row in matrix], dtype=np.uint8))
+
+    def to_bitmap(self) -> Tuple[np.ndarray, int]:
+        stride = self.get_bitmap_stride(self.get_size_x())
+        packed = np.packbits(self.board, axis=1, bitorder='little')
+        return np.ascontiguousarray(np.pad(packed, ((0, 0), (0, stride - packed.shape[1])))), stride
+
+    def load_bitmap(self, bitmap: Any, stride: int) -> None:
+        w, h = self.get_size()
+        if stride * 8 < w:
+            raise ValueError('Bitmap size does not match field size')
+        self.load_board(bitmap_to_board(bitmap, stride, w, h))
+
+    def to_matrix(self) -> List[List[Field.Cell]]:
+        return [[self.Cell(x, y, state) for x, state in enumerate(row)]
+                for y, row in enumerate(self.board.tolist())]
+
+    def alive_nearby(self, cell: Field.Cell) -> int:
+        x, y = cell.get_pos()
+        max_x, max_y = self.get_size()
+
+        rows = [(y + ry) % max_y for ry in range(-1, 2)]
+        cols = [(x + rx) % max_x for rx in range(-1, 2)]
+        return int(self.board[np.ix_(rows, cols)].sum()) - int(self.board[y, x])
+
+    def neighbours(self) -> np.ndarray:
+        # Сначала складываем каждую клетку с верхней и нижней соседкой,
+        # затем полученные суммы столбцов - с левой и правой; саму клетку вычитаем
+        b = self.board
+        v = b + np.roll(b, 1, axis=0) + np.roll(b, -1, axis=0)
+        return v + np.roll(v, 1, axis=1) + np.roll(v, -1, axis=1) - b
+
+    def step(self) -> None:
+        self.previous_board = self.board
+        self.board = next_states(self.board, self.neighbours(), self.rule)
+        self.count_changes(self.board.view(np.int8) - self.previous_board.view(np.int8))
+
+    def get_changes(self, limit: Optional[int] = None) -> Optional[List[Tuple[int, int]]]:
+        if self.previous_board is None:
+            return None
+        changed = self.previous_board != self.board
+        if limit is not None and np.count_nonzero(changed) > limit:
+            return None
+        ys, xs = np.nonzero(changed)
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def get_hash(self) -> int:
+        words = get_board_words(self.board)
+        indices = np.flatnonzero(words)
+        return hash_words(indices, words[indices])
+
+    def update_hash(self, h: int) -> int:
+        if self.previous_board is None:
+            return self.get_hash()
+        return update_words_hash(h, get_board_words(self.previous_board), get_board_words(self.board))
+
+    def get_raster(self, x0: int = 0, y0: int = 0) -> Tuple[np.ndarray, int, int]:
+        return np.ascontiguousarray(self.board), 8, self.get_size_x()
+
+    def get_bounding_box(self) -> Optional[Tuple[int, int, int, int]]:
+        if self.bounding_box is ...:
+            ys, xs = np.flatnonzero(self.row_counts), np.flatnonzero(self.column_counts)
+            self.bounding_box = (int(xs[0]), int(ys[0]), int(xs[-1]), int(ys[-1])) if len(ys) else None
+        return self.bounding_box
+
+    def get_alives(self) -> List[Tuple[int, int]]:
+        ys, xs = np.nonzero(self.board)
+        return list(zip(xs.tolist(), ys.tolist()))
@@ -0,0 +1,121 @@
+import os
+import weakref
+import multiprocessing
+from multiprocessing.pool import Pool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Tuple, List, Optional
+
+import numpy as np
+
+from field.numpy_field import NumpyField, next_states, get_line_sums
+from field.rule import Rule
+
+# Доски, подключённые в процессе-обработчике (заполняются инициализатором пула)
+_worker_memory: List[SharedMemory] = []
+_worker_boards: List[np.ndarray] = []
+
+
+def _attach_boards(names: Tuple[str, str], shape: Tuple[int, int]) -> None:
+    for name in names:
+        shm = SharedMemory(name=name)
+        _worker_memory.append(shm)
+        _worker_boards.append(np.ndarray(shape, dtype=np.uint8, buffer=shm.buf))
+
+
+# Шаг одной горизонтальной полосы [y0, y1): строки-соседи сверху и снизу (гало)
+# читаются прямо из общей памяти с заворотом по тору, результат пишется во второй буфер.
+# Возвращает изменения числа живых клеток полосы по строкам и по столбцам (см. NumpyField.count_changes)
+def _step_strip(task: Tuple[int, int, int, Rule]) -> Tuple[int, np.ndarray, np.ndarray]:
+    src, y0, y1, rule = task
+    board, out = _worker_boards[src], _worker_boards[1 - src]
+
+    strip = board[np.arange(y0 - 1, y1 + 1) % board.shape[0]]
+    centre = strip[1:-1]
+    v = strip[:-2] + centre + strip[2:]
+    an = v + np.roll(v, 1, axis=1) + np.roll(v, -1, axis=1) - centre
+    out[y0:y1] = next_states(centre, an, rule)
+    return (y0, *get_line_sums(out[y0:y1].view(np.int8) - centre.view(np.int8)))
+
+
+def _release(resources: dict) -> None:
+    if resources['pool'] is not None:
+        resources['pool'].terminate()
+        resources['pool'] = None
+    for shm in resources['memory']:
+        try:
+            shm.close()
+        except BufferError:
+            # На буфер ещё кто-то ссылается - память освободится вместе с последней ссылкой
+            pass
+        shm.unlink()
+    resources['memory'] = []
+
+
+# Многопроцессное поле: доска лежит в двух буферах общей памяти, каждое поколение
+# делится на горизонтальные полосы, которые считают процессы пула. Обмен граничными строками
+# между полосами идёт через ту же общую память, поэтому результат совпадает с NumpyField
+class ParallelField(NumpyField):
+    def __init__(self, size_x: int = 25, size_y: int = 25, workers: Optional[int] = None):
+        self.__workers = max(1, workers or os.cpu_count() or 1)
+        # Пул и общая память живут в отдельном словаре, чтобы их можно было освободить
+        # финализатором, не удерживая само поле
+        self.__resources = {'pool': None, 'memory': []}
+        self.__boards: List[np.ndarray] = []
+        self.__current = 0
+        weakref.finalize(self, _release, self.__resources)
+        super().__init__(size_x, size_y)
+
+    def get_workers(self) -> int:
+        return self.__workers
+
+    def clear(self) -> None:
+        if not self.__boards:
+            shape = self.get_size_y(), self.get_size_x()
+            for _ in range(2):
+                shm = SharedMemory(create=True, size=max(1, shape[0] * shape[1]))
+                self.__resources['memory'].append(shm)
+                self.__boards.append(np.ndarray(shape, dtype=np.uint8, buffer=shm.buf))
+        self.__current = 0
+        self.board = self.__boards[0]
+        self.board[...] = 0
+        self.previous_board = None
+        self.count_board()
+
+    def load_board(self, board: np.ndarray) -> None:
+        if board.shape != (self.get_size_y(), self.get_size_x()):
+            raise ValueError('Board size does not match field size')
+        self.board[...] = board
+        self.previous_board = None
+        self.count_board()
+
+    def __get_pool(self) -> Pool:
+        if self.__resources['pool'] is None:
+            # spawn вместо fork: родительский процесс может держать потоки Qt
+            names = tuple(shm.name for shm in self.__resources['memory'])
+            self.__resources['pool'] = multiprocessing.get_context('spawn').Pool(
+                self.__workers, initializer=_attach_boards, initargs=(names, self.board.shape)
+            )
+        return self.__resources['pool']
+
+    def step(self) -> None:
+        h = self.get_size_y()
+        bounds = np.linspace(0, h, min(self.__workers, h) + 1).astype(int)
+        tasks = [(self.__current, int(y0), int(y1), self.rule) for y0, y1 in zip(bounds[:-1], bounds[1:]) if y0 < y1]
+
+        changes = self.__get_pool().map(_step_strip, tasks)
+        self.__current = 1 - self.__current
+        # Старый буфер не тронут до следующего шага, так что по нему можно найти изменения
+        self.previous_board = self.board
+        self.board = self.__boards[self.__current]
+        for y0, rows, columns in changes:
+            self.row_counts[y0:y0 + len(rows)] += rows
+            self.column_counts += columns
+            self.population += int(rows.sum())
+        self.bounding_box = ...
+
+    # После закрытия доска остаётся доступной для чтения как обычный массив, но шагать поле уже не может
+    def close(self) -> None:
+        self.board = self.board.copy()
+        self.previous_board = None
+        self.__boards = []
+        _release(self.__resources)
@@ -0,0 +1,76 @@
+import re
+from typing import FrozenSet, Iterable, List, Tuple
+
+# Известные правила семейства Life для выбора в настройках
+NAMED_RULES = (
+    ('Life', 'B3/S23'),
+    ('HighLife', 'B36/S23'),
+    ('Seeds', 'B2/S'),
+    ('Day & Night', 'B3678/S34678'),
+    ('Life without death', 'B3/S012345678'),
+    ('2x2', 'B36/S125'),
+    ('Maze', 'B3/S12345'),
+    ('Replicator', 'B1357/S1357'),
+    ('Morley', 'B368/S245'),
+    ('Anneal', 'B4678/S35678'),
+)
+
+
+# Числа соседей, собранные в отрезки подряд идущих: {2, 3, 5} -> [(2, 3), (5, 5)].
+# Отрезок проверяется парой сравнений, а не сравнением с каждым числом
+def get_count_runs(counts: Iterable[int]) -> List[Tuple[int, int]]:
+    runs = []
+    for n in sorted(counts):
+        if runs and runs[-1][1] == n - 1:
+            runs[-1] = runs[-1][0], n
+        else:
+            runs.append((n, n))
+    return runs
+
+
+# Правило "Жизни" (Life-like): при каком числе живых соседей мёртвая клетка рождается (B)
+# и живая выживает (S). Задаётся строкой 'B3/S23'; принимаются и строчные буквы, и старая запись
+# без букв 'S/B' ('23/3'). Правило один раз компилируется в таблицу переходов:
+# table[state * 9 + neighbours] - состояние клетки в следующем поколении
+class Rule:
+    NOTATION = re.compile(r'B([0-8]*)/S([0-8]*)')
+    NOTATION_SB = re.compile(r'S([0-8]*)/B([0-8]*)')
+    NOTATION_LEGACY = re.compile(r'([0-8]*)/([0-8]*)')
+
+    def __init__(self, rulestring: str = 'B3/S23') -> None:
+        self.birth, self.survival = self.parse(rulestring)
+        self.table = bytes([int(n in self.birth) for n in range(9)] + [int(n in self.survival) for n in range(9)])
+
+    @classmethod
+    def parse(cls, rulestring: str) -> Tuple[FrozenSet[int], FrozenSet[int]]:
+        s = rulestring.strip().upper().replace(' ', '')
+        m = cls.NOTATION.fullmatch(s)
+        if m is not None:
+            birth, survival = m.groups()
+        elif cls.NOTATION_SB.fullmatch(s):
+            survival, birth = cls.NOTATION_SB.fullmatch(s).groups()
+        elif cls.NOTATION_LEGACY.fullmatch(s):
+            survival, birth = cls.NOTATION_LEGACY.fullmatch(s).groups()
+        else:
+            raise ValueError(f'Invalid rule: {rulestring}')
+        return frozenset(map(int, birth)), frozenset(map(int, survival))
+
+    def get_next_state(self, state: int, neighbours: int) -> int:
+        return self.table[state * 9 + neighbours]
+
+    # B0: мёртвая клетка без соседей рождается - пустое пространство вокруг паттерна оживает.
+    # Движки, которые не хранят или не считают пустые области, такое правило не поддерживают
+    def has_birth_on_zero(self) -> bool:
+        return 0 in self.birth
+
+    def __str__(self) -> str:
+        return f'B{"".join(map(str, sorted(self.birth)))}/S{"".join(map(str, sorted(self.survival)))}'
+
+    def __repr__(self) -> str:
+        return f"Rule('{self}')"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Rule) and (self.birth, self.survival) == (other.birth, other.survival)
+
+    def __hash__(self) -> int:
+        return hash((self.birth, self.survival))
@@ -0,0 +1,65 @@
+from collections import Counter
+from typing import Tuple, List, Set, Optional
+
+from field.field import Field, get_cells_bounding_box
+
+NEIGHBOURS = tuple((rx, ry) for ry in range(-1, 2) for rx in range(-1, 2) if (ry, rx) != (0, 0))
+
+
+# Неограниченное разреженное поле: хранится только множество координат живых клеток.
+# Память и время шага растут с населением, а не с площадью; координаты могут быть отрицательными.
+# size_x/size_y задают лишь окно, с которым работают to_matrix/load_matrix
+class SparseField(Field):
+    BOUNDED = False
+    SUPPORTS_BIRTH_ON_ZERO = False
+
+    def __init__(self, size_x: int = 25, size_y: int = 25):
+        self.alives: Set[Tuple[int, int]] = ...
+        super().__init__(size_x, size_y)
+
+    def clear(self) -> None:
+        self.alives = set()
+
+    def get_cell_state(self, x: int, y: int) -> int:
+        return self.Cell.ALIVE if (x, y) in self.alives else self.Cell.DEAD
+
+    def set_cell_state(self, x: int, y: int, state: int) -> None:
+        if state not in (self.Cell.DEAD, self.Cell.ALIVE):
+            raise ValueError('Cell can only be DEAD (0) or ALIVE (1)')
+        if state == self.Cell.ALIVE:
+            self.alives.add((x, y))
+        else:
+            self.alives.discard((x, y))
+
+    def load_matrix(self, matrix: List[List[Field.Cell]]) -> None:
+        if (len(matrix), len(matrix[0]) if matrix else 0) != (self.get_size_y(), self.get_size_x()):
+            raise ValueError('Matrix size does not match field size')
+        self.alives = {cell.get_pos() for row in matrix for cell in row if cell.get_state() == self.Cell.ALIVE}
+
+    def to_matrix(self) -> List[List[Field.Cell]]:
+        w, h = self.get_size()
+        return [[self.Cell(x, y, self.get_cell_state(x, y)) for x in range(w)] for y in range(h)]
+
+    def alive_nearby(self, cell: Field.Cell) -> int:
+        x, y = cell.get_pos()
+        return sum((x + rx, y + ry) in self.alives for rx, ry in NEIGHBOURS)
+
+    def step(self) -> None:
+        alives = self.alives
+        # Каждая живая клетка добавляет по единице всем восьми соседям
+        counts = Counter((x + rx, y + ry) for x, y in alives for rx, ry in NEIGHBOURS)
+        table = self.rule.table
+        self.alives = {pos for pos, an in counts.items() if table[(pos in alives) * 9 + an]}
+        # Клетки без живых соседей в счётчик не попали - при S0 одиночки выживают
+        if table[self.Cell.ALIVE * 9]:
+            self.alives.update(pos for pos in alives if pos not in counts)
+        self.changes = list(alives ^ self.alives)
+
+    def get_population(self) -> int:
+        return len(self.alives)
+
+    def get_bounding_box(self) -> Optional[Tuple[int, int, int, int]]:
+        return get_cells_bounding_box(self.alives)
+
+    def get_alives(self) -> List[Tuple[int, int]]:
+        return list(self.alives)
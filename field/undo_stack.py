@@ -0,0 +1,184 @@
+from abc import ABC, abstractmethod
+from array import array
+from collections import deque
+from itertools import chain
+from typing import Deque, List, Optional, Tuple
+
+from field.field import Field
+
+# Копия поля: (данные, длина строки битовой карты; 0 - данные это координаты живых клеток)
+Snapshot = Tuple[bytes, int]
+
+
+# Отменяемое действие с полем. size - сколько памяти (байт) занимает действие, по нему считается бюджет
+class UndoAction(ABC):
+    def __init__(self, generation: int) -> None:
+        # Поколение, на котором было сделано действие
+        self.generation = generation
+        self.size = 0
+
+    # Возвращает поле к состоянию до действия; возвращает номер поколения после отмены
+    @abstractmethod
+    def undo(self, field: Field, generation: int) -> int:
+        pass
+
+    # Повторяет отменённое действие; возвращает номер поколения после повтора
+    @abstractmethod
+    def redo(self, field: Field, generation: int) -> int:
+        pass
+
+
+# Штрих мышью: клетки, переведённые в state. Клетка попадает в штрих, только если была в другом состоянии,
+# поэтому для отмены достаточно координат
+class CellsAction(UndoAction):
+    def __init__(self, generation: int, state: int) -> None:
+        super().__init__(generation)
+        self.state = state
+        self.xs = array('q')
+        self.ys = array('q')
+
+    def add_cells(self, cells: List[Tuple[int, int]]) -> None:
+        for x, y in cells:
+            self.xs.append(x)
+            self.ys.append(y)
+        self.size += len(cells) * (self.xs.itemsize + self.ys.itemsize)
+
+    def is_empty(self) -> bool:
+        return not self.xs
+
+    def set_cells(self, field: Field, state: int) -> None:
+        field.set_cells(zip(self.xs, self.ys), state)
+
+    def undo(self, field: Field, generation: int) -> int:
+        self.set_cells(field, Field.Cell.DEAD if self.state == Field.Cell.ALIVE else Field.Cell.ALIVE)
+        return self.generation
+
+    def redo(self, field: Field, generation: int) -> int:
+        self.set_cells(field, self.state)
+        return self.generation
+
+
+# Действие, меняющее всё поле сразу (шаг симуляции, перемотка): хранит копию поля до него.
+# Копия для повтора снимается только при отмене.
+# simulated - после действия поле считалось симуляцией, то есть любое поколение до следующего действия
+# можно получить из копии, досчитав нужное число поколений
+class FieldAction(UndoAction):
+    def __init__(self, field: Field, generation: int, simulated: bool = False) -> None:
+        super().__init__(generation)
+        self.simulated = simulated
+        self.before = self.take_snapshot(field)
+        self.after: Optional[Snapshot] = None
+        self.after_generation = generation
+        self.update_size()
+
+    # Ограниченное поле хранится битовой картой (бит на клетку), неограниченное в неё не помещается -
+    # для него хранятся координаты живых клеток
+    @staticmethod
+    def take_snapshot(field: Field) -> Snapshot:
+        if not field.BOUNDED:
+            return array('q', chain.from_iterable(field.get_alives())).tobytes(), 0
+        bitmap, stride = field.to_bitmap()
+        return bytes(bitmap), stride
+
+    @staticmethod
+    def restore_snapshot(field: Field, snapshot: Snapshot) -> None:
+        data, stride = snapshot
+        if stride:
+            field.load_bitmap(data, stride)
+            return
+        cells = array('q')
+        cells.frombytes(data)
+        field.clear()
+        for i in range(0, len(cells), 2):
+            field.set_cell_state(cells[i], cells[i + 1], Field.Cell.ALIVE)
+
+    def update_size(self) -> None:
+        self.size = len(self.before[0]) + (len(self.after[0]) if self.after is not None else 0)
+
+    # Копия поля до действия (для пересчёта поколений после него)
+    def restore(self, field: Field) -> None:
+        self.restore_snapshot(field, self.before)
+
+    def undo(self, field: Field, generation: int) -> int:
+        self.after = self.take_snapshot(field)
+        self.after_generation = generation
+        self.update_size()
+        self.restore(field)
+        return self.generation
+
+    def redo(self, field: Field, generation: int) -> int:
+        self.restore_snapshot(field, self.after)
+        return self.after_generation
+
+
+# Отмена и повтор действий. Действия хранятся в кольцевом буфере: когда суммарный размер превышает
+# memory_limit, самые старые действия забываются (сначала отменяемые, затем самые дальние повторяемые)
+class UndoStack:
+    def __init__(self, memory_limit: int) -> None:
+        self.memory_limit = memory_limit
+        self.undo_actions: Deque[UndoAction] = deque()
+        # Последнее отменённое действие - в конце списка
+        self.redo_actions: List[UndoAction] = []
+        self.size = 0
+
+    def get_size(self) -> int:
+        return self.size
+
+    def can_undo(self) -> bool:
+        return bool(self.undo_actions)
+
+    def can_redo(self) -> bool:
+        return bool(self.redo_actions)
+
+    def set_memory_limit(self, memory_limit: int) -> None:
+        self.memory_limit = memory_limit
+        self.trim()
+
+    # Новое действие: повторять отменённые после него уже нечего
+    def push(self, action: UndoAction) -> None:
+        self.size -= sum(a.size for a in self.redo_actions)
+        self.redo_actions = []
+        self.undo_actions.append(action)
+        self.size += action.size
+        self.trim()
+
+    def trim(self) -> None:
+        while self.size > self.memory_limit and self.undo_actions:
+            self.size -= self.undo_actions.popleft().size
+        while self.size > self.memory_limit and self.redo_actions:
+            self.size -= self.redo_actions.pop(0).size
+
+    def clear(self) -> None:
+        self.undo_actions.clear()
+        self.redo_actions = []
+        self.size = 0
+
+    # Отмена последнего действия: возвращает номер поколения после отмены или None, если отменять нечего
+    def undo(self, field: Field, generation: int) -> Optional[int]:
+        if not self.undo_actions:
+            return None
+        action = self.undo_actions.pop()
+        self.size -= action.size
+        generation = action.undo(field, generation)
+        self.redo_actions.append(action)
+        self.size += action.size
+        self.trim()
+        return generation
+
+    def redo(self, field: Field, generation: int) -> Optional[int]:
+        if not self.redo_actions:
+            return None
+        action = self.redo_actions.pop()
+        generation = action.redo(field, generation)
+        self.undo_actions.append(action)
+        return generation
+
+    # Действие, из копии поля которого досчитывается поколение target (текущее поколение - generation).
+    # Каждое действие с simulated покрывает поколения от своего до поколения следующего действия
+    def find_checkpoint(self, target: int, generation: int) -> Optional[FieldAction]:
+        end = generation
+        for action in reversed(self.undo_actions):
+            if isinstance(action, FieldAction) and action.simulated and action.generation <= target <= end:
+                return action
+            end = action.generation
+        return None
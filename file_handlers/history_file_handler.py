@@ -0,0 +1,176 @@
+import os
+import mmap
+import struct
+from array import array
+from typing import Iterator, List, Optional, Tuple
+
+from field.field import Field
+
+
+# Карта просматривается кусками по ZERO_BLOCK байт: нулевой кусок отбрасывается одним сравнением
+ZERO_BLOCK = bytes(4096)
+
+
+# Позиции единичных битов битовой карты (номер бита = номер клетки). Нулевые куски пропускаются целиком,
+# а ненулевые разбираются 64-битными словами, так что работа зависит от числа единиц, а не от размера карты
+def iter_bits(data: bytes) -> Iterator[int]:
+    size = len(ZERO_BLOCK)
+    for block in range(0, len(data), size):
+        chunk = data[block:block + size]
+        if chunk == ZERO_BLOCK[:len(chunk)]:
+            continue
+        for i in range(0, len(chunk), 8):
+            word = int.from_bytes(chunk[i:i + 8], 'little')
+            while word:
+                low = word & -word
+                yield (block + i) * 8 + low.bit_length() - 1
+                word ^= low
+
+
+# Запись истории поколений на диск. Поколения идут подряд; раз в keyframe_interval поколений пишется
+# полный кадр (битовая карта поля, см. Field.to_bitmap), между ними - только родившиеся и умершие клетки.
+# Чтение через mmap: поколение N собирается из ближайшего кадра не позже N и не более keyframe_interval - 1
+# изменений после него.
+# Формат: заголовок HEADER (сигнатура, версия, размер поля, длина строки карты, интервал кадров),
+# затем записи: RECORD (тип, длина, поколение) и данные. Данные изменений - число рождений и смертей
+# (DELTA_COUNTS) и номера битов клеток (uint32)
+class HistoryFileHandler:
+    MAGIC = b'GOLHIS'
+    VERSION = 1
+    HEADER = struct.Struct('<6sHIIII')
+    RECORD = struct.Struct('<B3xIQ')
+    DELTA_COUNTS = struct.Struct('<II')
+    KEYFRAME = 0
+    DELTA = 1
+
+    def __init__(self, file: str, size_x: int, size_y: int, keyframe_interval: int = 100) -> None:
+        self.file = file
+        self.keyframe_interval = keyframe_interval
+        self.size_x: int = ...
+        self.size_y: int = ...
+        self.stride: int = ...
+
+        self.f = open(file, 'w+b')
+        self.mm: Optional[mmap.mmap] = None
+        # Смещения записей: records[i] - поколение first + i
+        self.records: List[Tuple[int, int]] = []
+        self.first = 0
+        # Карта последнего записанного поколения (для вычисления изменений)
+        self.previous: Optional[bytes] = None
+        self.reset(size_x, size_y)
+
+    def get_first(self) -> int:
+        return self.first
+
+    def get_last(self) -> int:
+        return self.first + len(self.records) - 1
+
+    def is_empty(self) -> bool:
+        return not self.records
+
+    # Очистка истории (новое поле, возможно, другого размера)
+    def reset(self, size_x: int, size_y: int) -> None:
+        self.size_x, self.size_y = size_x, size_y
+        self.stride = Field.get_bitmap_stride(size_x)
+        self.truncate(0)
+        self.f.write(self.HEADER.pack(self.MAGIC, self.VERSION, size_x, size_y, self.stride,
+                                      self.keyframe_interval))
+        self.records = []
+        self.previous = None
+
+    def truncate(self, offset: int) -> None:
+        # Отображение закрывается до обрезки файла
+        self.close_mapping()
+        self.f.truncate(offset)
+        self.f.seek(offset)
+
+    # Добавляет поколение generation. Если оно не продолжает историю (после перемотки назад,
+    # сброса или прыжка), история с этого места переписывается, начиная с полного кадра
+    def record(self, field: Field, generation: int) -> None:
+        # Карта хранит только окно поля - клетки неограниченного поля за окном потерялись бы
+        if not field.BOUNDED:
+            raise ValueError('History cannot record unbounded fields')
+        if field.get_size() != (self.size_x, self.size_y):
+            raise ValueError('Field size does not match history size')
+
+        if self.records and self.first <= generation <= self.get_last():
+            self.truncate(self.records[generation - self.first][1])
+            del self.records[generation - self.first:]
+            self.previous = None
+        elif self.records and generation != self.get_last() + 1:
+            self.reset(self.size_x, self.size_y)
+        if not self.records:
+            self.first = generation
+
+        bitmap, stride = field.to_bitmap()
+        current = bytes(memoryview(bitmap).cast('B')[:self.stride * self.size_y])
+
+        offset = self.f.tell()
+        if self.previous is None or len(self.records) % self.keyframe_interval == 0:
+            self.f.write(self.RECORD.pack(self.KEYFRAME, len(current), generation))
+            self.f.write(current)
+        else:
+            # Операции над картами целиком идут в C; по клеткам разбираются только ненулевые участки
+            previous, size = int.from_bytes(self.previous, 'little'), len(current)
+            changed = previous ^ int.from_bytes(current, 'little')
+            births = array('I', iter_bits((changed & ~previous).to_bytes(size, 'little')))
+            deaths = array('I', iter_bits((changed & previous).to_bytes(size, 'little')))
+            self.f.write(self.RECORD.pack(self.DELTA, self.DELTA_COUNTS.size + 4 * (len(births) + len(deaths)),
+                                          generation))
+            self.f.write(self.DELTA_COUNTS.pack(len(births), len(deaths)))
+            self.f.write(births.tobytes())
+            self.f.write(deaths.tobytes())
+
+        self.records.append((generation, offset))
+        self.previous = current
+
+    def get_mapping(self) -> mmap.mmap:
+        self.f.flush()
+        size = self.f.tell()
+        if self.mm is None or len(self.mm) < size:
+            self.close_mapping()
+            self.mm = mmap.mmap(self.f.fileno(), size, access=mmap.ACCESS_READ)
+        return self.mm
+
+    def close_mapping(self) -> None:
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+    # Битовая карта поколения generation: (карта, длина строки)
+    def load_generation(self, generation: int) -> Tuple[bytearray, int]:
+        if not self.records or not self.first <= generation <= self.get_last():
+            raise IndexError('Generation is not recorded')
+        mm = self.get_mapping()
+
+        # Назад до ближайшего полного кадра
+        i = generation - self.first
+        deltas = []
+        while True:
+            offset = self.records[i][1]
+            kind, length, _ = self.RECORD.unpack_from(mm, offset)
+            if kind == self.KEYFRAME:
+                break
+            deltas.append(offset)
+            i -= 1
+
+        start = offset + self.RECORD.size
+        bitmap = bytearray(mm[start:start + length])
+        for offset in reversed(deltas):
+            start = offset + self.RECORD.size
+            births, deaths = self.DELTA_COUNTS.unpack_from(mm, start)
+            start += self.DELTA_COUNTS.size
+            cells = array('I')
+            cells.frombytes(mm[start:start + 4 * (births + deaths)])
+            for p in cells[:births]:
+                bitmap[p >> 3] |= 1 << (p & 7)
+            for p in cells[births:]:
+                bitmap[p >> 3] &= ~(1 << (p & 7))
+        return bitmap, self.stride
+
+    # Закрытие с удалением файла истории
+    def close(self) -> None:
+        self.close_mapping()
+        self.f.close()
+        if os.path.exists(self.file):
+            os.remove(self.file)
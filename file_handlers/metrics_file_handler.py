@@ -0,0 +1,34 @@
+import os
+import csv
+import json
+from typing import Dict, Sequence, Union
+
+# Выборка замеров: имя -> значение (None - за интервал значения нет)
+Sample = Dict[str, Union[int, float, None]]
+
+
+# Поток замеров производительности в файл: по строке на выборку. Формат выбирается по расширению:
+# .csv - таблица с заголовком, иначе JSON Lines (объект JSON в каждой строке).
+# Каждая строка сразу сбрасывается на диск, чтобы файл можно было читать, пока программа работает
+class MetricsFileHandler:
+    def __init__(self, file: str, fields: Sequence[str]) -> None:
+        self.file = file
+        self.fields = tuple(fields)
+        self.csv = os.path.splitext(file)[1].lower() == '.csv'
+
+        self.f = open(file, 'w', newline='' if self.csv else None)
+        self.writer = csv.DictWriter(self.f, self.fields) if self.csv else None
+        if self.writer is not None:
+            self.writer.writeheader()
+            self.f.flush()
+
+    def write(self, sample: Sample) -> None:
+        if self.writer is not None:
+            # Пустая ячейка - значения за интервал нет (например, не было ни одной отрисовки)
+            self.writer.writerow({k: '' if sample.get(k) is None else sample[k] for k in self.fields})
+        else:
+            print(json.dumps({k: sample.get(k) for k in self.fields}), file=self.f)
+        self.f.flush()
+
+    def close(self) -> None:
+        self.f.close()
@@ -0,0 +1,435 @@
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, Optional, Tuple, Type, TextIO, List
+
+from field.field import Field, CELLS_TO_DIGITS
+from field.rule import Rule
+
+# Отрезок живых клеток в строке: (x, y, длина)
+Run = Tuple[int, int, int]
+
+
+# Строки поля в виде строк из '0' и '1' (клетка x - символ x, хвост из мёртвых клеток обрезан).
+# Пустые строки пропускаются. Поле читается одной битовой картой, промежуточных списков клеток нет
+def iter_field_rows(field: Field) -> Iterator[Tuple[int, str]]:
+    bitmap, stride = field.to_bitmap()
+    data = memoryview(bitmap).cast('B')
+    for y in range(field.get_size_y()):
+        value = int.from_bytes(data[y * stride:(y + 1) * stride], 'little')
+        if value:
+            yield y, format(value, 'b')[::-1]
+
+
+# То же по списку живых клеток: строки относительно (x0, y0)
+def iter_cell_rows(cells: List[Tuple[int, int]], x0: int, y0: int) -> Iterator[Tuple[int, str]]:
+    rows: Dict[int, int] = {}
+    for x, y in cells:
+        rows[y - y0] = rows.get(y - y0, 0) | 1 << x - x0
+    for y in sorted(rows):
+        yield y, format(rows[y], 'b')[::-1]
+
+
+# Что записывается в паттерн: (x0, y0, ширина, высота) и строки клеток относительно (x0, y0).
+# Ограниченное поле пишется целиком. У неограниченного окно - лишь часть поля, поэтому пишется прямоугольник,
+# в котором лежат все живые клетки
+def get_field_rows(field: Field) -> Tuple[Tuple[int, int, int, int], Iterator[Tuple[int, str]]]:
+    if field.BOUNDED:
+        return (0, 0, *field.get_size()), iter_field_rows(field)
+
+    cells = field.get_alives()
+    if not cells:
+        return (0, 0, 0, 0), iter(())
+    xs, ys = [x for x, _ in cells], [y for _, y in cells]
+    x0, y0 = min(xs), min(ys)
+    return (x0, y0, max(xs) - x0 + 1, max(ys) - y0 + 1), iter_cell_rows(cells, x0, y0)
+
+
+# Сборка битовой карты поля из отрезков. Отрезки одной строки копятся в байтовом буфере строки
+# (по байту на клетку) и упаковываются в карту разом, когда приходит отрезок другой строки
+class BitmapBuilder:
+    def __init__(self, size_x: int, size_y: int) -> None:
+        self.size_x, self.size_y = size_x, size_y
+        self.stride = Field.get_bitmap_stride(size_x)
+        self.bitmap = bytearray(self.stride * size_y)
+
+        self.row = bytearray(size_x)
+        self.ones = memoryview(b'\x01' * size_x)
+        # Текущая строка и занятая часть буфера [lo, hi)
+        self.y, self.lo, self.hi = 0, size_x, 0
+
+    def add_run(self, x: int, y: int, n: int) -> None:
+        if not (0 <= y < self.size_y and 0 <= x and x + n <= self.size_x):
+            raise PFHPatternTooLarge()
+        if y != self.y:
+            self.flush()
+            self.y = y
+        self.row[x:x + n] = self.ones[:n]
+        self.lo, self.hi = min(self.lo, x), max(self.hi, x + n)
+
+    def flush(self) -> None:
+        lo, hi = self.lo, self.hi
+        if lo >= hi:
+            return
+        # Клетка lo должна попасть в младший бит, поэтому кусок строки разворачивается
+        value = int(self.row[lo:hi][::-1].translate(CELLS_TO_DIGITS), 2) << lo
+        start = self.y * self.stride
+        value |= int.from_bytes(self.bitmap[start:start + self.stride], 'little')
+        self.bitmap[start:start + self.stride] = value.to_bytes(self.stride, 'little')
+
+        self.row[lo:hi] = bytes(hi - lo)
+        self.lo, self.hi = self.size_x, 0
+
+    def get_bitmap(self) -> Tuple[bytearray, int]:
+        self.flush()
+        return self.bitmap, self.stride
+
+
+# Формат файла паттерна. Чтение потоковое: размер и отрезки живых клеток читаются отдельными проходами
+# по файлу, так что память не зависит от размера файла
+class PatternFormat(ABC):
+    NAME = ''
+    EXTENSIONS: Tuple[str, ...] = ()
+
+    # Размер паттерна (ширина, высота)
+    @classmethod
+    @abstractmethod
+    def read_size(cls, file: str) -> Tuple[int, int]:
+        pass
+
+    # Правило, записанное в паттерне. None - формат правила не хранит или оно не указано
+    @classmethod
+    def read_rule(cls, file: str) -> Optional[Rule]:
+        return None
+
+    # Отрезки живых клеток относительно левого верхнего угла паттерна
+    @classmethod
+    @abstractmethod
+    def iter_runs(cls, file: str) -> Iterator[Run]:
+        pass
+
+    @classmethod
+    @abstractmethod
+    def write(cls, file: str, field: Field) -> None:
+        pass
+
+    @classmethod
+    def get_filter(cls) -> str:
+        return f'{cls.NAME} ({" ".join("*" + e for e in cls.EXTENSIONS)})'
+
+
+# Plaintext (.cells): строки с '!' - комментарии, 'O' (или '*') - живая клетка, '.' - мёртвая
+class PlaintextFormat(PatternFormat):
+    NAME = 'Plaintext'
+    EXTENSIONS = ('.cells',)
+
+    ALIVE_RUN = re.compile(r'[O*]+')
+    WRONG_CHAR = re.compile(r'[^.O*]')
+    DIGITS_TO_CELLS = str.maketrans('01', '.O')
+
+    @classmethod
+    def iter_lines(cls, file: str) -> Iterator[str]:
+        with open(file, 'r') as f:
+            for line in f:
+                line = line.rstrip('\r\n')
+                if line.startswith('!'):
+                    continue
+                if cls.WRONG_CHAR.search(line):
+                    raise PFHWrongFileFormatting()
+                yield line
+
+    @classmethod
+    def read_size(cls, file: str) -> Tuple[int, int]:
+        width = height = 0
+        for line in cls.iter_lines(file):
+            width = max(width, len(line))
+            height += 1
+        return width, height
+
+    @classmethod
+    def iter_runs(cls, file: str) -> Iterator[Run]:
+        for y, line in enumerate(cls.iter_lines(file)):
+            for m in cls.ALIVE_RUN.finditer(line):
+                yield m.start(), y, m.end() - m.start()
+
+    @classmethod
+    def write(cls, file: str, field: Field) -> None:
+        with open(file, 'w') as f:
+            print(f'!Name: {os.path.splitext(os.path.basename(file))[0]}', file=f)
+            (_, _, _, h), rows = get_field_rows(field)
+            last_y = -1
+            for y, digits in rows:
+                # Пустые строки пишутся одной точкой
+                f.write('.\n' * (y - last_y - 1))
+                print(digits.translate(cls.DIGITS_TO_CELLS), file=f)
+                last_y = y
+            f.write('.\n' * (h - last_y - 1))
+
+
+# RLE: строка заголовка "x = ширина, y = высота, rule = правило", затем отрезки вида <число><тег>,
+# где b - мёртвые клетки, o - живые, $ - конец строки, ! - конец паттерна. Строки с '#' - комментарии
+class RLEFormat(PatternFormat):
+    NAME = 'RLE'
+    EXTENSIONS = ('.rle',)
+
+    HEADER = re.compile(r'x\s*=\s*(\d+)\s*,\s*y\s*=\s*(\d+)(?:\s*,\s*rule\s*=\s*(\S+))?', re.IGNORECASE)
+    TOKEN = re.compile(r'(\d*)(\D)')
+    WHITESPACE = re.compile(r'\s+')
+    RUN = re.compile(r'0+|1+')
+    # Читается кусками, а не строками: тело RLE может быть одной строкой в мегабайты
+    CHUNK_SIZE = 1 << 16
+    LINE_LENGTH = 70
+
+    # Ширина, высота и правило (None, если не указано)
+    @classmethod
+    def read_header(cls, f: TextIO) -> Tuple[int, int, Optional[Rule]]:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            m = cls.HEADER.match(line.strip())
+            if m is None:
+                raise PFHWrongFileFormatting()
+            rule = None
+            if m.group(3) is not None:
+                try:
+                    rule = Rule(m.group(3))
+                except ValueError:
+                    raise PFHUnsupportedRule()
+            return int(m.group(1)), int(m.group(2)), rule
+        raise PFHWrongFileFormatting()
+
+    @classmethod
+    def read_size(cls, file: str) -> Tuple[int, int]:
+        with open(file, 'r') as f:
+            return cls.read_header(f)[:2]
+
+    @classmethod
+    def read_rule(cls, file: str) -> Optional[Rule]:
+        with open(file, 'r') as f:
+            return cls.read_header(f)[2]
+
+    @classmethod
+    def iter_runs(cls, file: str) -> Iterator[Run]:
+        with open(file, 'r') as f:
+            cls.read_header(f)
+            x = y = 0
+            # Число, разорванное границей куска, переносится в следующий кусок
+            tail = ''
+            while True:
+                chunk = f.read(cls.CHUNK_SIZE)
+                if not chunk:
+                    break
+                data = tail + cls.WHITESPACE.sub('', chunk)
+                end = 0
+                for m in cls.TOKEN.finditer(data):
+                    end = m.end()
+                    count, tag = m.groups()
+                    n = int(count) if count else 1
+                    if tag in 'b.':
+                        x += n
+                    elif tag == 'o':
+                        yield x, y, n
+                        x += n
+                    elif tag == '$':
+                        x, y = 0, y + n
+                    elif tag == '!':
+                        return
+                    else:
+                        raise PFHWrongFileFormatting()
+                tail = data[end:]
+
+    @classmethod
+    def write(cls, file: str, field: Field) -> None:
+        (_, _, w, h), rows = get_field_rows(field)
+        with open(file, 'w') as f:
+            print(f'x = {w}, y = {h}, rule = {field.get_rule()}', file=f)
+
+            # Теги копятся в строку не длиннее LINE_LENGTH
+            line: List[str] = []
+            length = 0
+
+            def put(n: int, tag: str) -> None:
+                nonlocal length
+                token = f'{n}{tag}' if n > 1 else tag
+                if length + len(token) > cls.LINE_LENGTH:
+                    print(''.join(line), file=f)
+                    line.clear()
+                    length = 0
+                line.append(token)
+                length += len(token)
+
+            last_y = 0
+            for y, digits in rows:
+                if y > last_y:
+                    put(y - last_y, '$')
+                for m in cls.RUN.finditer(digits):
+                    put(m.end() - m.start(), 'o' if m.group()[0] == '1' else 'b')
+                last_y = y
+            put(1, '!')
+            print(''.join(line), file=f)
+
+
+# Life 1.06: заголовок "#Life 1.06", затем по строке "x y" на каждую живую клетку (координаты могут быть
+# отрицательными). Паттерн сдвигается так, чтобы его левый верхний угол был в нуле
+class Life106Format(PatternFormat):
+    NAME = 'Life 1.06'
+    EXTENSIONS = ('.lif', '.life')
+
+    MAGIC = '#Life 1.06'
+
+    @classmethod
+    def iter_cells(cls, file: str) -> Iterator[Tuple[int, int]]:
+        with open(file, 'r') as f:
+            if f.readline().strip() != cls.MAGIC:
+                raise PFHWrongFileFormatting()
+            for line in f:
+                if line.startswith('#') or not line.strip():
+                    continue
+                try:
+                    x, y = map(int, line.split())
+                except ValueError:
+                    raise PFHWrongFileFormatting()
+                yield x, y
+
+    # Углы ограничивающего прямоугольника: (min_x, min_y, max_x, max_y)
+    @classmethod
+    def read_bounds(cls, file: str) -> Tuple[int, int, int, int]:
+        min_x = min_y = max_x = max_y = None
+        for x, y in cls.iter_cells(file):
+            if min_x is None:
+                min_x = max_x = x
+                min_y = max_y = y
+            else:
+                min_x, max_x = min(min_x, x), max(max_x, x)
+                min_y, max_y = min(min_y, y), max(max_y, y)
+        if min_x is None:
+            return 0, 0, -1, -1
+        return min_x, min_y, max_x, max_y
+
+    @classmethod
+    def read_size(cls, file: str) -> Tuple[int, int]:
+        min_x, min_y, max_x, max_y = cls.read_bounds(file)
+        return max_x - min_x + 1, max_y - min_y + 1
+
+    @classmethod
+    def iter_runs(cls, file: str) -> Iterator[Run]:
+        min_x, min_y, _, _ = cls.read_bounds(file)
+        for x, y in cls.iter_cells(file):
+            yield x - min_x, y - min_y, 1
+
+    # Координаты клеток пишутся как есть - у неограниченного поля это координаты мира, а не окна
+    @classmethod
+    def write(cls, file: str, field: Field) -> None:
+        (x0, y0, _, _), rows = get_field_rows(field)
+        with open(file, 'w') as f:
+            print(cls.MAGIC, file=f)
+            for y, digits in rows:
+                x = digits.find('1')
+                while x != -1:
+                    print(x0 + x, y0 + y, file=f)
+                    x = digits.find('1', x + 1)
+
+
+# Читает и записывает паттерны в форматах других программ для "Жизни"
+class PatternFileHandler:
+    FORMATS: Tuple[Type[PatternFormat], ...] = (RLEFormat, PlaintextFormat, Life106Format)
+
+    @classmethod
+    def get_format(cls, file: str) -> Optional[Type[PatternFormat]]:
+        ext = os.path.splitext(file)[1].lower()
+        for pattern_format in cls.FORMATS:
+            if ext in pattern_format.EXTENSIONS:
+                return pattern_format
+        return None
+
+    # Фильтры для файловых диалогов Qt: сначала все паттерны, затем по формату
+    @classmethod
+    def get_filters(cls) -> List[str]:
+        extensions = ' '.join('*' + e for f in cls.FORMATS for e in f.EXTENSIONS)
+        return [f'Patterns ({extensions})'] + [f.get_filter() for f in cls.FORMATS]
+
+    @classmethod
+    def read_size(cls, file: str) -> Tuple[int, int]:
+        pattern_format = cls.get_format(file)
+        if pattern_format is None:
+            raise PFHUnknownFormat()
+        return pattern_format.read_size(file)
+
+    # Загружает паттерн в новое поле размером size (по умолчанию - размер паттерна) со сдвигом offset.
+    # Правило берётся из паттерна, а если он его не хранит - rule (по умолчанию B3/S23).
+    # Ограниченные поля заполняются через битовую карту, неограниченные - поклеточно
+    @classmethod
+    def open_pattern(cls, file: str, field_class: Type[Field], size: Optional[Tuple[int, int]] = None,
+                     offset: Tuple[int, int] = (0, 0), rule: Optional[Rule] = None) -> Field:
+        pattern_format = cls.get_format(file)
+        if pattern_format is None:
+            raise PFHUnknownFormat()
+
+        w, h = size or pattern_format.read_size(file)
+        ox, oy = offset
+        rule = pattern_format.read_rule(file) or rule
+        field = field_class(w, h)
+        if rule is not None:
+            try:
+                field.set_rule(rule)
+            except ValueError:
+                field.close()
+                raise PFHUnsupportedRule()
+
+        if not field.BOUNDED:
+            for x, y, n in pattern_format.iter_runs(file):
+                for i in range(n):
+                    field.set_cell_state(ox + x + i, oy + y, Field.Cell.ALIVE)
+            return field
+
+        builder = BitmapBuilder(w, h)
+        for x, y, n in pattern_format.iter_runs(file):
+            builder.add_run(ox + x, oy + y, n)
+        field.load_bitmap(*builder.get_bitmap())
+        return field
+
+    # Паттерн битовой картой своего размера - для вставки в уже открытое поле (см. Field.paste).
+    # Возвращает (битовая карта, длина строки, (ширина, высота))
+    @classmethod
+    def read_bitmap(cls, file: str) -> Tuple[bytearray, int, Tuple[int, int]]:
+        pattern_format = cls.get_format(file)
+        if pattern_format is None:
+            raise PFHUnknownFormat()
+
+        w, h = pattern_format.read_size(file)
+        builder = BitmapBuilder(w, h)
+        for x, y, n in pattern_format.iter_runs(file):
+            builder.add_run(x, y, n)
+        return (*builder.get_bitmap(), (w, h))
+
+    @classmethod
+    def save_pattern(cls, file: str, field: Field) -> None:
+        pattern_format = cls.get_format(file)
+        if pattern_format is None:
+            raise PFHUnknownFormat()
+        pattern_format.write(file, field)
+
+
+class PFHException(Exception):
+    def __str__(self) -> str:
+        return 'PatternFileHandler exception message'
+
+
+class PFHWrongFileFormatting(PFHException):
+    def __str__(self) -> str:
+        return 'wrong file formatting (are you sure the file is a pattern file?)'
+
+
+class PFHUnknownFormat(PFHException):
+    def __str__(self) -> str:
+        return 'unknown pattern format (supported: .rle, .cells, .lif, .life)'
+
+
+class PFHUnsupportedRule(PFHException):
+    def __str__(self) -> str:
+        return 'pattern uses a rule that is invalid or not supported by the selected engine'
+
+
+class PFHPatternTooLarge(PFHException):
+    def __str__(self) -> str:
+        return 'pattern does not fit into the field'
@@ -1,14 +1,146 @@
-from typing import List
+import mmap
+import zlib
+import struct
+from typing import List, Tuple, Type
 
 from field.field import Field
+from field.rule import Rule
 
 FieldMatrix = List[List[Field.Cell]]
 
 
-# По сути читает и записывает матрицу поля в бинарном виде
+# Заголовок двоичного файла сохранения
+class SaveHeader:
+    def __init__(self, size_x: int, size_y: int, generation: int = 0, rule: str = 'B3/S23',
+                 compressed: bool = False, version: int = 1) -> None:
+        self.size_x, self.size_y = size_x, size_y
+        self.generation = generation
+        self.rule = rule
+        self.compressed = compressed
+        # 0 - старый текстовый формат
+        self.version = version
+
+
+# Читает и записывает поле в файл сохранения.
+# Формат (версия 1): заголовок HEADER (сигнатура, версия, флаги, размер, длина строки, поколение, длина правила),
+# строка правила, выравнивание до 8 байт и битовая карта поля (см. Field.to_bitmap), возможно сжатая zlib.
+# Несжатая карта читается через mmap прямо в буфер движка. Старые текстовые сохранения
+# (строки из '0' и '1') тоже открываются
 class SaveFileHandler:
+    MAGIC = b'GOLSAV'
+    VERSION = 1
+    HEADER = struct.Struct('<6sHHIIIQH')
+    FLAG_ZLIB = 1
+    # Быстрое сжатие: карта и так плотная, а время сохранения важнее лишних процентов
+    ZLIB_LEVEL = 1
+
+    @classmethod
+    def read_header(cls, file: str) -> Tuple[SaveHeader, int, int]:
+        with open(file, 'rb') as f:
+            data = f.read(cls.HEADER.size)
+            if not data.startswith(cls.MAGIC):
+                raise SaveFHNotBinary()
+            if len(data) < cls.HEADER.size:
+                raise SaveFHWrongFileFormatting()
+
+            magic, version, flags, size_x, size_y, stride, generation, rule_length = cls.HEADER.unpack(data)
+            if version > cls.VERSION:
+                raise SaveFHUnsupportedVersion()
+            try:
+                rule = f.read(rule_length).decode('ascii')
+            except UnicodeDecodeError:
+                raise SaveFHWrongFileFormatting()
+
+        header = SaveHeader(size_x, size_y, generation, rule, bool(flags & cls.FLAG_ZLIB), version)
+        # Карта начинается с границы 8 байт - так её можно отдавать движкам словами без копирования
+        offset = (cls.HEADER.size + rule_length + 7) // 8 * 8
+        return header, stride, offset
+
+    @classmethod
+    def open_field(cls, file: str, field_class: Type[Field]) -> Tuple[Field, SaveHeader]:
+        try:
+            header, stride, offset = cls.read_header(file)
+        except SaveFHNotBinary:
+            matrix = cls.open_text_file(file)
+            field = field_class(len(matrix[0]), len(matrix))
+            try:
+                field.load_matrix(matrix)
+            except BaseException:
+                field.close()
+                raise
+            return field, SaveHeader(field.get_size_x(), field.get_size_y(), version=0)
+
+        try:
+            rule = Rule(header.rule)
+        except ValueError:
+            raise SaveFHUnsupportedRule()
+        field = field_class(header.size_x, header.size_y)
+        try:
+            field.set_rule(rule)
+        except ValueError:
+            field.close()
+            raise SaveFHUnsupportedRule()
+
+        # Поле, которое не удалось заполнить, закрывается сразу (у некоторых движков оно держит процессы и память)
+        try:
+            cls.read_bitmap(file, field, header, stride, offset)
+        except BaseException:
+            field.close()
+            raise
+        return field, header
+
+    @classmethod
+    def read_bitmap(cls, file: str, field: Field, header: SaveHeader, stride: int, offset: int) -> None:
+        size = stride * header.size_y
+        with open(file, 'rb') as f:
+            if header.compressed:
+                f.seek(offset)
+                try:
+                    bitmap = zlib.decompress(f.read())
+                except zlib.error:
+                    raise SaveFHWrongFileFormatting()
+                if len(bitmap) != size:
+                    raise SaveFHWrongFileFormatting()
+                field.load_bitmap(bitmap, stride)
+                return
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if len(mm) < offset + size:
+                    raise SaveFHWrongFileFormatting()
+                view = memoryview(mm)[offset:offset + size]
+                try:
+                    field.load_bitmap(view, stride)
+                finally:
+                    view.release()
+
+    # Карта хранит только окно поля. У неограниченных движков клетки могут уйти за окно -
+    # такое поле не сохраняется, чтобы не потерять их молча
+    @classmethod
+    def save_field(cls, file: str, field: Field, generation: int = 0, compress: bool = False) -> None:
+        if not field.BOUNDED:
+            box = field.get_bounding_box()
+            w, h = field.get_size()
+            if box is not None and (box[0] < 0 or box[1] < 0 or box[2] >= w or box[3] >= h):
+                raise SaveFHCellsOutsideField()
+
+        bitmap, stride = field.to_bitmap()
+        if compress:
+            bitmap = zlib.compress(bitmap, cls.ZLIB_LEVEL)
+
+        rule = str(field.get_rule()).encode('ascii')
+        header = cls.HEADER.pack(cls.MAGIC, cls.VERSION, cls.FLAG_ZLIB if compress else 0,
+                                 field.get_size_x(), field.get_size_y(), stride, generation, len(rule))
+        padding = -(len(header) + len(rule)) % 8
+
+        with open(file, 'wb') as f:
+            f.write(header)
+            f.write(rule)
+            f.write(bytes(padding))
+            f.write(bitmap)
+
+    # Старый формат: строки из '0' и '1' по символу на клетку
     @staticmethod
-    def open_file(file: str) -> FieldMatrix:
+    def open_text_file(file: str) -> FieldMatrix:
         with open(file, 'rb') as f:
             buffer = f.read().split('\n'.encode())
 
@@ -16,11 +148,32 @@ class SaveFileHandler:
                    for x, state in enumerate(list(line.decode()))] for y, line in enumerate(buffer)]
         return buffer
 
-    @staticmethod
-    def save_file(file: str, content: FieldMatrix) -> None:
-        with open(file, 'wb') as f:
-            for i, line in enumerate(content):
-                s = ''.join(str(c.get_state()) for c in line)
-                if i != len(content) - 1:
-                    s += '\n'
-                f.write(s.encode())
+
+class SaveFHException(Exception):
+    def __str__(self) -> str:
+        return 'SaveFileHandler exception message'
+
+
+class SaveFHNotBinary(SaveFHException):
+    def __str__(self) -> str:
+        return 'file is not a binary save file'
+
+
+class SaveFHWrongFileFormatting(SaveFHException):
+    def __str__(self) -> str:
+        return 'wrong file formatting (are you sure the file is save file?)'
+
+
+class SaveFHUnsupportedVersion(SaveFHException):
+    def __str__(self) -> str:
+        return 'save file was written by a newer version of the program'
+
+
+class SaveFHUnsupportedRule(SaveFHException):
+    def __str__(self) -> str:
+        return 'save file uses a rule that is invalid or not supported by the selected engine'
+
+
+class SaveFHCellsOutsideField(SaveFHException):
+    def __str__(self) -> str:
+        return 'some live cells are outside the field window and cannot be saved'
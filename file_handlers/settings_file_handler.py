@@ -1,13 +1,29 @@
-from typing import Any
+import os
+import shutil
+import tempfile
+import threading
+from typing import Any, Optional
 
 from util import util_funcs
 
 
-# Читает/записывает настройки в файл, хранит в себе словарь настроек и их значений
+# Читает/записывает настройки в файл, хранит в себе словарь настроек и их значений.
+# Значения разбираются в типы один раз при чтении и дальше живут в памяти. Изменения пишутся в файл
+# отложенно (schedule_write): серия правок подряд (например, перетаскивание ползунка) даёт одну запись,
+# и делает её отдельный поток, так что интерфейс не ждёт диска
 class SettingsFileHandler:
+    # Через сколько секунд после последнего изменения настройки записываются в файл
+    WRITE_DELAY = .5
+
     def __init__(self, file: str) -> None:
         self.file = file
         self.settings = {}
+        # Есть ли изменения, ещё не записанные в файл
+        self.dirty = False
+        # lock защищает dirty и таймер отложенной записи, write_lock не даёт двум записям идти одновременно
+        self.lock = threading.Lock()
+        self.write_lock = threading.RLock()
+        self.timer: Optional[threading.Timer] = None
 
     def read_settings(self) -> None:
         with open(self.file, 'r') as f:
@@ -41,24 +57,84 @@ class SettingsFileHandler:
             return False
         return True
 
+    # Файл нужно перезаписать, только если значение действительно поменялось
     def set_setting(self, var: str, val: Any) -> None:
-        self.settings[var] = val
+        old = self.settings.get(var, None)
+        if old != val or type(old) is not type(val):
+            self.settings[var] = val
+            with self.lock:
+                self.dirty = True
 
+    # Файл пишется во временный рядом с ним и подменяет его переименованием,
+    # поэтому прерванная запись не оставляет испорченный файл настроек
     def write_settings(self, comment: str = 'WARNING! Changing any of these strings manually can break things. '
                                             'Edit this file only if you know what you are doing.') -> None:
-        with open(self.file, 'w') as f:
-            if comment is not None:
-                print(f'# {comment}\n', file=f)
-            for key, val in self.settings.items():
-                print(f'{key}={val}', file=f)
+        with self.write_lock:
+            with self.lock:
+                self.dirty = False
+                settings = dict(self.settings)
+
+            directory = os.path.dirname(os.path.abspath(self.file))
+            fd, temp = tempfile.mkstemp(prefix='.settings-', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    if comment is not None:
+                        print(f'# {comment}\n', file=f)
+                    for key, val in settings.items():
+                        print(f'{key}={val}', file=f)
+                if os.path.exists(self.file):
+                    shutil.copymode(self.file, temp)
+                os.replace(temp, self.file)
+            except BaseException:
+                os.remove(temp)
+                with self.lock:
+                    self.dirty = True
+                raise
+
+    # Отложенная запись: таймер перезапускается при каждом вызове, так что файл пишется
+    # через WRITE_DELAY после последнего изменения
+    def schedule_write(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.WRITE_DELAY, self.__write_later)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def __write_later(self) -> None:
+        try:
+            self.flush()
+        except OSError:
+            # Файл недоступен - изменения остаются несохранёнными, их запишет следующая запись
+            pass
+
+    # Записывает несохранённые изменения сразу (если запись уже идёт в другом потоке - дожидается её)
+    def flush(self) -> None:
+        with self.write_lock:
+            if self.dirty:
+                self.write_settings()
+
+    # При выходе отложенная запись не ждёт таймера
+    def close(self) -> None:
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        self.flush()
 
     def del_setting(self, var: str) -> None:
         if self.settings.get(var, None) is None:
             raise SFHSettingNotFound()
         del self.settings[var]
+        with self.lock:
+            self.dirty = True
 
     def clear_settings(self) -> None:
         self.settings = {}
+        with self.lock:
+            self.dirty = True
 
 
 class SFHException(Exception):
@@ -1,31 +1,78 @@
+import time
+# Отсчёт времени запуска (см. StartupTimer) - до всех остальных импортов
+START_TIME = time.perf_counter()
+
 import os
 import sys
-from typing import SupportsInt
+import math
+import argparse
+from typing import TYPE_CHECKING, Optional, SupportsInt
 
 from PyQt5 import QtCore, QtWidgets, QtGui
 from PyQt5.QtWidgets import QApplication, QMainWindow
 
-from field.field import Field
+from field.field import Field, get_line_cells
+from field.engines import get_field_class, DEFAULT_ENGINE, FALLBACK_ENGINE
+from field.rule import Rule
+from field.undo_stack import UndoStack, CellsAction, FieldAction
 from ui.main_ui import UIForm
 from ui.cell_painter import CellPainter
+from ui.simulation_worker import SimulationWorker, Frame
 from ui.simulation_view import SimulationView
+from ui.settings_widgets import ComboBoxSettingWidget
+from ui.perf_monitor import PerfMonitor, StartupTimer
 from file_handlers.settings_file_handler import SettingsFileHandler
-from file_handlers.save_file_handler import SaveFileHandler
+
+# Обработчики файлов сохранений, паттернов, истории и замеров нужны только по действию пользователя,
+# поэтому загружаются там, где используются, а не при запуске
+if TYPE_CHECKING:
+    from file_handlers.metrics_file_handler import MetricsFileHandler
 
 
 class GameOfLife(QMainWindow, UIForm):
     FACTOR = 1.5
+    # Наибольший размер клетки на экране (пикселей) - до него поле можно увеличивать, даже дальше трёх раз
+    MAX_ZOOM_CELL_SIZE = 48
     SIMULATION_WINDOW_SIZE = 600, 600
     FIELD_SIZE = 100, 100
+    # Наименьшая пауза между кадрами (мс), не зависит от скорости симуляции.
+    # Она же - бюджет шага в автоматическом турбо-режиме
+    FRAME_DELAY = 16
+    # Как часто пересчитывается скорость симуляции (с)
+    STATS_INTERVAL = .5
+    # Раз во сколько поколений история хранит полный кадр поля
+    HISTORY_KEYFRAME_INTERVAL = 100
+    # На сколько клеток сдвигается окно неограниченного поля при нажатии стрелки
+    PAN_STEP = 10
     SETTINGS_FILE = 'settings.txt'
 
-    def __init__(self):
+    def __init__(self, startup_timer: Optional[StartupTimer] = None):
         super().__init__()
 
+        # Замеры запуска; после первого кадра остаётся только время до него (с)
+        self.startup_timer: Optional[StartupTimer] = startup_timer or StartupTimer()
+        self.startup_time: Optional[float] = None
+
         # Поле
         self.field: Field = ...
         self.field_size_x: int = ...
         self.field_size_y: int = ...
+        # Мировые координаты левого верхнего угла видимого окна (двигается только у неограниченных полей)
+        self.view_x: int = ...
+        self.view_y: int = ...
+
+        # Поток симуляции и последний полученный от него кадр (None - поле рисуется напрямую)
+        self.worker: SimulationWorker = ...
+        self.frame: Optional[Frame] = ...
+        # Точка отсчёта для скорости симуляции: (время, поколение) и последняя измеренная скорость
+        self.stats_start: tuple = ...
+        self.generations_per_sec: float = ...
+        # Найденный потоком цикл: (поколение начала, период)
+        self.cycle: Optional[tuple] = ...
+        # Замеры производительности (None - выключены), файл, куда они пишутся, и таймер выборок
+        self.monitor: Optional[PerfMonitor] = ...
+        self.metrics_writer: Optional['MetricsFileHandler'] = ...
+        self.monitor_timer: QtCore.QTimer = ...
 
         # Обработчик настроек
         self.settingsfh: SettingsFileHandler = ...
@@ -34,13 +81,24 @@ class GameOfLife(QMainWindow, UIForm):
         self.simulation_active: bool = ...
         self.drag_start: QtCore.QPoint = ...
         self.dragging_to_cell_state: SupportsInt = ...
+        # Клетки, изменённые текущим движением мыши (для отмены и записи в историю)
+        self.stroke: Optional[CellsAction] = ...
+        # Правки мышью копятся до следующего кадра и применяются к полю разом: последняя клетка штриха
+        # (от неё ведётся отрезок к следующей), ещё не применённые клетки и таймер кадра
+        self.stroke_cell: Optional[tuple] = ...
+        self.pending_cells: list = ...
+        self.edit_timer: QtCore.QTimer = ...
+        # Отмена и повтор правок, шагов и перемоток
+        self.undo_stack: UndoStack = ...
 
         # Виджеты
         self._view: SimulationView = ...
         self._painter: CellPainter = ...
         self.loop_simulation_btn: QtWidgets.QPushButton = ...
         self.step_simulation_btn: QtWidgets.QPushButton = ...
+        self.step_back_simulation_btn: QtWidgets.QPushButton = ...
         self.reset_simulation_btn: QtWidgets.QPushButton = ...
+        self.rule_setting: ComboBoxSettingWidget = ...
 
         # Цвета элементов поля
         self.alive_cell_color: str = ...
@@ -51,10 +109,15 @@ class GameOfLife(QMainWindow, UIForm):
         self.zoom_x: float = ...
 
         # Подготовка к работе вынесена в отдельные методы
-        self.setup_simulation()
+        # (настройки читаются первыми - от них зависит выбор движка поля)
         self.setup_settings()
+        self.startup_timer.mark('settings')
+        self.setup_simulation()
+        self.startup_timer.mark('field')
         self.setup_ui(self)
         self.setup_ui_logic()
+        self.startup_timer.mark('ui')
+        self.undo_stack = UndoStack(self.settingsfh.get_setting('undo_memory_limit') << 20)
 
         # Цвета подтягиваются из файла настроек в настройки внутри программы
         self.alive_cell_color_setting.current_color = QtGui.QColor(self.settingsfh.get_setting('alive_cell_color'))
@@ -70,13 +133,33 @@ class GameOfLife(QMainWindow, UIForm):
         self.dead_cell_color = self.dead_cell_color_setting.value()
         self.cell_border_color = self.field_grid_color_setting.value()
 
-        w, h = self._painter.width(), self._painter.height()
-        self.field_cell_size = min(w // self.field_size_x, h // self.field_size_y)
-
-        # Таймер, по которому происходит цикличная симуляция
-        self.simulation_timer = QtCore.QTimer(self)
-        self.simulation_timer.setInterval(self.settingsfh.get_setting('simulation_update_delay'))
-        self.simulation_timer.timeout.connect(self.update_field)
+        # Поколения считаются в отдельном потоке, интерфейс только рисует готовые кадры
+        self.worker = SimulationWorker(self.field, self)
+        self.worker.step_delay = self.settingsfh.get_setting('simulation_update_delay') / 1000
+        self.worker.frame_delay = self.FRAME_DELAY / 1000
+        self.worker.generations_per_step = self.settingsfh.get_setting('generations_per_step')
+        self.worker.auto_generations = self.settingsfh.get_setting('auto_generations')
+        self.worker.pause_on_cycle = self.settingsfh.get_setting('pause_on_cycle')
+        self.worker.skip_cycles = self.settingsfh.get_setting('skip_cycles')
+        self.worker.max_changes = CellPainter.MAX_DIRTY_CELLS
+        self.update_density_levels()
+        self.worker.frameReady.connect(self.update_field)
+        self.worker.start()
+        self.update_simulation_stats(0)
+        # Правило, которое удалось применить к полю (испорченное в настройках заменяется B3/S23)
+        self.update_rule_setting()
+        if self.record_history_setting.value():
+            self.start_recording()
+        self.update_monitor()
+        self.startup_timer.mark('simulation')
+
+    # Поле нарисовано в первый раз - запуск закончен
+    def finish_startup(self):
+        self.startup_timer.mark('first frame')
+        self.startup_time = self.startup_timer.get_total()
+        if self.startup_timer.report:
+            print(self.startup_timer.format(), file=sys.stderr)
+        self.startup_timer = None
 
     def setup_settings(self):
         first_launch = False
@@ -93,6 +176,28 @@ class GameOfLife(QMainWindow, UIForm):
         if not self.settingsfh.has_setting('simulation_update_delay'):
             self.settingsfh.set_setting('simulation_update_delay', 50)
 
+        if not self.settingsfh.has_setting('generations_per_step'):
+            self.settingsfh.set_setting('generations_per_step', 1)
+
+        if not self.settingsfh.has_setting('auto_generations'):
+            self.settingsfh.set_setting('auto_generations', False)
+
+        if not self.settingsfh.has_setting('record_history'):
+            self.settingsfh.set_setting('record_history', False)
+
+        if not self.settingsfh.has_setting('pause_on_cycle'):
+            self.settingsfh.set_setting('pause_on_cycle', False)
+
+        if not self.settingsfh.has_setting('skip_cycles'):
+            self.settingsfh.set_setting('skip_cycles', True)
+
+        if not self.settingsfh.has_setting('step_back_generations'):
+            self.settingsfh.set_setting('step_back_generations', 10)
+
+        # Бюджет памяти на отмену действий (МБ)
+        if not self.settingsfh.has_setting('undo_memory_limit'):
+            self.settingsfh.set_setting('undo_memory_limit', 64)
+
         if not self.settingsfh.has_setting('alive_cell_color'):
             self.settingsfh.set_setting('alive_cell_color', '#ffffff')
 
@@ -102,22 +207,55 @@ class GameOfLife(QMainWindow, UIForm):
         if not self.settingsfh.has_setting('field_grid_color'):
             self.settingsfh.set_setting('field_grid_color', '#323232')
 
-        # Перезапись, если какая-то из настроек отсутствовала
-        self.settingsfh.write_settings()
+        if not self.settingsfh.has_setting('perf_overlay'):
+            self.settingsfh.set_setting('perf_overlay', False)
+
+        if not self.settingsfh.has_setting('rule'):
+            self.settingsfh.set_setting('rule', 'B3/S23')
+
+        if not self.settingsfh.has_setting('field_engine'):
+            self.settingsfh.set_setting('field_engine', DEFAULT_ENGINE)
+
+        # Перезапись, только если какая-то из настроек отсутствовала
+        self.settingsfh.flush()
 
     def setup_ui_logic(self):
         self.zoom_x = 1
+        self.stroke = None
+        self.stroke_cell = None
+        self.pending_cells = []
+        self.edit_timer = QtCore.QTimer(self)
+        self.edit_timer.setSingleShot(True)
+        self.edit_timer.setInterval(self.FRAME_DELAY)
+        self.edit_timer.timeout.connect(self.apply_pending_cells)
+        self.monitor = None
+        self.metrics_writer = None
+        self.monitor_timer = QtCore.QTimer(self)
+        self.monitor_timer.timeout.connect(self.sample_metrics)
 
         # Подключаем изменение настроек к соответствующим методам
         self.simulation_update_delay_setting.settingValueChanged.connect(self.change_simulation_update_delay)
+        self.generations_per_step_setting.settingValueChanged.connect(self.change_generations_per_step)
+        self.auto_generations_setting.settingValueChanged.connect(self.change_generations_per_step)
+        self.record_history_setting.settingValueChanged.connect(self.change_record_history)
+        self.rule_setting.settingValueChanged.connect(self.change_rule)
+        self.history_slider.valueChanged.connect(self.scrub_history)
+        self.history_slider.sliderPressed.connect(self.push_field_action)
+        self.step_back_generations_setting.settingValueChanged.connect(self.change_step_back_generations)
+        self.undo_memory_limit_setting.settingValueChanged.connect(self.change_undo_memory_limit)
+        self.pause_on_cycle_action.toggled.connect(self.change_cycle_actions)
+        self.skip_cycles_action.toggled.connect(self.change_cycle_actions)
+        self.perf_overlay_action.toggled.connect(self.change_perf_overlay)
+        self.export_metrics_action.toggled.connect(self.change_export_metrics)
         self.alive_cell_color_setting.settingValueChanged.connect(self.update_cell_colors)
         self.dead_cell_color_setting.settingValueChanged.connect(self.update_cell_colors)
         self.field_grid_color_setting.settingValueChanged.connect(self.update_cell_colors)
 
-        # По нажатию на Step (self.step_simulation_btn) функция вызывается один раз
-        # По нажатию на Play (self.loop_simulation_btn) активируется QTimer, который через равные промежутки времени вызывает функцию
-        # По нажатию на Stop (self.loop_simulation_btn) QTimer деактивируется
-        self.step_simulation_btn.clicked.connect(self.update_field)
+        # По нажатию на Step (self.step_simulation_btn) поток симуляции считает одно поколение
+        # По нажатию на Play (self.loop_simulation_btn) поток начинает считать поколения через равные промежутки времени
+        # По нажатию на Pause (self.loop_simulation_btn) поток останавливается
+        self.step_simulation_btn.clicked.connect(self.step_simulation)
+        self.step_back_simulation_btn.clicked.connect(self.step_back_simulation)
         self.loop_simulation_btn.clicked.connect(self.loop_simulation)
         self.reset_simulation_btn.clicked.connect(self.reload_simulation)
 
@@ -127,20 +265,104 @@ class GameOfLife(QMainWindow, UIForm):
         zoom_out_bind = QtWidgets.QShortcut(QtCore.Qt.Key_Minus, self._view)
         zoom_out_bind.activated.connect(self.simulation_zoom_out)
 
+        # Стрелки двигают окно по неограниченному полю
+        for key, dx, dy in ((QtCore.Qt.Key_Left, -1, 0), (QtCore.Qt.Key_Right, 1, 0),
+                            (QtCore.Qt.Key_Up, 0, -1), (QtCore.Qt.Key_Down, 0, 1)):
+            pan_bind = QtWidgets.QShortcut(key, self._view)
+            pan_bind.activated.connect(lambda dx=dx, dy=dy: self.pan_view(dx * self.PAN_STEP, dy * self.PAN_STEP))
+
     def setup_simulation(self):
         self.simulation_active = False
-
-        self.field = Field(*self.FIELD_SIZE)
-        self.field_size_x, self.field_size_y = self.FIELD_SIZE
+        # Потока и виджетов ещё нет - запоминается только само поле, остальное настраивается после их создания
+        self.init_field(self.create_field())
+
+    # Пустое поле движка и правила из настроек
+    def create_field(self) -> Field:
+        try:
+            field_class = get_field_class(self.settingsfh.get_setting('field_engine'))
+        except ImportError:
+            # Зависимость движка не установлена - считаем на чистом Python
+            field_class = get_field_class(FALLBACK_ENGINE)
+
+        field = field_class(*self.FIELD_SIZE)
+        try:
+            field.set_rule(Rule(self.settingsfh.get_setting('rule')))
+        except ValueError:
+            # Правило из настроек испорчено или не поддерживается движком - остаётся B3/S23
+            pass
+        return field
+
+    # Поле и зависящее от него состояние окна (без потока и виджетов)
+    def init_field(self, field: Field, generation: int = 0):
+        self.field = field
+        self.field_size_x, self.field_size_y = field.get_size()
+        self.view_x, self.view_y = 0, 0
+        self.frame = None
+        self.cycle = None
+        self.stats_start = time.perf_counter(), generation
+        self.generations_per_sec = 0.0
+
+    # Установка нового поля (сброс, открытие сохранения)
+    def set_field(self, field: Field, generation: int = 0):
+        self.init_field(field, generation)
+
+        # При сбросе поток переходит на новое поле, а старое закрывает, когда закончит с ним работать
+        self.worker.set_field(self.field, generation)
+        self.worker.view = self.view_x, self.view_y
+        # История начинается заново с нового поля
+        if self.worker.recorder is not None:
+            with self.worker.lock:
+                self.worker.recorder.reset(*field.get_size())
+            self.worker.request_record()
+        # Отменять на новом поле нечего
+        self.undo_stack.clear()
+        # Правило нового поля (например, из сохранения) становится текущим
+        self.update_rule_setting()
+        # Размер клетки зависит от размера поля
+        self._painter.update()
+        self.update_density_levels()
 
     def reload_simulation(self):
         # Сброс симуляции - очистка поля
         if self.simulation_active:
-            self.simulation_timer.stop()
             self.loop_simulation_btn.setText('Play')
 
-        self.setup_simulation()
-        self._painter.update()
+        self.simulation_active = False
+        self.set_field(self.create_field())
+        self.update_simulation_stats(0)
+        self._painter.update_cells(None)
+
+    # Клетка под курсором добавляется к штриху отрезком от предыдущей, поэтому быстрое движение мыши
+    # не оставляет пропусков. Сами правки откладываются до ближайшего кадра
+    def queue_cell(self, cell) -> None:
+        if self.stroke_cell is None:
+            self.pending_cells.append(cell)
+        else:
+            self.pending_cells += get_line_cells(*self.stroke_cell, *cell)[1:]
+        self.stroke_cell = cell
+        if not self.edit_timer.isActive():
+            self.edit_timer.start()
+
+    # Все клетки, накопленные за кадр, применяются к полю одним вызовом и перерисовываются за раз.
+    # Пока поток считает поколение, поле править нельзя - правки ждут следующего кадра, а не конца шага
+    def apply_pending_cells(self, blocking: bool = False) -> None:
+        if not self.pending_cells or self.stroke is None:
+            return
+        if not self.worker.lock.acquire(blocking=blocking):
+            self.edit_timer.start()
+            return
+        try:
+            changed = self.field.set_cells(self.pending_cells, self.dragging_to_cell_state)
+        finally:
+            self.worker.lock.release()
+        self.pending_cells = []
+        self.stroke.add_cells(changed)
+        # Кадр потока больше не совпадает с полем
+        if self.frame is not None:
+            self.frame = None
+            self._painter.update_cells(None)
+        elif changed:
+            self._painter.update_cells(changed)
 
     def mousePressEvent(self, event):
         # При зажатии ЛКМ на поле мы запоминаем начальную позицию курсора
@@ -152,96 +374,422 @@ class GameOfLife(QMainWindow, UIForm):
 
             cell = self.get_hovered_cell()
             if cell is not None:
-                if cell.get_state() == Field.Cell.DEAD:
+                if self.field.get_cell_state(*cell) == Field.Cell.DEAD:
                     self.dragging_to_cell_state = Field.Cell.ALIVE
                 else:
                     self.dragging_to_cell_state = Field.Cell.DEAD
-                cell.set_state(self.dragging_to_cell_state)
-                self._painter.update()
+                self.stroke = CellsAction(self.worker.generation, self.dragging_to_cell_state)
+                self.stroke_cell = None
+                self.pending_cells = []
+                # Нажатие видно сразу, не дожидаясь кадра
+                self.queue_cell(cell)
+                self.apply_pending_cells()
 
     def mouseReleaseEvent(self, event):
+        # Недорисованное за последний кадр применяется сразу
+        self.edit_timer.stop()
+        self.apply_pending_cells(blocking=True)
         # При отжатии ЛКМ очищаем используемые переменные
         self.drag_start = None
         self.dragging_to_cell_state = None
+        self.stroke_cell = None
+        self.pending_cells = []
+        # Штрих целиком отменяется одним действием, изменённое поколение перезаписывается в историю
+        if self.stroke is not None and not self.stroke.is_empty():
+            self.undo_stack.push(self.stroke)
+            self.cycle = None
+            if self.worker.recorder is not None:
+                self.worker.request_record()
+        self.stroke = None
 
     def mouseMoveEvent(self, event):
         # При движении с зажатым ЛКМ меняем состояние клеток на взятое, если они не находятся в нём
-        if (self.drag_start is not None and
+        if (self.stroke is not None and
+                self.drag_start is not None and
                 self.dragging_to_cell_state is not None and
                 event.buttons() & QtCore.Qt.LeftButton and
                 self._view.underMouse() and
                 event.pos() != self.drag_start):
             cell = self.get_hovered_cell()
-            if cell is not None:
-                if cell.get_state() != self.dragging_to_cell_state:
-                    cell.set_state(self.dragging_to_cell_state)
-            self._painter.update()
+            # Курсор ушёл за край поля - отрезок к клетке, где он вернётся, не проводится
+            if cell is None:
+                self.stroke_cell = None
+            elif cell != self.stroke_cell:
+                self.queue_cell(cell)
 
     def loop_simulation(self):
         if self.simulation_active:
-            self.simulation_timer.stop()
             self.loop_simulation_btn.setText('Play')
         else:
-            self.simulation_timer.start()
             self.loop_simulation_btn.setText('Pause')
+            self.push_field_action(simulated=True)
 
         self.simulation_active = not self.simulation_active
+        self.worker.set_running(self.simulation_active)
+        self.stats_start = time.perf_counter(), self.worker.generation
 
-    def get_hovered_cell(self):
-        # Главный костыль масштабирования
-        # По какой-то необъяснимой причине получаемая позиция курсора относительно CellPainter
-        # абсолютно не совпадает с действительной, поэтому приходится выдумывать, как находить нужную (нажатую) клетку
-        cursor_point = self._view.mapFromGlobal(self.cursor().pos())
-        if self._view.horizontalScrollBar().isVisible():
-            h_offset, v_offset = self._view.horizontalScrollBar().value() / self._view.horizontalScrollBar().maximum(),\
-                                 self._view.verticalScrollBar().value() / self._view.verticalScrollBar().maximum()
-        else:
-            h_offset, v_offset = 0, 0
+    def pause_simulation(self):
+        if self.simulation_active:
+            self.loop_simulation()
 
-        cell_pos_x, cell_pos_y = int((cursor_point.x() + 140 * self.zoom_x ** 2 * h_offset) / self.field_cell_size), \
-                                 int((cursor_point.y() + 140 * self.zoom_x ** 2 * v_offset) / self.field_cell_size)
+    # Позиция курсора переводится из окна SimulationView в сцену (с учётом масштаба и прокрутки),
+    # а из сцены - в координаты CellPainter
+    def get_hovered_cell(self):
+        cursor_point = self._view.viewport().mapFromGlobal(self.cursor().pos())
+        point = self._painter.graphicsProxyWidget().mapFromScene(self._view.mapToScene(cursor_point))
+        sz = self._painter.cell_size()
+        cell_pos_x, cell_pos_y = math.floor(point.x() / sz), math.floor(point.y() / sz)
         if (cell_pos_x < 0 or cell_pos_x > self.field_size_x - 1 or
                 cell_pos_y < 0 or cell_pos_y > self.field_size_y - 1):
             return
-        return self.field.matrix[cell_pos_y][cell_pos_x]
+        return cell_pos_x + self.view_x, cell_pos_y + self.view_y
+
+    def pan_view(self, dx: int, dy: int):
+        if self.field.BOUNDED:
+            return
+        self.view_x += dx
+        self.view_y += dy
+        self.worker.view = self.view_x, self.view_y
+        # Кадр потока снят для старого окна
+        if not self.simulation_active:
+            self.frame = None
+        self._painter.update_cells(None)
 
     def change_simulation_update_delay(self):
         # Значение изменяется
         v = self.simulation_update_delay_setting.value()
-        self.simulation_timer.setInterval(v)
+        self.worker.step_delay = v / 1000
         # Значение сохраняется
         self.settingsfh.set_setting('simulation_update_delay', v)
-        # Настройки перезаписываются
-        self.settingsfh.write_settings()
+        # Настройки запишутся в файл после паузы в изменениях
+        self.settingsfh.schedule_write()
+
+    def change_generations_per_step(self):
+        v = self.generations_per_step_setting.value()
+        auto = self.auto_generations_setting.value()
+        self.generations_per_step_setting.setEnabled(not auto)
+        with self.worker.condition:
+            self.worker.auto_generations = auto
+            self.worker.generations_per_step = v
+
+        self.settingsfh.set_setting('generations_per_step', v)
+        self.settingsfh.set_setting('auto_generations', auto)
+        self.settingsfh.schedule_write()
+
+    def change_record_history(self):
+        v = self.record_history_setting.value()
+        if v and self.worker.recorder is None:
+            self.start_recording()
+        elif not v and self.worker.recorder is not None:
+            self.stop_recording()
+
+        self.settingsfh.set_setting('record_history', v)
+        self.settingsfh.schedule_write()
+
+    def change_rule(self):
+        text = self.rule_setting.value()
+        try:
+            rule = Rule(text)
+            changed = rule != self.field.get_rule()
+            if changed:
+                with self.worker.lock:
+                    self.field.set_rule(rule)
+        except ValueError as e:
+            # Сначала возвращается прежнее правило: окно с ошибкой забирает фокус, и список сообщит о правке ещё раз
+            self.rule_setting.setValue(str(self.field.get_rule()))
+            QtWidgets.QMessageBox.warning(self, 'Rule', f'Cannot use rule {text}: {e}')
+            return
+
+        if changed:
+            # Найденный цикл и пересчёт поколений для отмены шагов относятся к старому правилу
+            with self.worker.condition:
+                self.worker.restart_detection = True
+            self.cycle = None
+            self.undo_stack.clear()
+            self.update_simulation_stats(self.worker.generation)
+        self.update_rule_setting()
+
+    # Показывает правило поля в настройках и запоминает его
+    def update_rule_setting(self):
+        rule = str(self.field.get_rule())
+        self.rule_setting.setValue(rule)
+        if self.settingsfh.get_setting('rule') != rule:
+            self.settingsfh.set_setting('rule', rule)
+            self.settingsfh.schedule_write()
+
+    def change_cycle_actions(self):
+        pause, skip = self.pause_on_cycle_action.isChecked(), self.skip_cycles_action.isChecked()
+        with self.worker.condition:
+            self.worker.pause_on_cycle = pause
+            self.worker.skip_cycles = skip
+
+        self.settingsfh.set_setting('pause_on_cycle', pause)
+        self.settingsfh.set_setting('skip_cycles', skip)
+        self.settingsfh.schedule_write()
+
+    def change_perf_overlay(self):
+        v = self.perf_overlay_action.isChecked()
+        self.update_monitor()
+
+        self.settingsfh.set_setting('perf_overlay', v)
+        self.settingsfh.schedule_write()
+
+    def change_export_metrics(self):
+        if not self.export_metrics_action.isChecked():
+            if self.metrics_writer is not None:
+                self.metrics_writer.close()
+                self.metrics_writer = None
+            self.update_monitor()
+            return
+
+        filename = QtWidgets.QFileDialog.getSaveFileName(
+            self, 'Export metrics', '', 'CSV (*.csv);;JSON Lines (*.jsonl *.json)'
+        )[0]
+        if filename:
+            from file_handlers.metrics_file_handler import MetricsFileHandler
+            try:
+                self.metrics_writer = MetricsFileHandler(filename, PerfMonitor.FIELDS)
+            except OSError as e:
+                QtWidgets.QMessageBox.warning(self, 'Export metrics', f'Cannot write {filename}: {e}')
+        # Файл не выбран или не открылся - экспорт не включается
+        if self.metrics_writer is None:
+            self.export_metrics_action.blockSignals(True)
+            self.export_metrics_action.setChecked(False)
+            self.export_metrics_action.blockSignals(False)
+        self.update_monitor()
+
+    # Замеры ведутся, только пока они кому-то нужны: включено наложение или экспорт в файл
+    def update_monitor(self):
+        needed = self.perf_overlay_action.isChecked() or self.metrics_writer is not None
+        if needed and self.monitor is None:
+            self.monitor = PerfMonitor()
+            self.monitor_timer.start(int(self.STATS_INTERVAL * 1000))
+        elif not needed and self.monitor is not None:
+            self.monitor = None
+            self.monitor_timer.stop()
+        self.worker.monitor = self.monitor
+        if not self.perf_overlay_action.isChecked():
+            self._view.set_overlay_text(None)
+
+    def sample_metrics(self):
+        # Заданная скорость: поколений за шаг на шаги в секунду (в автоматическом режиме не задана)
+        if self.worker.auto_generations:
+            target = None
+        elif self.simulation_active:
+            target = self.worker.generations_per_step / self.worker.step_delay
+        else:
+            target = 0.0
+        # Пока поток стоит, население считается здесь (поле могли поправить мышью); во время шага - не ждём
+        if not self.simulation_active and self.worker.lock.acquire(blocking=False):
+            try:
+                self.monitor.set_population(self.field.get_population())
+            finally:
+                self.worker.lock.release()
+
+        sample = self.monitor.sample(self.worker.generation, target)
+        if self.perf_overlay_action.isChecked():
+            self._view.set_overlay_text(PerfMonitor.format_sample(sample))
+        if self.metrics_writer is not None:
+            self.metrics_writer.write(sample)
+
+    # Время работы с файлом, начатой в start, - в замеры
+    def add_io_timing(self, start: float):
+        if self.monitor is not None:
+            self.monitor.add_timing('io', time.perf_counter() - start)
+
+    def change_step_back_generations(self):
+        self.settingsfh.set_setting('step_back_generations', self.step_back_generations_setting.value())
+        self.settingsfh.schedule_write()
+
+    def change_undo_memory_limit(self):
+        v = self.undo_memory_limit_setting.value()
+        self.undo_stack.set_memory_limit(v << 20)
+        self.settingsfh.set_setting('undo_memory_limit', v)
+        self.settingsfh.schedule_write()
+
+    # История пишется во временный файл, который удаляется при выключении записи
+    def start_recording(self):
+        # Запись истории включается не всегда - модули не загружаются при запуске
+        import tempfile
+        from file_handlers.history_file_handler import HistoryFileHandler
+        fd, file = tempfile.mkstemp(prefix='history_', suffix='.golhist')
+        os.close(fd)
+        recorder = HistoryFileHandler(file, *self.field.get_size(), self.HISTORY_KEYFRAME_INTERVAL)
+        with self.worker.lock:
+            self.worker.recorder = recorder
+        self.worker.request_record()
+        self.history_slider.setEnabled(True)
+
+    def stop_recording(self):
+        with self.worker.lock:
+            recorder, self.worker.recorder = self.worker.recorder, None
+        recorder.close()
+        self.history_slider.setEnabled(False)
+        self.update_history_slider(0)
+
+    def update_history_slider(self, generation: int):
+        recorder = self.worker.recorder
+        self.history_slider.blockSignals(True)
+        if recorder is None or recorder.is_empty():
+            self.history_slider.setRange(generation, generation)
+        else:
+            self.history_slider.setRange(recorder.get_first(), recorder.get_last())
+        self.history_slider.setValue(generation)
+        self.history_slider.blockSignals(False)
+
+    # Перемотка к записанному поколению: ближайший полный кадр и изменения после него.
+    # Протяжка ползунка отменяется целиком - копия поля снимается при нажатии на него
+    @QtCore.pyqtSlot(int)
+    def scrub_history(self, generation: int):
+        if self.worker.recorder is None:
+            return
+        self.pause_simulation()
+        if not self.history_slider.isSliderDown():
+            self.push_field_action()
+        with self.worker.lock:
+            try:
+                bitmap, stride = self.worker.recorder.load_generation(generation)
+            except IndexError:
+                return
+            self.field.load_bitmap(bitmap, stride)
+            self.worker.set_generation(generation)
+        self.show_generation(generation)
+
+    # Поле изменено в обход потока симуляции (перемотка, отмена) - рисуется напрямую
+    def show_generation(self, generation: int):
+        self.frame = None
+        self.cycle = None
+        self.update_simulation_stats(generation)
+        self.update_history_slider(generation)
+        self._painter.update_cells(None)
+
+    # Копия поля перед действием, меняющим его целиком
+    @QtCore.pyqtSlot()
+    def push_field_action(self, simulated: bool = False):
+        with self.worker.lock:
+            self.undo_stack.push(FieldAction(self.field, self.worker.generation, simulated))
+
+    @QtCore.pyqtSlot()
+    def undo(self):
+        self.pause_simulation()
+        with self.worker.lock:
+            generation = self.undo_stack.undo(self.field, self.worker.generation)
+            if generation is None:
+                return
+            self.worker.set_generation(generation)
+        if self.worker.recorder is not None:
+            self.worker.request_record()
+        self.show_generation(generation)
+
+    @QtCore.pyqtSlot()
+    def redo(self):
+        self.pause_simulation()
+        with self.worker.lock:
+            generation = self.undo_stack.redo(self.field, self.worker.generation)
+            if generation is None:
+                return
+            self.worker.set_generation(generation)
+        if self.worker.recorder is not None:
+            self.worker.request_record()
+        self.show_generation(generation)
+
+    # Шаг назад на step_back_generations поколений. Поколение берётся из записанной истории, если оно там есть,
+    # иначе досчитывается потоком симуляции от ближайшей копии поля, снятой перед шагом или запуском
+    @QtCore.pyqtSlot()
+    def step_back_simulation(self):
+        self.pause_simulation()
+        with self.worker.lock:
+            generation = self.worker.generation
+            target = max(generation - self.step_back_generations_setting.value(), 0)
+            recorder = self.worker.recorder
+            if recorder is not None and not recorder.is_empty() and \
+                    recorder.get_first() <= target <= recorder.get_last():
+                self.undo_stack.push(FieldAction(self.field, generation))
+                bitmap, stride = recorder.load_generation(target)
+                self.field.load_bitmap(bitmap, stride)
+                start = target
+            else:
+                checkpoint = self.undo_stack.find_checkpoint(target, generation)
+                if checkpoint is None:
+                    QApplication.beep()
+                    return
+                self.undo_stack.push(FieldAction(self.field, generation))
+                checkpoint.restore(self.field)
+                start = checkpoint.generation
+            self.worker.set_generation(start)
+        if target > start:
+            self.worker.request_step(target - start)
+        elif self.worker.recorder is not None:
+            self.worker.request_record()
+        self.show_generation(start)
+
+    # Номер поколения и скорость, усреднённая за STATS_INTERVAL
+    def update_simulation_stats(self, generation: int):
+        now = time.perf_counter()
+        start_time, start_generation = self.stats_start
+        if not self.simulation_active:
+            self.generations_per_sec = 0.0
+        elif now - start_time >= self.STATS_INTERVAL:
+            self.generations_per_sec = (generation - start_generation) / (now - start_time)
+            self.stats_start = now, generation
+        text = f'Generation {generation}\n{self.generations_per_sec:.1f} gen/s'
+        if self.cycle is not None:
+            start, period = self.cycle
+            text += f'\nStill life since {start}' if period == 1 else f'\nPeriod {period} since {start}'
+        self.simulation_stats_label.setText(text)
 
     def update_cell_colors(self):
         self.alive_cell_color = self.alive_cell_color_setting.value()
         self.dead_cell_color = self.dead_cell_color_setting.value()
         self.cell_border_color = self.field_grid_color_setting.value()
+        self._painter.update()
 
         self.settingsfh.set_setting('alive_cell_color', self.alive_cell_color.name())
         self.settingsfh.set_setting('dead_cell_color', self.dead_cell_color.name())
         self.settingsfh.set_setting('field_grid_color', self.cell_border_color.name())
-        self.settingsfh.write_settings()
+        self.settingsfh.schedule_write()
 
+    @QtCore.pyqtSlot()
+    def step_simulation(self):
+        if not self.simulation_active:
+            # Шаги, нажатые до того, как поток досчитал предыдущие, отменяются вместе с ними
+            if not self.worker.pending_steps:
+                self.push_field_action(simulated=True)
+            self.worker.request_step()
+
+    # Кадр от потока симуляции. Устаревшие кадры уже заменены последним, лишние сигналы ничего не делают
     @QtCore.pyqtSlot()
     def update_field(self):
-        if self.sender() is self.step_simulation_btn:
-            if self.simulation_active:
-                return
-        self.field.step()
-        self._painter.update()
+        start = time.perf_counter()
+        frame = self.worker.take_frame()
+        if frame is None:
+            return
+
+        # Поток остановился - дальше поле рисуется напрямую (с правками мышью)
+        self.frame = None if frame.idle else frame
+        self.cycle = frame.cycle
+        # Поток остановился сам, найдя цикл
+        if frame.idle and frame.cycle is not None and self.simulation_active:
+            self.simulation_active = False
+            self.loop_simulation_btn.setText('Play')
+        self.update_simulation_stats(frame.generation)
+        self.update_history_slider(frame.generation)
+        # После одного поколения перерисовываются только изменившиеся клетки
+        self._painter.invalidate_pyramid()
+        self._painter.update_cells(frame.changes)
+        if self.monitor is not None:
+            self.monitor.add_timing('frame', time.perf_counter() - start)
 
     @QtCore.pyqtSlot()
     def simulation_zoom_in(self):
         scale_tr = QtGui.QTransform().scale(self.FACTOR, self.FACTOR)
 
         tr = self._view.transform() * scale_tr
-        if tr.m11() < 3:
+        if tr.m11() < max(3, self.MAX_ZOOM_CELL_SIZE / self._painter.cell_size()):
             self.zoom_x = tr.m11()
             self._view.setTransform(tr)
-            w, h = self._view.width(), self._view.height()
-            self.field_cell_size = int(min(w * tr.m11() / self.field_size_x, h * tr.m11() / self.field_size_y))
+            self._painter.update()
+            self.update_density_levels()
 
     @QtCore.pyqtSlot()
     def simulation_zoom_out(self):
@@ -254,20 +802,146 @@ class GameOfLife(QMainWindow, UIForm):
             if tr.m11() >= 1:
                 self.zoom_x = tr.m11()
                 self._view.setTransform(tr)
-                w, h = self._view.width(), self._view.height()
-                self.field_cell_size = int(min(w * tr.m11() / self.field_size_x, h * tr.m11() / self.field_size_y))
+                self._painter.update()
+                self.update_density_levels()
+
+    # Уровни пирамиды плотности, которые поток симуляции строит для кадров: для поля мельче пикселя на клетку
+    # и для миникарты (она видна, пока поле увеличено)
+    def update_density_levels(self):
+        levels = self._painter.get_density_level()
+        if self.zoom_x > 1:
+            levels = max(levels, self._painter.get_minimap_level())
+        self.worker.density_levels = levels
 
     @QtCore.pyqtSlot()
     def create_save_file(self):
-        filename = QtWidgets.QFileDialog.getSaveFileName(self, 'Save file', '', 'Save file (*.sav)')[0]
+        filename, file_filter = QtWidgets.QFileDialog.getSaveFileName(
+            self, 'Save file', '', 'Save file (*.sav);;Compressed save file (*.sav)'
+        )
         if filename:
-            SaveFileHandler.save_file(filename, self.field.matrix)
+            from file_handlers.save_file_handler import SaveFileHandler, SaveFHException
+            start = time.perf_counter()
+            try:
+                with self.worker.lock:
+                    SaveFileHandler.save_field(filename, self.field, self.worker.generation,
+                                               compress=file_filter.startswith('Compressed'))
+            except SaveFHException as e:
+                QtWidgets.QMessageBox.warning(self, 'Save file', f'Cannot save {filename}: {e}')
+                return
+            self.add_io_timing(start)
 
     @QtCore.pyqtSlot()
     def open_save_file(self):
         filename = QtWidgets.QFileDialog.getOpenFileName(self, 'Choose your save file', '', 'Save file (*.sav)')[0]
         if filename:
-            self.field.matrix = SaveFileHandler.open_file(filename)
+            from file_handlers.save_file_handler import SaveFileHandler, SaveFHException
+            start = time.perf_counter()
+            try:
+                field, header = SaveFileHandler.open_field(filename, type(self.field))
+            except (SaveFHException, ValueError) as e:
+                QtWidgets.QMessageBox.warning(self, 'Open file', f'Cannot open {filename}: {e}')
+                return
+            self.add_io_timing(start)
+            self.pause_simulation()
+            self.set_field(field, header.generation)
+            self.update_simulation_stats(header.generation)
+            self._painter.update_cells(None)
+
+    # Паттерн ставится в центр поля; если он больше стандартного поля, поле увеличивается
+    @QtCore.pyqtSlot()
+    def import_pattern_file(self):
+        from file_handlers.pattern_file_handler import PatternFileHandler, PFHException
+        filename = QtWidgets.QFileDialog.getOpenFileName(
+            self, 'Import pattern', '', ';;'.join(PatternFileHandler.get_filters())
+        )[0]
+        if filename:
+            start = time.perf_counter()
+            try:
+                pw, ph = PatternFileHandler.read_size(filename)
+                w, h = max(pw, self.FIELD_SIZE[0]), max(ph, self.FIELD_SIZE[1])
+                field = PatternFileHandler.open_pattern(filename, type(self.field), (w, h),
+                                                        ((w - pw) // 2, (h - ph) // 2), self.field.get_rule())
+            except (PFHException, ValueError, OSError) as e:
+                QtWidgets.QMessageBox.warning(self, 'Import pattern', f'Cannot import {filename}: {e}')
+                return
+            self.add_io_timing(start)
+            self.pause_simulation()
+            self.set_field(field)
+            self.update_simulation_stats(0)
+            self._painter.update_cells(None)
+
+    @QtCore.pyqtSlot()
+    def export_pattern_file(self):
+        from file_handlers.pattern_file_handler import PatternFileHandler, PFHException
+        filters = PatternFileHandler.get_filters()[1:]
+        filename, file_filter = QtWidgets.QFileDialog.getSaveFileName(self, 'Export pattern', '', ';;'.join(filters))
+        if filename:
+            # Без расширения формат берётся из выбранного фильтра
+            if PatternFileHandler.get_format(filename) is None:
+                pattern_format = PatternFileHandler.FORMATS[filters.index(file_filter) if file_filter in filters else 0]
+                filename += pattern_format.EXTENSIONS[0]
+            start = time.perf_counter()
+            try:
+                with self.worker.lock:
+                    PatternFileHandler.save_pattern(filename, self.field)
+            except (PFHException, ValueError, OSError) as e:
+                QtWidgets.QMessageBox.warning(self, 'Export pattern', f'Cannot export {filename}: {e}')
+                return
+            self.add_io_timing(start)
+
+    # Видимая часть окна поля в мировых координатах: (x, y, ширина, высота)
+    def get_visible_rect(self) -> tuple:
+        proxy = self._painter.graphicsProxyWidget()
+        visible = proxy.mapFromScene(self._view.mapToScene(self._view.viewport().rect())).boundingRect()
+        x0, y0, x1, y1 = self._painter.visible_cells(visible.toAlignedRect())
+        return x0 + self.view_x, y0 + self.view_y, x1 - x0, y1 - y0
+
+    # Правка поля целиком (вставка паттерна, случайный суп) отменяется одним действием с копией поля
+    def edit_field(self, edit) -> None:
+        self.pause_simulation()
+        self.push_field_action()
+        with self.worker.lock:
+            edit(self.field)
+        if self.worker.recorder is not None:
+            self.worker.request_record()
+        self.show_generation(self.worker.generation)
+
+    # Паттерн накладывается на текущее поле по центру видимой части; не поместившееся отбрасывается
+    @QtCore.pyqtSlot()
+    def paste_pattern_file(self):
+        from file_handlers.pattern_file_handler import PatternFileHandler, PFHException
+        filename = QtWidgets.QFileDialog.getOpenFileName(
+            self, 'Paste pattern', '', ';;'.join(PatternFileHandler.get_filters())
+        )[0]
+        if filename:
+            start = time.perf_counter()
+            try:
+                bitmap, stride, (pw, ph) = PatternFileHandler.read_bitmap(filename)
+            except (PFHException, ValueError, OSError) as e:
+                QtWidgets.QMessageBox.warning(self, 'Paste pattern', f'Cannot paste {filename}: {e}')
+                return
+            self.add_io_timing(start)
+            x, y, w, h = self.get_visible_rect()
+            self.edit_field(lambda field: field.paste(bitmap, stride, (pw, ph), x + (w - pw) // 2, y + (h - ph) // 2))
+
+    # Видимая часть поля заполняется случайным супом заданной плотности
+    @QtCore.pyqtSlot()
+    def fill_random_soup(self):
+        density, ok = QtWidgets.QInputDialog.getInt(self, 'Random soup', 'Alive cells, %:', 30, 1, 100)
+        if ok:
+            x, y, w, h = self.get_visible_rect()
+            self.edit_field(lambda field: field.random_fill(x, y, w, h, density / 100))
+
+    def closeEvent(self, event):
+        self.worker.stop()
+        if self.worker.recorder is not None:
+            self.worker.recorder.close()
+        if self.metrics_writer is not None:
+            self.metrics_writer.close()
+        self.field.close()
+        # Отложенные изменения настроек записываются сразу
+        self.settingsfh.close()
+        super().closeEvent(event)
 
 
 def except_hook(cls, exception, traceback):
@@ -275,14 +949,22 @@ def except_hook(cls, exception, traceback):
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Game of Life')
+    parser.add_argument('--startup-timing', action='store_true',
+                        help='print how long imports, settings, field, UI and the first frame took')
+    args, qt_args = parser.parse_known_args()
+    timer = StartupTimer(START_TIME, args.startup_timing)
+    timer.mark('imports')
+
     if hasattr(QtCore.Qt, 'AA_EnableHighDpiScaling'):
         QApplication.setAttribute(QtCore.Qt.AA_EnableHighDpiScaling, True)
 
     if hasattr(QtCore.Qt, 'AA_UseHighDpiPixmaps'):
         QApplication.setAttribute(QtCore.Qt.AA_UseHighDpiPixmaps, True)
 
-    app = QApplication(sys.argv)
-    ex = GameOfLife()
+    app = QApplication(sys.argv[:1] + qt_args)
+    timer.mark('qt')
+    ex = GameOfLife(timer)
     ex.show()
     sys.excepthook = except_hook
     sys.exit(app.exec())
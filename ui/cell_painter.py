@@ -1,41 +1,223 @@
-from PyQt5.QtCore import QRect, QLineF
-from PyQt5.QtGui import QPainter, QBrush, QPen
+import math
+import time
+from importlib.util import find_spec
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple
+
+from PyQt5.QtCore import Qt, QRect, QRectF, QLineF
+from PyQt5.QtGui import QPainter, QPen, QImage, QColor
 from PyQt5.QtWidgets import QWidget
 
 from field.field import Field
 Cell = Field.Cell
 
+# Пирамида плотности тянет за собой NumPy, а нужна только при уменьшении поля - она импортируется при первой
+# необходимости, а не при запуске
+if TYPE_CHECKING:
+    from ui.density_pyramid import DensityPyramid
+
 
 # Рисует поле.
+# Состояние поля выводится картинкой "пиксель на клетку", растянутой без сглаживания. Рисуется только
+# видимая часть поля (при увеличении это малая доля клеток), поэтому стоимость кадра ограничена размером окна,
+# а не поля. Когда клетка на экране меньше пикселя, вместо клеток рисуется уровень пирамиды плотности,
+# в котором на пиксель приходится примерно один квадрат клеток; сетка рисуется, только пока клетки крупные
 class CellPainter(QWidget):
+    # Если за шаг изменилось больше клеток, дешевле перерисовать поле целиком, чем инвалидировать каждую
+    MAX_DIRTY_CELLS = 2000
+    # Сетка рисуется, только если клетка на экране не меньше стольких пикселей
+    GRID_MIN_CELL_SIZE = 4
+    # Наибольшая сторона миникарты в пикселях
+    MINIMAP_SIZE = 120
+    # Пирамида плотности считается на NumPy. Без него поле при любом масштабе рисуется клетками,
+    # а миникарты нет. Проверяется только наличие модуля - сам он при запуске не загружается
+    HAS_DENSITY_PYRAMID = find_spec('numpy') is not None
+
     def __init__(self, parent):
         super().__init__()
 
         self.parent = parent
 
-    def paintEvent(self, event):
+        # Пирамида плотности самого поля (для кадров потока симуляции - своя у каждого кадра).
+        # Правки мышью обновляют её по клеткам, остальные изменения поля сбрасывают
+        self.pyramid: Optional['DensityPyramid'] = None
+        # Палитра плотностей и цвета, для которых она построена
+        self.density_colors: List[int] = []
+        self.density_key: tuple = ()
+
+    def cell_size(self) -> float:
         p = self.parent
-        alives = p.field.get_alives()
-        w, h = self.width(), self.height()
-        sz = min(w // p.field_size_x, h // p.field_size_y)
+        # Размер клетки дробный, чтобы большие поля (больше клеток, чем пикселей) не схлопывались в ноль
+        return min(self.width() / p.field_size_x, self.height() / p.field_size_y)
 
-        qp = QPainter(self)
+    # Размер клетки в пикселях экрана - с учётом масштаба SimulationView
+    def screen_cell_size(self) -> float:
+        return self.cell_size() * self.parent.zoom_x
+
+    # Уровень пирамиды плотности, в котором квадрат клеток занимает на экране не меньше полупикселя.
+    # 0 - клетки не меньше пикселя, пирамида не нужна
+    def get_density_level(self) -> int:
+        size = self.screen_cell_size()
+        return max(0, math.floor(math.log2(1 / size))) if size < 1 and self.HAS_DENSITY_PYRAMID else 0
+
+    # Уровень пирамиды для миникарты - не больше MINIMAP_SIZE квадратов по большей стороне
+    def get_minimap_level(self) -> int:
+        p = self.parent
+        if not self.HAS_DENSITY_PYRAMID:
+            return 0
+        return max(0, math.ceil(math.log2(max(p.field_size_x, p.field_size_y) / self.MINIMAP_SIZE)))
 
-        qp.setBrush(QBrush(p.dead_cell_color))
-        qp.drawRect(self.rect())
-        w, h = self.width(), self.height()
+    # Прямоугольник виджета, который занимает клетка с мировыми координатами (x, y),
+    # с запасом в пиксель на рамку. None, если клетка вне окна
+    def cell_rect(self, x: int, y: int) -> Optional[QRect]:
+        p = self.parent
+        x, y = x - p.view_x, y - p.view_y
+        if not (0 <= x < p.field_size_x and 0 <= y < p.field_size_y):
+            return None
+        sz = self.cell_size()
+        left, top = math.floor(sz * x) - 1, math.floor(sz * y) - 1
+        return QRect(left, top, math.ceil(sz * (x + 1)) + 2 - left, math.ceil(sz * (y + 1)) + 2 - top)
+
+    # Клетки окна, которые задевает прямоугольник виджета: (x0, y0, x1, y1), правая и нижняя границы не включены
+    def visible_cells(self, rect: QRect) -> Tuple[int, int, int, int]:
+        p = self.parent
+        sz = self.cell_size()
+        return (max(0, math.floor(rect.left() / sz)), max(0, math.floor(rect.top() / sz)),
+                min(p.field_size_x, math.ceil((rect.right() + 1) / sz)),
+                min(p.field_size_y, math.ceil((rect.bottom() + 1) / sz)))
+
+    # Инвалидирует только прямоугольники изменившихся клеток (None - всё поле)
+    def update_cells(self, cells: Optional[List[Tuple[int, int]]]) -> None:
+        p = self.parent
+        p._view.update_minimap()
+        if cells is None or len(cells) > self.MAX_DIRTY_CELLS:
+            self.pyramid = None
+            self.update()
+            return
+        # Правка самого поля - пирамида пересчитывается только над изменившимися клетками
+        if p.frame is None and self.pyramid is not None:
+            self.pyramid.update_cells(p.field.get_raster(p.view_x, p.view_y),
+                                      [(x - p.view_x, y - p.view_y) for x, y in cells])
+        for x, y in cells:
+            rect = self.cell_rect(x, y)
+            if rect is not None:
+                self.update(rect)
+
+    # Поле изменил поток симуляции - пирамида поля больше ему не соответствует
+    def invalidate_pyramid(self) -> None:
+        self.pyramid = None
+
+    # Растр окна поля: пока идёт симуляция - последний кадр потока симуляции, иначе - само поле.
+    # Буфер движка используется без копирования, поэтому он должен жить, пока по нему рисуется картинка
+    def get_raster(self) -> Tuple[object, int, int]:
+        p = self.parent
+        if p.frame is not None:
+            return p.frame.raster
+        return p.field.get_raster(p.view_x, p.view_y)
 
-        lines = []
-        for x in range(1, p.field_size_x):
-            lines.append(QLineF(sz * x, 0, sz * x, h))
-        for y in range(1, p.field_size_y):
-            lines.append(QLineF(0, sz * y, w, sz * y))
-        qp.setPen(QPen(p.cell_border_color, 1))
+    # Пирамида плотности того, что сейчас рисуется. Кадр обычно приходит с пирамидой, построенной потоком
+    # симуляции (см. SimulationWorker.density_levels), иначе она строится здесь и запоминается
+    def get_pyramid(self) -> 'DensityPyramid':
+        from ui.density_pyramid import DensityPyramid
+        p = self.parent
+        if p.frame is not None:
+            if p.frame.pyramid is None:
+                p.frame.pyramid = DensityPyramid(p.frame.raster, p.field_size_x, p.field_size_y)
+            return p.frame.pyramid
+        if self.pyramid is None:
+            self.pyramid = DensityPyramid(self.get_raster(), p.field_size_x, p.field_size_y)
+        return self.pyramid
+
+    # Палитра уровня пирамиды: плотность 0..255 - смесь цветов мёртвой и живой клетки
+    def get_density_colors(self) -> List[int]:
+        p = self.parent
+        key = p.dead_cell_color.rgba(), p.alive_cell_color.rgba()
+        if key != self.density_key:
+            dead, alive = p.dead_cell_color, p.alive_cell_color
+            self.density_colors = [
+                QColor(*(round(a + (b - a) * i / 255) for a, b in zip(dead.getRgb(), alive.getRgb()))).rgba()
+                for i in range(256)
+            ]
+            self.density_key = key
+        return self.density_colors
+
+    # Картинка прямоугольника [x0, x1) x [y0, y1) уровня k пирамиды (для уровня 0 - в клетках).
+    # Массив картинки возвращается вместе с ней и должен жить, пока она рисуется
+    def get_level_image(self, pyramid: 'DensityPyramid', k: int,
+                        x0: int, y0: int, x1: int, y1: int) -> Tuple[QImage, Any]:
+        p = self.parent
+        # Копия среза уровня лежит в памяти сплошняком, как нужно QImage
+        pixels = pyramid.get_level(k)[y0:y1, x0:x1].copy()
+        image = QImage(pixels.data, x1 - x0, y1 - y0, pixels.strides[0], QImage.Format_Indexed8)
+        image.setColorTable(self.get_density_colors() if k else
+                            [p.dead_cell_color.rgba(), p.alive_cell_color.rgba()])
+        return image, pixels
+
+    # Картинка окна поля для миникарты и размер квадрата её пикселя в клетках
+    def get_minimap_image(self) -> Tuple[QImage, Any, int]:
+        k = self.get_minimap_level()
+        pyramid = self.get_pyramid()
+        h, w = pyramid.get_level(k).shape
+        image, pixels = self.get_level_image(pyramid, k, 0, 0, w, h)
+        return image, pixels, 1 << k
+
+    # Видимые клетки [x0, x1) x [y0, y1) картинкой "пиксель на клетку".
+    # Копируется только видимая часть растра, и палитра ставится уже копии: смена палитры у картинки
+    # поверх чужого буфера копирует его целиком, а преобразование всей картинки стоило бы как всё поле
+    def draw_cells(self, qp: QPainter, x0: int, y0: int, x1: int, y1: int) -> None:
+        p = self.parent
+        sz = self.cell_size()
+        raster, bits, bytes_per_line = self.get_raster()
+        image_format = QImage.Format_Indexed8 if bits == 8 else QImage.Format_MonoLSB
+        image = QImage(raster, p.field_size_x, p.field_size_y, bytes_per_line, image_format)
+        image = image.copy(x0, y0, x1 - x0, y1 - y0)
+        image.setColorTable([p.dead_cell_color.rgba(), p.alive_cell_color.rgba()])
+        # Без SmoothPixmapTransform картинка растягивается по ближайшему соседу - клетки остаются квадратами
+        qp.drawImage(QRectF(sz * x0, sz * y0, sz * (x1 - x0), sz * (y1 - y0)), image)
+
+    # Видимые клетки уровнем k пирамиды: пиксель картинки - квадрат 2^k x 2^k клеток
+    def draw_density(self, qp: QPainter, k: int, x0: int, y0: int, x1: int, y1: int) -> None:
+        p = self.parent
+        sz = self.cell_size()
+        tx0, ty0, tx1, ty1 = x0 >> k, y0 >> k, ((x1 - 1) >> k) + 1, ((y1 - 1) >> k) + 1
+        image, pixels = self.get_level_image(self.get_pyramid(), k, tx0, ty0, tx1, ty1)
+        # Крайние квадраты могут выходить за поле
+        qp.save()
+        qp.setClipRect(QRectF(0, 0, sz * p.field_size_x, sz * p.field_size_y), Qt.IntersectClip)
+        qp.drawImage(QRectF(sz * (tx0 << k), sz * (ty0 << k), sz * ((tx1 - tx0) << k), sz * ((ty1 - ty0) << k)),
+                     image)
+        qp.restore()
+
+    # Линии сетки вокруг видимых клеток - толщиной в пиксель экрана при любом масштабе
+    def draw_grid(self, qp: QPainter, x0: int, y0: int, x1: int, y1: int) -> None:
+        p = self.parent
+        sz = self.cell_size()
+        lines = [QLineF(sz * x, sz * y0, sz * x, sz * y1) for x in range(max(x0, 1), x1 + 1)]
+        lines += [QLineF(sz * x0, sz * y, sz * x1, sz * y) for y in range(max(y0, 1), y1 + 1)]
+        qp.setPen(QPen(p.cell_border_color, 0))
         qp.drawLines(lines)
 
-        qp.setBrush(QBrush(p.alive_cell_color))
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        p = self.parent
+
+        # Рисование автоматически обрезается по области, которую нужно обновить
+        qp = QPainter(self)
+        qp.fillRect(event.rect(), p.dead_cell_color)
 
-        if alives:
-            for x, y in alives:
-                qp.drawRect(QRect(sz * x, sz * y, sz, sz))
+        x0, y0, x1, y1 = self.visible_cells(event.rect())
+        if x0 < x1 and y0 < y1:
+            k = self.get_density_level()
+            if k:
+                self.draw_density(qp, k, x0, y0, x1, y1)
+            else:
+                self.draw_cells(qp, x0, y0, x1, y1)
+            if self.screen_cell_size() >= self.GRID_MIN_CELL_SIZE:
+                self.draw_grid(qp, x0, y0, x1, y1)
+        qp.setPen(Qt.black)
+        qp.drawRect(QRect(0, 0, self.width() - 1, self.height() - 1))
+        qp.end()
 
+        if p.monitor is not None:
+            p.monitor.add_timing('paint', time.perf_counter() - start)
+        if p.startup_timer is not None:
+            p.finish_startup()
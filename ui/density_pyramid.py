@@ -0,0 +1,65 @@
+from typing import Any, Iterable, List, Tuple
+
+import numpy as np
+
+# Плотность квадрата 2x2 клеток с 0..4 живыми в масштабе 0..255
+COUNT_DENSITIES = np.array([(n * 255 + 2) // 4 for n in range(5)], dtype=np.uint8)
+
+
+# Растр окна поля (см. Field.get_raster) в виде массива h x w из нулей и единиц.
+# Растр по байту на клетку не копируется
+def raster_to_board(raster: Tuple[Any, int, int], w: int, h: int) -> np.ndarray:
+    data, bits, bytes_per_line = raster
+    rows = np.frombuffer(data, dtype=np.uint8, count=bytes_per_line * h).reshape(h, bytes_per_line)
+    if bits == 1:
+        rows = np.unpackbits(rows, axis=1, bitorder='little')
+    return rows[:, :w]
+
+
+# Четыре четверти квадратов 2x2 уровня; у нечётной стороны недостающие клетки считаются мёртвыми
+def get_quarters(level: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    h, w = level.shape
+    if h % 2 or w % 2:
+        level = np.pad(level, ((0, h % 2), (0, w % 2)))
+    return level[0::2, 0::2], level[0::2, 1::2], level[1::2, 0::2], level[1::2, 1::2]
+
+
+# Пирамида плотности (mipmap) окна поля: уровень k - доля живых клеток в квадратах 2^k x 2^k
+# (0 - все мертвы, 255 - все живы), уровень 0 - сами клетки (0 и 1). Уровни строятся по требованию,
+# каждый из предыдущего, поэтому вся пирамида стоит немногим больше одного прохода по полю.
+# По ней поле рисуется мельче пикселя на клетку: одинокая клетка не пропадает, а даёт бледный пиксель
+class DensityPyramid:
+    def __init__(self, raster: Tuple[Any, int, int], w: int, h: int) -> None:
+        self.size = w, h
+        self.levels: List[np.ndarray] = [raster_to_board(raster, w, h)]
+
+    def get_level(self, k: int) -> np.ndarray:
+        while len(self.levels) <= k:
+            a, b, c, d = get_quarters(self.levels[-1])
+            if len(self.levels) == 1:
+                # Сумма четырёх клеток не больше 4 - помещается в байт
+                level = COUNT_DENSITIES[a + b + c + d]
+            else:
+                level = ((a.astype(np.uint16) + b + c + d + 2) >> 2).astype(np.uint8)
+            self.levels.append(level)
+        return self.levels[k]
+
+    # Клетки cells (в координатах окна) поменялись в растре raster - пересчитываются только уровни над ними
+    def update_cells(self, raster: Tuple[Any, int, int], cells: Iterable[Tuple[int, int]]) -> None:
+        w, h = self.size
+        data, bits, bytes_per_line = raster
+        dirty = {(x, y) for x, y in cells if 0 <= x < w and 0 <= y < h}
+        if bits == 8:
+            # Новый растр может быть другим буфером - уровень 0 снова ссылается на него
+            self.levels[0] = raster_to_board(raster, w, h)
+        else:
+            board, packed = self.levels[0], memoryview(data).cast('B')
+            for x, y in dirty:
+                board[y, x] = packed[y * bytes_per_line + x // 8] >> x % 8 & 1
+
+        for k in range(1, len(self.levels)):
+            below, level = self.levels[k - 1], self.levels[k]
+            dirty = {(x >> 1, y >> 1) for x, y in dirty}
+            for x, y in dirty:
+                total = int(below[2 * y:2 * y + 2, 2 * x:2 * x + 2].sum())
+                level[y, x] = COUNT_DENSITIES[total] if k == 1 else (total + 2) >> 2
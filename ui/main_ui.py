@@ -2,7 +2,8 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 
 from ui.cell_painter import CellPainter
 from ui.simulation_view import SimulationView
-from ui.settings_widgets import SliderSettingWidget, ColorSettingWidget
+from ui.settings_widgets import SliderSettingWidget, ColorSettingWidget, CheckBoxSettingWidget, ComboBoxSettingWidget
+from field.rule import NAMED_RULES
 
 # Импорт иконки приложения
 from resources import resources
@@ -14,6 +15,7 @@ class UIForm(object):
         self._painter: CellPainter = ...
         self.loop_simulation_btn: QtWidgets.QPushButton = ...
         self.step_simulation_btn: QtWidgets.QPushButton = ...
+        self.step_back_simulation_btn: QtWidgets.QPushButton = ...
         self.reset_simulation_btn: QtWidgets.QPushButton = ...
 
     def setup_ui(self, form):
@@ -24,8 +26,37 @@ class UIForm(object):
         filemenu = QtWidgets.QMenu('File', self.menubar)
         filemenu.addAction('Open', form.open_save_file)
         filemenu.addAction('Save', form.create_save_file)
+        filemenu.addSeparator()
+        filemenu.addAction('Import pattern', form.import_pattern_file)
+        filemenu.addAction('Export pattern', form.export_pattern_file)
         self.menubar.addMenu(filemenu)
 
+        editmenu = QtWidgets.QMenu('Edit', self.menubar)
+        editmenu.addAction('Undo', form.undo, QtGui.QKeySequence.Undo)
+        editmenu.addAction('Redo', form.redo, QtGui.QKeySequence.Redo)
+        editmenu.addAction('Step back', form.step_back_simulation, QtGui.QKeySequence('Ctrl+B'))
+        editmenu.addSeparator()
+        editmenu.addAction('Paste pattern...', form.paste_pattern_file)
+        editmenu.addAction('Random soup...', form.fill_random_soup)
+        self.menubar.addMenu(editmenu)
+
+        # Что делать, когда поле при запуске начинает повторяться
+        simulationmenu = QtWidgets.QMenu('Simulation', self.menubar)
+        self.pause_on_cycle_action = simulationmenu.addAction('Pause on cycle')
+        self.pause_on_cycle_action.setCheckable(True)
+        self.pause_on_cycle_action.setChecked(self.settingsfh.get_setting('pause_on_cycle'))
+        self.skip_cycles_action = simulationmenu.addAction('Fast-forward cycles')
+        self.skip_cycles_action.setCheckable(True)
+        self.skip_cycles_action.setChecked(self.settingsfh.get_setting('skip_cycles'))
+        simulationmenu.addSeparator()
+        # Замеры производительности: поверх поля и потоком в файл
+        self.perf_overlay_action = simulationmenu.addAction('Performance overlay')
+        self.perf_overlay_action.setCheckable(True)
+        self.perf_overlay_action.setChecked(self.settingsfh.get_setting('perf_overlay'))
+        self.export_metrics_action = simulationmenu.addAction('Export metrics...')
+        self.export_metrics_action.setCheckable(True)
+        self.menubar.addMenu(simulationmenu)
+
         main_widget = QtWidgets.QWidget(form)
         main_widget.setLayout(QtWidgets.QHBoxLayout())
         main_widget.layout().setContentsMargins(9, 9, 9, 9)
@@ -36,6 +67,13 @@ class UIForm(object):
         settings_group.setSizePolicy(QtWidgets.QSizePolicy.Maximum, QtWidgets.QSizePolicy.Expanding)
         settings_group.setContentsMargins(0, 0, 0, 0)
 
+        # Правило: известное из списка или своё в записи B/S
+        self.rule_setting = ComboBoxSettingWidget(settings_group, setting_name='Rule', editable=True)
+        for name, rulestring in NAMED_RULES:
+            self.rule_setting.addItem(f'{name} ({rulestring})', rulestring)
+        self.rule_setting.setValue(self.settingsfh.get_setting('rule'))
+        self.rule_setting.construct()
+
         self.simulation_update_delay_setting = SliderSettingWidget(settings_group,
                                                                    setting_name='Simulation update delay')
         self.simulation_update_delay_setting.setRange(10, 500)
@@ -47,6 +85,50 @@ class UIForm(object):
         self.simulation_update_delay_setting.setSliderInvertedAppearance(True)
         self.simulation_update_delay_setting.construct()
 
+        # Сколько поколений считается между кадрами (турбо-режим)
+        self.generations_per_step_setting = SliderSettingWidget(settings_group, setting_name='Generations per frame')
+        self.generations_per_step_setting.setRange(1, 100)
+        self.generations_per_step_setting.setPageStep(10)
+        self.generations_per_step_setting.setSingleStep(1)
+        self.generations_per_step_setting.setValue(self.settingsfh.get_setting('generations_per_step'))
+        self.generations_per_step_setting.setSettingValueDisplayFormat('{:.0f}')
+        self.generations_per_step_setting.setSliderOrientation(QtCore.Qt.Horizontal)
+        self.generations_per_step_setting.construct()
+
+        self.auto_generations_setting = CheckBoxSettingWidget(settings_group, setting_name='Turbo',
+                                                              text='Auto (fill the frame budget)')
+        self.auto_generations_setting.setValue(self.settingsfh.get_setting('auto_generations'))
+        self.auto_generations_setting.construct()
+        self.generations_per_step_setting.setEnabled(not self.auto_generations_setting.value())
+
+        self.record_history_setting = CheckBoxSettingWidget(settings_group, setting_name='History',
+                                                            text='Record generations')
+        # История хранит только окно поля, а у неограниченных движков клетки уходят за него - запись недоступна
+        self.record_history_setting.setValue(self.settingsfh.get_setting('record_history') and self.field.BOUNDED)
+        self.record_history_setting.construct()
+        if not self.field.BOUNDED:
+            self.record_history_setting.setEnabled(False)
+            self.record_history_setting.setToolTip('History is not available for unbounded field engines')
+
+        # Сколько поколений откатывает кнопка Back
+        self.step_back_generations_setting = SliderSettingWidget(settings_group, setting_name='Step back generations')
+        self.step_back_generations_setting.setRange(1, 1000)
+        self.step_back_generations_setting.setPageStep(10)
+        self.step_back_generations_setting.setSingleStep(1)
+        self.step_back_generations_setting.setValue(self.settingsfh.get_setting('step_back_generations'))
+        self.step_back_generations_setting.setSettingValueDisplayFormat('{:.0f}')
+        self.step_back_generations_setting.setSliderOrientation(QtCore.Qt.Horizontal)
+        self.step_back_generations_setting.construct()
+
+        self.undo_memory_limit_setting = SliderSettingWidget(settings_group, setting_name='Undo memory limit (MB)')
+        self.undo_memory_limit_setting.setRange(16, 1024)
+        self.undo_memory_limit_setting.setPageStep(64)
+        self.undo_memory_limit_setting.setSingleStep(16)
+        self.undo_memory_limit_setting.setValue(self.settingsfh.get_setting('undo_memory_limit'))
+        self.undo_memory_limit_setting.setSettingValueDisplayFormat('{:.0f}')
+        self.undo_memory_limit_setting.setSliderOrientation(QtCore.Qt.Horizontal)
+        self.undo_memory_limit_setting.construct()
+
         self.alive_cell_color_setting = ColorSettingWidget(settings_group, setting_name='Alive cells color',
                                                            default_color=QtGui.QColor(255, 255, 255, 255))
         self.alive_cell_color_setting.construct()
@@ -59,7 +141,13 @@ class UIForm(object):
                                                             default_color=QtGui.QColor(50, 50, 50, 255))
         self.field_grid_color_setting.construct()
 
+        settings_group.layout().addWidget(self.rule_setting)
         settings_group.layout().addWidget(self.simulation_update_delay_setting)
+        settings_group.layout().addWidget(self.generations_per_step_setting)
+        settings_group.layout().addWidget(self.auto_generations_setting)
+        settings_group.layout().addWidget(self.record_history_setting)
+        settings_group.layout().addWidget(self.step_back_generations_setting)
+        settings_group.layout().addWidget(self.undo_memory_limit_setting)
         settings_group.layout().addWidget(self.alive_cell_color_setting)
         settings_group.layout().addWidget(self.dead_cell_color_setting)
         settings_group.layout().addWidget(self.field_grid_color_setting)
@@ -67,6 +155,10 @@ class UIForm(object):
         spacer_item = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
         settings_group.layout().addItem(spacer_item)
 
+        # Номер поколения и скорость симуляции
+        self.simulation_stats_label = QtWidgets.QLabel(settings_group)
+        settings_group.layout().addWidget(self.simulation_stats_label)
+
         # Зона симуляции
         simulation_widget = QtWidgets.QWidget(form)
         simulation_widget.setLayout(QtWidgets.QVBoxLayout())
@@ -80,6 +172,7 @@ class UIForm(object):
         self._painter.setFixedSize(*form.SIMULATION_WINDOW_SIZE)
 
         scene.addWidget(self._painter)
+        self._view.cell_painter = self._painter
         self._view.setFixedSize(self._view.sizeHint())
         self._painter.setMouseTracking(True)
 
@@ -96,15 +189,25 @@ class UIForm(object):
         self.step_simulation_btn = QtWidgets.QPushButton('Step')
         self.step_simulation_btn.setFixedSize(50, 50)
 
+        self.step_back_simulation_btn = QtWidgets.QPushButton('Back')
+        self.step_back_simulation_btn.setFixedSize(50, 50)
+
         self.reset_simulation_btn = QtWidgets.QPushButton('Reset')
         self.reset_simulation_btn.setFixedSize(50, 50)
 
+        # Перемотка по записанной истории поколений
+        self.history_slider = QtWidgets.QSlider(QtCore.Qt.Horizontal, form)
+        self.history_slider.setRange(0, 0)
+        self.history_slider.setEnabled(False)
+
         # Расстановка виджетов
+        btns_holder.layout().addWidget(self.step_back_simulation_btn)
         btns_holder.layout().addWidget(self.loop_simulation_btn)
         btns_holder.layout().addWidget(self.step_simulation_btn)
         btns_holder.layout().addWidget(self.reset_simulation_btn)
 
         simulation_widget.layout().addWidget(self._view)
+        simulation_widget.layout().addWidget(self.history_slider)
         simulation_widget.layout().addWidget(btns_holder)
 
         main_widget.layout().addWidget(settings_group)
@@ -112,4 +215,4 @@ class UIForm(object):
 
         form.setCentralWidget(main_widget)
         form.setMenuBar(self.menubar)
-        form.setFixedSize(810, 725)
+        form.setFixedSize(960, 960)
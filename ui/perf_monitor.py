@@ -0,0 +1,122 @@
+import time
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from file_handlers.metrics_file_handler import Sample
+
+
+# Замеры производительности: сколько длятся шаг симуляции, отрисовка поля, обработка кадра и работа с файлами.
+# Время копится между выборками, выборка (sample) отдаёт средние за прошедший интервал и начинает новый.
+# Шаги замеряет поток симуляции, всё остальное - интерфейс, поэтому накопители защищены lock.
+# Пока монитор не создан, замеры не ведутся вовсе
+class PerfMonitor:
+    FIELDS = ('time', 'generation', 'population', 'generations_per_sec', 'target_generations_per_sec',
+              'step_ms', 'paint_ms', 'frame_ms', 'io_ms', 'fps', 'dropped_ticks')
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.sample_time = self.start_time
+        self.sample_generation: Optional[int] = None
+        # Имя замера -> [суммарное время (с), число замеров]
+        self.timings: Dict[str, list] = {}
+        self.step_generations = 0
+        self.dropped_ticks = 0
+        self.population: Optional[int] = None
+
+    def add_timing(self, name: str, elapsed: float) -> None:
+        with self.lock:
+            timing = self.timings.setdefault(name, [0.0, 0])
+            timing[0] += elapsed
+            timing[1] += 1
+
+    # Шаг потока симуляции сразу на generations поколений - время считается на поколение
+    def add_step(self, generations: int, elapsed: float) -> None:
+        with self.lock:
+            timing = self.timings.setdefault('step', [0.0, 0])
+            timing[0] += elapsed
+            self.step_generations += generations
+
+    # Поток не успел сделать шаг вовремя и пропустил ticks шагов по расписанию
+    def add_dropped_ticks(self, ticks: int) -> None:
+        with self.lock:
+            self.dropped_ticks += ticks
+
+    def set_population(self, population: int) -> None:
+        self.population = population
+
+    # Средние за интервал с прошлой выборки. target - заданная скорость (поколений в секунду, None - не задана)
+    def sample(self, generation: int, target: Optional[float]) -> 'Sample':
+        now = time.perf_counter()
+        with self.lock:
+            timings, self.timings = self.timings, {}
+            step_generations, self.step_generations = self.step_generations, 0
+            dropped_ticks, self.dropped_ticks = self.dropped_ticks, 0
+
+        elapsed = now - self.sample_time
+        previous = generation if self.sample_generation is None else self.sample_generation
+        self.sample_time, self.sample_generation = now, generation
+
+        def average_ms(name: str, count: Optional[int] = None) -> Optional[float]:
+            total, n = timings.get(name, (0.0, 0))
+            n = n if count is None else count
+            return total / n * 1000 if n else None
+
+        return {
+            'time': round(now - self.start_time, 3),
+            'generation': generation,
+            'population': self.population,
+            'generations_per_sec': (generation - previous) / elapsed if elapsed > 0 else 0.0,
+            'target_generations_per_sec': target,
+            'step_ms': average_ms('step', step_generations),
+            'paint_ms': average_ms('paint'),
+            'frame_ms': average_ms('frame'),
+            'io_ms': average_ms('io'),
+            'fps': timings.get('paint', (0.0, 0))[1] / elapsed if elapsed > 0 else 0.0,
+            'dropped_ticks': dropped_ticks,
+        }
+
+    # Текст для наложения поверх поля
+    @staticmethod
+    def format_sample(sample: 'Sample') -> str:
+        def ms(value: Optional[float]) -> str:
+            return '-' if value is None else f'{value:.2f} ms'
+
+        target = sample['target_generations_per_sec']
+        lines = [
+            f'step  {ms(sample["step_ms"])}/gen',
+            f'paint {ms(sample["paint_ms"])}, {sample["fps"]:.0f} fps',
+            f'frame {ms(sample["frame_ms"])}',
+            f'gen/s {sample["generations_per_sec"]:.1f} / {"auto" if target is None else f"{target:.1f}"}',
+            f'dropped ticks {sample["dropped_ticks"]}',
+            f'population {"-" if sample["population"] is None else sample["population"]}',
+        ]
+        if sample['io_ms'] is not None:
+            lines.append(f'file I/O {ms(sample["io_ms"])}')
+        return '\n'.join(lines)
+
+
+# Замеры запуска программы: сколько заняли импорты, настройки, поле, интерфейс и время до первого кадра.
+# Отметки ставятся по ходу запуска, каждая считается от предыдущей. report - выводить ли их (флаг --startup-timing)
+class StartupTimer:
+    def __init__(self, start: Optional[float] = None, report: bool = False) -> None:
+        self.start = time.perf_counter() if start is None else start
+        self.report = report
+        self.marks: List[Tuple[str, float]] = []
+
+    def mark(self, name: str) -> None:
+        self.marks.append((name, time.perf_counter()))
+
+    # Время от начала до последней отметки (с)
+    def get_total(self) -> float:
+        return self.marks[-1][1] - self.start if self.marks else 0.0
+
+    def format(self) -> str:
+        lines = []
+        previous = self.start
+        for name, t in self.marks:
+            lines.append(f'{name:<12} {(t - previous) * 1000:8.1f} ms')
+            previous = t
+        lines.append(f'{"total":<12} {self.get_total() * 1000:8.1f} ms')
+        return '\n'.join(lines)
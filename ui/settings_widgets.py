@@ -29,8 +29,10 @@ class SliderSettingWidget(SettingWidget):
 
         self.setting_value_slider = QtWidgets.QSlider(self.setting_value)
         self.setting_value_display_multiplier = 1
+        self.setting_value_display_format = '{:.2f}'
         self.setting_value_label = QtWidgets.QLabel(
-            f'{self.value() * self.setting_value_display_multiplier:.2f}', self.setting_value
+            self.setting_value_display_format.format(self.value() * self.setting_value_display_multiplier),
+            self.setting_value
         )
 
         self.setting_value_slider.valueChanged.connect(self.setting_value_changed)
@@ -47,6 +49,10 @@ class SliderSettingWidget(SettingWidget):
         self.setting_value_display_multiplier = mult
         self.update_value_label()
 
+    def setSettingValueDisplayFormat(self, fmt: str):
+        self.setting_value_display_format = fmt
+        self.update_value_label()
+
     def setRange(self, start: int, end: int):
         self.setting_value_slider.setRange(start, end)
 
@@ -74,7 +80,81 @@ class SliderSettingWidget(SettingWidget):
         return self.setting_value_slider.value()
 
     def update_value_label(self):
-        self.setting_value_label.setText(f'{self.value() * self.setting_value_display_multiplier:.2f}')
+        self.setting_value_label.setText(
+            self.setting_value_display_format.format(self.value() * self.setting_value_display_multiplier)
+        )
+
+
+class CheckBoxSettingWidget(SettingWidget):
+    def __init__(self, *args, text: str = '', **kwargs):
+        super(CheckBoxSettingWidget, self).__init__(*args, **kwargs)
+
+        self.setting_value.setLayout(QtWidgets.QHBoxLayout())
+        self.setting_value.setContentsMargins(0, 0, 0, 0)
+
+        self.setting_value_checkbox = QtWidgets.QCheckBox(text, self.setting_value)
+
+        self.setting_value_checkbox.toggled.connect(self.setting_value_changed)
+
+    def construct(self):
+        self.setting_value.layout().addWidget(self.setting_value_checkbox)
+
+        super(CheckBoxSettingWidget, self).construct()
+
+    def setValue(self, value: bool):
+        self.setting_value_checkbox.setChecked(value)
+
+    @QtCore.pyqtSlot(bool)
+    def setting_value_changed(self):
+        self.settingValueChanged.emit(self)
+
+    def value(self):
+        return self.setting_value_checkbox.isChecked()
+
+
+# Выпадающий список: у пункта есть подпись и значение. В редактируемый список можно ввести
+# своё значение - оно принимается по Enter или при потере фокуса
+class ComboBoxSettingWidget(SettingWidget):
+    def __init__(self, *args, editable: bool = False, **kwargs):
+        super(ComboBoxSettingWidget, self).__init__(*args, **kwargs)
+
+        self.setting_value.setLayout(QtWidgets.QHBoxLayout())
+        self.setting_value.setContentsMargins(0, 0, 0, 0)
+
+        self.setting_value_combobox = QtWidgets.QComboBox(self.setting_value)
+        self.setting_value_combobox.setEditable(editable)
+        self.setting_value_combobox.setInsertPolicy(QtWidgets.QComboBox.NoInsert)
+        # Ширина не растёт под самый длинный пункт, чтобы не раздвигать панель настроек
+        self.setting_value_combobox.setSizeAdjustPolicy(QtWidgets.QComboBox.AdjustToMinimumContentsLengthWithIcon)
+        self.setting_value_combobox.setMinimumContentsLength(16)
+
+        self.setting_value_combobox.activated.connect(self.setting_value_changed)
+        if editable:
+            self.setting_value_combobox.lineEdit().editingFinished.connect(self.setting_value_changed)
+
+    def construct(self):
+        self.setting_value.layout().addWidget(self.setting_value_combobox)
+
+        super(ComboBoxSettingWidget, self).construct()
+
+    def addItem(self, text: str, value: str):
+        self.setting_value_combobox.addItem(text, value)
+
+    def setValue(self, value: str):
+        i = self.setting_value_combobox.findData(value)
+        if i != -1:
+            self.setting_value_combobox.setCurrentIndex(i)
+        else:
+            self.setting_value_combobox.setEditText(value)
+
+    @QtCore.pyqtSlot()
+    def setting_value_changed(self):
+        self.settingValueChanged.emit(self)
+
+    def value(self):
+        text = self.setting_value_combobox.currentText()
+        i = self.setting_value_combobox.findText(text)
+        return self.setting_value_combobox.itemData(i) if i != -1 else text.strip()
 
 
 class ColorSettingWidget(SettingWidget):
@@ -1,8 +1,106 @@
+from typing import Optional
+
+from PyQt5.QtCore import Qt, QRect, QRectF
+from PyQt5.QtGui import QColor, QFont, QFontMetrics
 from PyQt5.QtWidgets import QGraphicsView
 
+from ui.cell_painter import CellPainter
+
 
-# Данный класс нужен только для отслеживания ивентов мыши на поле и их передачи в основной класс
+# Данный класс нужен только для отслеживания ивентов мыши на поле и их передачи в основной класс.
+# Поверх поля он может выводить текст (замеры производительности) и, пока поле увеличено, миникарту
+# всего поля с рамкой видимой части - в координатах окна, без масштабирования
 class SimulationView(QGraphicsView):
+    OVERLAY_MARGIN = 4
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.overlay_text: Optional[str] = None
+        self.overlay_font = QFont('monospace', 8)
+        self.overlay_font.setStyleHint(QFont.TypeWriter)
+        self.cell_painter: Optional[CellPainter] = None
+
+    def overlay_rect(self) -> QRect:
+        if not self.overlay_text:
+            return QRect()
+        m = self.OVERLAY_MARGIN
+        size = QFontMetrics(self.overlay_font).size(0, self.overlay_text)
+        return QRect(m, m, size.width() + 2 * m, size.height() + 2 * m)
+
+    # Перерисовывается только область текста (старого и нового), а не всё поле
+    def set_overlay_text(self, text: Optional[str]) -> None:
+        old = self.overlay_rect()
+        self.overlay_text = text
+        self.viewport().update(old.united(self.overlay_rect()))
+
+    # Миникарта нужна, только когда видна не вся сцена (и есть пирамида плотности, по которой она рисуется)
+    def minimap_rect(self) -> QRect:
+        p = self.cell_painter
+        if p is None or not p.HAS_DENSITY_PYRAMID or self.transform().m11() <= 1:
+            return QRect()
+        field_w, field_h = p.parent.field_size_x, p.parent.field_size_y
+        scale = p.MINIMAP_SIZE / max(field_w, field_h)
+        w, h = max(1, round(field_w * scale)), max(1, round(field_h * scale))
+        m = self.OVERLAY_MARGIN
+        viewport = self.viewport().rect()
+        return QRect(viewport.right() - m - w, viewport.bottom() - m - h, w, h)
+
+    # Поле изменилось - перерисовывается и миникарта
+    def update_minimap(self) -> None:
+        rect = self.minimap_rect()
+        if not rect.isNull():
+            self.viewport().update(rect.adjusted(-1, -1, 1, 1))
+
+    def draw_minimap(self, painter) -> None:
+        rect = self.minimap_rect()
+        if rect.isNull():
+            return
+        p = self.cell_painter
+        image, pixels, cells_per_pixel = p.get_minimap_image()
+        scale = rect.width() / p.parent.field_size_x
+        painter.save()
+        painter.setClipRect(rect)
+        painter.drawImage(QRectF(rect.left(), rect.top(), image.width() * cells_per_pixel * scale,
+                                 image.height() * cells_per_pixel * scale), image)
+        painter.setClipping(False)
+
+        # Рамка видимой части: прямоугольник окна в координатах CellPainter, переведённый в клетки.
+        # При сильном увеличении она не меньше нескольких пикселей, чтобы оставаться заметной
+        sz = p.cell_size()
+        visible = p.graphicsProxyWidget().mapFromScene(self.mapToScene(self.viewport().rect())).boundingRect()
+        frame = QRectF(rect.left() + visible.left() / sz * scale, rect.top() + visible.top() / sz * scale,
+                       visible.width() / sz * scale, visible.height() / sz * scale)
+        w, h = max(3.0, frame.width()), max(3.0, frame.height())
+        frame = QRectF(frame.center().x() - w / 2, frame.center().y() - h / 2, w, h)
+        painter.setPen(QColor(255, 0, 0))
+        painter.drawRect(frame.intersected(QRectF(rect).adjusted(0, 0, -1, -1)))
+        painter.setPen(Qt.gray)
+        painter.drawRect(rect.adjusted(-1, -1, 0, 0))
+        painter.restore()
+
+    # Текст и миникарта привязаны к окну - при прокрутке их нужно перерисовать на месте, а не сдвинуть
+    def scrollContentsBy(self, dx: int, dy: int) -> None:
+        super().scrollContentsBy(dx, dy)
+        if self.overlay_text or not self.minimap_rect().isNull():
+            self.viewport().update()
+
+    def drawForeground(self, painter, rect: QRectF) -> None:
+        painter.save()
+        painter.resetTransform()
+        self.draw_minimap(painter)
+        painter.restore()
+        if not self.overlay_text:
+            return
+        painter.save()
+        painter.resetTransform()
+        overlay = self.overlay_rect()
+        painter.fillRect(overlay, QColor(0, 0, 0, 160))
+        painter.setPen(Qt.white)
+        painter.setFont(self.overlay_font)
+        m = self.OVERLAY_MARGIN
+        painter.drawText(overlay.adjusted(m, m, -m, -m), 0, self.overlay_text)
+        painter.restore()
+
     def mousePressEvent(self, event):
         self.parent().mousePressEvent(event)
 
@@ -10,4 +108,4 @@ class SimulationView(QGraphicsView):
         self.parent().mouseReleaseEvent(event)
 
     def mouseMoveEvent(self, event):
-        self.parent().mouseMoveEvent(event)
\ No newline at end of file
+        self.parent().mouseMoveEvent(event)
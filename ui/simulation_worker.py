@@ -0,0 +1,292 @@
+import time
+import threading
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from PyQt5 import QtCore
+
+from field.field import Field
+from field.cycle_detector import CycleDetector
+from ui.perf_monitor import PerfMonitor
+
+# Пирамида плотности (и NumPy за ней) импортируется, только когда кадрам она нужна (см. density_levels),
+# обработчик истории - только когда включена запись
+if TYPE_CHECKING:
+    from ui.density_pyramid import DensityPyramid
+    from file_handlers.history_file_handler import HistoryFileHandler
+
+
+# Готовое к отрисовке поколение: копия растра окна поля (см. Field.get_raster)
+class Frame:
+    def __init__(self, raster: Tuple[bytes, int, int], generation: int,
+                 changes: Optional[List[Tuple[int, int]]], idle: bool,
+                 cycle: Optional[Tuple[int, int]] = None) -> None:
+        self.raster = raster
+        self.generation = generation
+        # Изменившиеся клетки, если кадр отстаёт от предыдущего ровно на одно поколение, иначе None
+        self.changes = changes
+        # Поток остановился после этого кадра - дальше поле можно рисовать и править напрямую
+        self.idle = idle
+        # Найденный при запуске цикл: (поколение начала, период)
+        self.cycle = cycle
+        # Пирамида плотности растра (см. SimulationWorker.density_levels)
+        self.pyramid: Optional['DensityPyramid'] = None
+
+
+# Поток симуляции. Считает поколения, пока интерфейс занят своими делами, и публикует кадры
+# не чаще, чем раз в frame_delay. Интерфейс забирает только последний кадр, промежуточные пропадают.
+# Состояние управления защищено condition, само поле - lock (его держит поток на время шага)
+class SimulationWorker(QtCore.QThread):
+    # Предел числа поколений за шаг в автоматическом режиме
+    MAX_AUTO_GENERATIONS = 1 << 20
+
+    frameReady = QtCore.pyqtSignal()
+
+    def __init__(self, field: Field, parent: Optional[QtCore.QObject] = None) -> None:
+        super().__init__(parent)
+
+        self.field = field
+        self.lock = threading.Lock()
+        self.condition = threading.Condition()
+
+        # Паузы между поколениями и между кадрами (в секундах) - задаются независимо
+        self.step_delay = .05
+        self.frame_delay = .016
+        self.generations_per_step = 1
+        # Сколько поколений из очереди шагов считается за раз (подбирается так же, как в автоматическом режиме)
+        self.queued_generations = 1
+        # Автоматический режим: шаги идут без пауз, а число поколений за шаг подбирается так,
+        # чтобы шаг укладывался в frame_delay
+        self.auto_generations = False
+        # Наибольшее число изменившихся клеток, которое передаётся в кадре
+        self.max_changes: Optional[int] = None
+        # Мировые координаты окна, которое попадёт в кадр
+        self.view = 0, 0
+        # Сколько уровней пирамиды плотности строить для кадра (0 - не строить): их просит интерфейс,
+        # когда рисует поле мельче пикселя на клетку или миникарту, чтобы не считать их сам
+        self.density_levels = 0
+        # Поиск циклов при запуске: остановиться, найдя цикл, или пропускать его -
+        # считать только остаток от деления числа поколений на период
+        self.detector = CycleDetector()
+        self.pause_on_cycle = False
+        self.skip_cycles = True
+        # Запись истории: пока она включена, поколения считаются по одному и каждое записывается.
+        # Меняется только под lock
+        self.recorder: Optional['HistoryFileHandler'] = None
+        # Замеры производительности (None - не ведутся)
+        self.monitor: Optional[PerfMonitor] = None
+
+        self.running = False
+        self.stopping = False
+        # Очередь поколений, заказанных шагами (и досчётом после перемотки назад)
+        self.pending_steps = 0
+        # Текущая работа взята из очереди шагов
+        self.stepping = False
+        # Поле менялось в обход запуска (правка, шаг, перемотка) - поиск циклов начинается заново
+        self.restart_detection = True
+        self.work_restart_detection = False
+        self.flush = False
+        # Перезаписать текущее поколение в историю (после правки поля)
+        self.record_requested = False
+        self.next_step = 0.0
+        # Поле, которое сейчас считает поток, - его нельзя закрывать до конца шага
+        self.busy_field: Optional[Field] = None
+
+        self.frame: Optional[Frame] = None
+        self.generation = 0
+        # Растёт при замене поля и перемотке: результат шага, начатого до этого, отбрасывается
+        self.revision = 0
+        self.work_revision = 0
+        self.unpublished = 0
+        self.last_frame_time = 0.0
+
+    def set_running(self, running: bool) -> None:
+        with self.condition:
+            self.running = running
+            self.restart_detection = self.restart_detection or running
+            # Кадр остановленного потока, ещё не забранный интерфейсом, после запуска уже не нужен
+            if running:
+                self.frame = None
+            self.next_step = time.perf_counter()
+            # После остановки интерфейс получит последний кадр, даже если его не успели опубликовать
+            self.flush = not running
+            self.condition.notify()
+
+    def request_record(self) -> None:
+        with self.condition:
+            self.record_requested = True
+            self.condition.notify()
+
+    def request_step(self, generations: int = 1) -> None:
+        with self.condition:
+            self.pending_steps += generations
+            self.restart_detection = True
+            self.condition.notify()
+
+    # Замена поля (сброс). Старое поле закрывается сразу или, если поток его ещё считает, после шага
+    def set_field(self, field: Field, generation: int = 0) -> None:
+        with self.condition:
+            old, self.field = self.field, field
+            self.running = False
+            self.pending_steps = 0
+            self.flush = False
+            self.frame = None
+            self.generation, self.unpublished = generation, 0
+            self.revision += 1
+            self.restart_detection = True
+            close_now = old is not self.busy_field
+        if close_now:
+            old.close()
+
+    # Переход к другому поколению того же поля (перемотка, отмена). Заказанные шаги отменяются
+    def set_generation(self, generation: int) -> None:
+        with self.condition:
+            self.pending_steps = 0
+            self.frame = None
+            self.generation, self.unpublished = generation, 0
+            self.revision += 1
+            self.restart_detection = True
+
+    # Подстройка числа поколений за шаг под бюджет кадра: рост не больше чем вдвое за раз, уменьшение сразу
+    def tune_generations(self, k: int, elapsed: float) -> int:
+        ratio = self.frame_delay / elapsed if elapsed > 0 else 2
+        k = int(k * min(ratio, 2)) or 1
+        return min(k, self.MAX_AUTO_GENERATIONS)
+
+    def take_frame(self) -> Optional[Frame]:
+        with self.condition:
+            frame, self.frame = self.frame, None
+        return frame
+
+    def stop(self) -> None:
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.wait()
+
+    # Ждёт работы: возвращает поле, число поколений (0 - только опубликовать кадр), номер текущего поколения
+    # и нужно ли записать его в историю. None при остановке
+    def wait_for_work(self) -> Optional[Tuple[Field, int, int, bool]]:
+        with self.condition:
+            while not self.stopping:
+                generations = None
+                self.stepping = False
+                self.work_restart_detection = False
+                record, self.record_requested = self.record_requested, False
+                if record:
+                    generations = 0
+                elif self.pending_steps:
+                    generations = min(self.pending_steps, self.queued_generations)
+                    self.pending_steps -= generations
+                    self.stepping = True
+                elif self.running:
+                    timeout = self.next_step - time.perf_counter()
+                    if timeout > 0:
+                        self.condition.wait(timeout)
+                        continue
+                    # Шаг запоздал больше чем на паузу между шагами - пропущенные по расписанию шаги
+                    if self.monitor is not None and not self.auto_generations and self.step_delay > 0:
+                        self.monitor.add_dropped_ticks(int(-timeout / self.step_delay))
+                    self.next_step = time.perf_counter() + (0 if self.auto_generations else self.step_delay)
+                    generations = self.generations_per_step
+                    self.work_restart_detection, self.restart_detection = self.restart_detection, False
+                elif self.flush or self.unpublished:
+                    self.flush = False
+                    generations = 0
+
+                if generations is not None:
+                    self.busy_field = self.field
+                    self.work_revision = self.revision
+                    return self.field, generations, self.generation, record
+                self.condition.wait()
+            return None
+
+    def run(self) -> None:
+        while True:
+            work = self.wait_for_work()
+            if work is None:
+                return
+            field, generations, generation, record = work
+            monitor = self.monitor
+
+            with self.lock:
+                start = time.perf_counter()
+                # Поле могли заменить или перемотать, пока поток ждал lock, - тогда шаг не записывается
+                current = field is self.field and self.revision == self.work_revision
+                # Циклы ищутся только при запуске
+                looping = current and generations and not self.stepping
+                if looping and self.work_restart_detection:
+                    self.detector.reset()
+                    self.detector.update(field, generation, 0)
+                cycle = self.detector.get_cycle() if looping else None
+                detecting = looping and cycle is None
+
+                if not current:
+                    # Поле уже другое (восстановлено отменой, перемоткой или шагом назад) - шаг к нему не относится,
+                    # поле не трогается, а заказанная работа отбрасывается ниже как устаревшая
+                    generations = 0
+                elif self.recorder is not None:
+                    if record:
+                        self.recorder.record(field, generation)
+                    for i in range(1, generations + 1):
+                        field.step()
+                        self.recorder.record(field, generation + i)
+                        if detecting:
+                            cycle = self.detector.update(field, generation + i)
+                elif cycle is not None and self.skip_cycles:
+                    # Поле повторяется через период - считается только остаток
+                    field.advance(generations % cycle[1])
+                else:
+                    field.advance(generations)
+                    if detecting:
+                        cycle = self.detector.update(field, generation + generations, generations)
+                elapsed = time.perf_counter() - start
+                if monitor is not None and generations:
+                    monitor.add_step(generations, elapsed)
+
+                # Номер поколения меняется, пока поток держит lock, - под lock он всегда соответствует полю
+                with self.condition:
+                    stale = self.revision != self.work_revision
+                    if not stale:
+                        if self.stepping and generations == self.queued_generations:
+                            self.queued_generations = self.tune_generations(self.queued_generations, elapsed)
+                        elif self.auto_generations and generations == self.generations_per_step:
+                            self.generations_per_step = self.tune_generations(self.generations_per_step, elapsed)
+                        if detecting and cycle is not None and self.pause_on_cycle:
+                            self.running = False
+                        self.generation += generations
+                        self.unpublished += generations
+                        idle = not self.running and not self.pending_steps
+                        due = time.perf_counter() - self.last_frame_time >= self.frame_delay
+                        publish = idle or (self.unpublished and due)
+                        view, unpublished, generation = self.view, self.unpublished, self.generation
+                        density_levels = self.density_levels
+                        cycle = self.detector.get_cycle() if not self.restart_detection else None
+
+            if not stale and publish:
+                with self.lock:
+                    raster, bits, bytes_per_line = field.get_raster(*view)
+                    changes = field.get_changes(self.max_changes) if unpublished == 1 else None
+                    frame = Frame((bytes(raster), bits, bytes_per_line), generation, changes, idle, cycle)
+                    if monitor is not None:
+                        monitor.set_population(field.get_population())
+                    size = field.get_size()
+                if density_levels:
+                    from ui.density_pyramid import DensityPyramid
+                    frame.pyramid = DensityPyramid(frame.raster, *size)
+                    frame.pyramid.get_level(density_levels)
+
+                with self.condition:
+                    # Пока снимался кадр, поле могли заменить или перемотать
+                    stale = self.revision != self.work_revision
+                    if not stale:
+                        self.frame = frame
+                        self.unpublished -= unpublished
+                        self.last_frame_time = time.perf_counter()
+                if not stale:
+                    self.frameReady.emit()
+
+            with self.condition:
+                self.busy_field = None
+                stale = field is not self.field
+            if stale:
+                field.close()